@@ -1,5 +1,5 @@
+import errno
 import socket
-from socket import socket
 
 from Logs.logger import get_logger
 
@@ -15,7 +15,7 @@ class Forward:
         self.forward = None
         self.timeout = 5  # Таймаут для соединения в секундах
 
-    def start(self, host: str, port: int) -> socket | None:
+    def start(self, host: str, port: int) -> socket.socket | None:
         """
         Устанавливает соединение с целевым сервером.
 
@@ -53,6 +53,59 @@ class Forward:
             self.cleanup()
             return None
 
+    def start_async(self, host: str, port: int) -> socket.socket | None:
+        """
+        Начинает неблокирующее подключение к целевому серверу.
+
+        Сокет возвращается сразу, пока соединение ещё устанавливается
+        (EINPROGRESS). О завершении сообщает готовность сокета к записи,
+        после чего результат проверяется через finish_connect.
+
+        Args:
+            host (str): Хост целевого сервера
+            port (int): Порт целевого сервера
+
+        Returns:
+            socket.socket: Подключающийся сокет или None в случае ошибки
+        """
+        try:
+            logger.debug(f"Неблокирующее подключение к {host}:{port}")
+            self.forward = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.forward.setblocking(False)
+            self.forward.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            self.forward.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            err = self.forward.connect_ex((host, port))
+            if err not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK,
+                           errno.EALREADY):
+                raise OSError(err, errno.errorcode.get(err, str(err)))
+            return self.forward
+
+        except Exception as e:
+            logger.error(f"Ошибка при подключении к {host}:{port}: {e}")
+            self.cleanup()
+            return None
+
+    def finish_connect(self, sock: socket.socket) -> bool:
+        """
+        Проверяет результат неблокирующего подключения, когда сокет
+        стал готов к записи. Сокет остаётся неблокирующим.
+
+        Returns:
+            bool: True, если соединение установлено
+        """
+        try:
+            err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            if err:
+                logger.error(f"Ошибка подключения:"
+                             f" {errno.errorcode.get(err, err)}")
+                return False
+            sock.getpeername()
+        except OSError as e:
+            logger.error(f"Ошибка подключения: {e}")
+            return False
+        return True
+
     def cleanup(self):
         """
         Очищает ресурсы соединения
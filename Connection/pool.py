@@ -0,0 +1,129 @@
+import collections
+import socket
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Максимальное число простаивающих соединений в пуле
+POOL_MAX_IDLE = 256
+
+# Максимальное число простаивающих соединений к одному серверу
+POOL_MAX_PER_HOST = 8
+
+# Сколько соединение может простаивать в пуле, секунды
+POOL_IDLE_TIMEOUT = 30
+
+Key = Tuple[str, int]
+
+
+def is_alive(sock: socket.socket) -> bool:
+    """
+    Проверяет, что простаивающее соединение можно использовать:
+    сервер его не закрыл и не прислал лишних данных.
+    """
+    try:
+        sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT)
+    except (BlockingIOError, InterruptedError):
+        return True
+    except OSError:
+        return False
+    # b"" - сервер закрыл соединение, данные - ответ без запроса
+    return False
+
+
+class UpstreamPool:
+    """
+    Пул простаивающих keep-alive соединений к целевым серверам.
+
+    Соединения хранятся по (хост, порт) и выдаются в порядке LIFO: самое
+    свежее соединение с наибольшей вероятностью ещё открыто у сервера.
+    Перед выдачей соединение проверяется на живость. При переполнении
+    вытесняется соединение, простаивающее дольше всех.
+    """
+
+    def __init__(self, max_idle: int = POOL_MAX_IDLE,
+                 max_per_host: int = POOL_MAX_PER_HOST,
+                 idle_timeout: float = POOL_IDLE_TIMEOUT):
+        self.max_idle = max_idle
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        # fd -> (ключ, сокет, время возврата в пул), в порядке возврата
+        self._idle: collections.OrderedDict = collections.OrderedDict()
+        self._by_key: Dict[Key, List[int]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._idle)
+
+    def acquire(self, key: Key) -> Optional[socket.socket]:
+        """
+        Выдаёт живое простаивающее соединение к key или None.
+        """
+        fds = self._by_key.get(key)
+        now = time.monotonic()
+        while fds:
+            fd = fds.pop()
+            _, sock, since = self._idle.pop(fd)
+            if not fds:
+                del self._by_key[key]
+            if now - since < self.idle_timeout and is_alive(sock):
+                self.hits += 1
+                return sock
+            self.stale += 1
+            sock.close()
+        self.misses += 1
+        return None
+
+    def release(self, key: Key, sock: socket.socket) -> bool:
+        """
+        Возвращает соединение в пул.
+
+        Returns:
+            bool: False, если соединение не принято (его нужно закрыть)
+        """
+        if self.max_idle <= 0 or self.max_per_host <= 0:
+            return False
+        fds = self._by_key.get(key, ())
+        if len(fds) >= self.max_per_host:
+            self._drop(fds[0])
+        elif len(self._idle) >= self.max_idle:
+            self._drop(next(iter(self._idle)))
+        fd = sock.fileno()
+        self._idle[fd] = (key, sock, time.monotonic())
+        self._by_key.setdefault(key, []).append(fd)
+        return True
+
+    def _drop(self, fd: int):
+        key, sock, _ = self._idle.pop(fd)
+        fds = self._by_key[key]
+        fds.remove(fd)
+        if not fds:
+            del self._by_key[key]
+        self.evicted += 1
+        sock.close()
+
+    def expire(self):
+        """Закрывает соединения, простаивающие дольше idle_timeout."""
+        deadline = time.monotonic() - self.idle_timeout
+        while self._idle:
+            fd, (_, _, since) = next(iter(self._idle.items()))
+            if since > deadline:
+                break
+            self._drop(fd)
+
+    def stats(self) -> dict:
+        return {
+            "idle": len(self._idle),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "evicted": self.evicted,
+        }
+
+    def close(self):
+        for _, sock, _ in self._idle.values():
+            sock.close()
+        self._idle.clear()
+        self._by_key.clear()
@@ -0,0 +1,261 @@
+import collections
+import random
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from Logs.logger import get_logger
+
+logger = get_logger()
+
+# Время жизни успешного ответа в кэше, секунды
+POSITIVE_TTL = 300
+
+# Время жизни отрицательного ответа (NXDOMAIN, таймаут), секунды
+NEGATIVE_TTL = 30
+
+# Максимальное число имён в кэше
+CACHE_SIZE = 4096
+
+# Количество потоков для getaddrinfo
+RESOLVER_WORKERS = 4
+
+# Таймаут ожидания ответа DNS-сервера, секунды
+DNS_TIMEOUT = 2
+
+
+def system_resolve(host: str) -> Tuple[str, Optional[float]]:
+    """
+    Разрешает имя через системный getaddrinfo (блокирующий вызов).
+
+    Returns:
+        tuple: IPv4-адрес и TTL (None - getaddrinfo TTL не сообщает)
+
+    Raises:
+        OSError: Если имя не разрешилось
+    """
+    infos = socket.getaddrinfo(host, None, socket.AF_INET,
+                               socket.SOCK_STREAM)
+    if not infos:
+        raise OSError(f"Нет адресов для {host}")
+    return infos[0][4][0], None
+
+
+def _skip_name(packet: bytes, offset: int) -> int:
+    """Пропускает доменное имя (с учётом сжатия) в DNS-пакете."""
+    while True:
+        length = packet[offset]
+        if length & 0xC0 == 0xC0:
+            return offset + 2
+        if length == 0:
+            return offset + 1
+        offset += length + 1
+
+
+def build_dns_query(host: str, query_id: int) -> bytes:
+    """Собирает DNS-запрос записи A для host."""
+    header = struct.pack("!HHHHHH", query_id, 0x0100, 1, 0, 0, 0)
+    qname = b"".join(
+        bytes([len(label)]) + label
+        for label in host.encode("idna").split(b".") if label
+    ) + b"\0"
+    return header + qname + struct.pack("!HH", 1, 1)
+
+
+def parse_dns_response(packet: bytes, query_id: int
+                       ) -> Tuple[str, Optional[float]]:
+    """
+    Извлекает первую запись A и её TTL из ответа DNS-сервера.
+
+    Raises:
+        OSError: NXDOMAIN, ошибка сервера или нет записей A
+    """
+    if len(packet) < 12:
+        raise OSError("Слишком короткий ответ DNS")
+    (resp_id, flags, qdcount,
+     ancount, _, _) = struct.unpack("!HHHHHH", packet[:12])
+    if resp_id != query_id:
+        raise OSError("Чужой ответ DNS")
+    rcode = flags & 0x000F
+    if rcode:
+        raise OSError(f"Ошибка DNS, rcode={rcode}")
+
+    offset = 12
+    for _ in range(qdcount):
+        offset = _skip_name(packet, offset) + 4
+    for _ in range(ancount):
+        offset = _skip_name(packet, offset)
+        rtype, _, ttl, rdlength = struct.unpack("!HHIH",
+                                                packet[offset:offset + 10])
+        offset += 10
+        if rtype == 1 and rdlength == 4:
+            return socket.inet_ntoa(packet[offset:offset + 4]), float(ttl)
+        offset += rdlength
+    raise OSError("В ответе DNS нет записей A")
+
+
+def udp_resolve(host: str, server: Tuple[str, int],
+                timeout: float = DNS_TIMEOUT
+                ) -> Tuple[str, Optional[float]]:
+    """
+    Минимальный UDP-клиент DNS: запрашивает запись A у server.
+    В отличие от getaddrinfo возвращает TTL записи.
+    """
+    query_id = random.randint(0, 0xFFFF)
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        sock.sendto(build_dns_query(host, query_id), server)
+        packet, _ = sock.recvfrom(4096)
+    return parse_dns_response(packet, query_id)
+
+
+def is_ip_address(host: str) -> bool:
+    try:
+        socket.inet_aton(host)
+        return host.count(".") == 3
+    except OSError:
+        return False
+
+
+class Resolver:
+    """
+    Асинхронный DNS-резолвер с кэшем.
+
+    Запросы выполняются в пуле потоков, чтобы getaddrinfo не блокировал
+    цикл событий. Положительные и отрицательные ответы кэшируются с TTL,
+    кэш ограничен по размеру и вытесняет давно не использованные имена
+    (LRU). Одновременные запросы одного имени объединяются в один.
+    """
+
+    def __init__(self,
+                 resolve_func: Callable[[str], Tuple[str, Optional[float]]]
+                 = system_resolve,
+                 dispatch: Optional[Callable] = None,
+                 max_size: int = CACHE_SIZE,
+                 positive_ttl: float = POSITIVE_TTL,
+                 negative_ttl: float = NEGATIVE_TTL,
+                 workers: int = RESOLVER_WORKERS):
+        """
+        Args:
+            resolve_func: Функция host -> (IP, TTL), выполняемая в пуле
+                потоков: system_resolve или udp_resolve с адресом
+                DNS-сервера. TTL None означает positive_ttl.
+            dispatch: Функция доставки результата из потока пула,
+                например EventLoop.call_soon_threadsafe. По умолчанию
+                callback вызывается прямо в потоке пула.
+        """
+        self.resolve_func = resolve_func
+        self.dispatch = dispatch
+        self.max_size = max_size
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self._cache: collections.OrderedDict = collections.OrderedDict()
+        self._inflight: Dict[str, List[Callable]] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix="resolver")
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    def resolve(self, host: str, callback: Callable[[Optional[str]], None]):
+        """
+        Разрешает имя и вызывает callback(ip) или callback(None) при
+        ошибке. При попадании в кэш callback вызывается сразу.
+        """
+        if is_ip_address(host):
+            callback(host)
+            return
+
+        key = host.lower()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                expires, ip = entry
+                if expires > time.monotonic():
+                    self._cache.move_to_end(key)
+                    if ip is None:
+                        self.negative_hits += 1
+                    else:
+                        self.hits += 1
+                    cached = True
+                else:
+                    del self._cache[key]
+                    cached = False
+            else:
+                cached = False
+
+            if not cached:
+                self.misses += 1
+                waiters = self._inflight.get(key)
+                if waiters is not None:
+                    self.coalesced += 1
+                    waiters.append(callback)
+                    return
+                self._inflight[key] = [callback]
+
+        if cached:
+            callback(ip)
+            return
+
+        try:
+            self._executor.submit(self._worker, key)
+        except RuntimeError:
+            # Пул уже остановлен
+            self._finish(key, None)
+
+    def _worker(self, key: str):
+        try:
+            ip, ttl = self.resolve_func(key)
+        except (OSError, UnicodeError, IndexError, struct.error) as e:
+            logger.warning(f"Не удалось разрешить {key}: {e}")
+            ip, ttl = None, None
+        self._finish(key, ip, ttl)
+
+    def _finish(self, key: str, ip: Optional[str],
+                ttl: Optional[float] = None):
+        if ip is None:
+            ttl = self.negative_ttl
+        elif ttl is None:
+            ttl = self.positive_ttl
+        else:
+            ttl = min(ttl, self.positive_ttl)
+        with self._lock:
+            if ip is None:
+                self.errors += 1
+            self._cache[key] = (time.monotonic() + ttl, ip)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+            waiters = self._inflight.pop(key, [])
+
+        for callback in waiters:
+            if self.dispatch is not None:
+                self.dispatch(callback, ip)
+            else:
+                callback(ip)
+
+    def stats(self) -> dict:
+        """Возвращает счётчики кэша."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "errors": self.errors,
+                "size": len(self._cache),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def close(self):
+        """Останавливает пул потоков."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
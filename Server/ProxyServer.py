@@ -5,14 +5,26 @@ import string
 import time
 from datetime import datetime
 
-import select
 import errno
 import os
+import selectors
 from Connection.Forward import Forward
+from Connection.pool import UpstreamPool
+from Connection.resolver import Resolver
 from Logs.logger import get_logger
-from typing import Tuple, List, Union, Optional
+from typing import Dict, Tuple, List, Union, Optional
 import re
 from bs4 import BeautifulSoup
+from Server.blocklist import (BlocklistReloader, DecisionCache, DomainSet,
+                              match_domain, matching_domain)
+from Server.buffers import BufferPool
+from Server.channel import Channel, ChannelState
+from Server.event_loop import EventLoop, EVENT_READ, EVENT_WRITE
+from Server.http_message import (UNTIL_CLOSE, FramingError, MessageFramer,
+                                 RequestHead, RequestReader)
+from Server.relay import SplicePipe, SPLICE_AVAILABLE
+from Server.timer_wheel import TimerWheel
+from Server.url_filter import UrlFilter
 
 DUMP_DIR = os.path.join(os.path.dirname(__file__), "dumps")
 os.makedirs(DUMP_DIR, exist_ok=True)
@@ -20,7 +32,10 @@ os.makedirs(DUMP_DIR, exist_ok=True)
 BASE_DIR = os.path.dirname(__file__)
 AD_HOSTS_PATH = os.path.join(BASE_DIR, "ad_hosts.txt")
 
-AD_HOSTS_1 = set()
+AD_HOSTS_1 = DomainSet()
+
+# Кэш решений is_ad_host, общий для всего процесса
+AD_HOST_CACHE = DecisionCache()
 
 logger = get_logger()
 
@@ -725,16 +740,101 @@ def modify_html(html: bytes) -> Tuple[bytes, List[dict]]:
         return html, blocked_elements
 
 
-with open("ad_hosts.txt", "r") as f:
-    for line in f:
-        host = line.strip()
-        if host and not host.startswith("#"):
-            AD_HOSTS_1.add(host)
+# Скомпилированный снимок списка (см. ad_domens.save_snapshot): если он
+# есть, домены ищутся прямо в отображённом файле, а ad_hosts.txt не
+# читается. AD_HOSTS_1 тогда хранит только домены, добавленные в работе
+AD_SNAPSHOT = None
+
+
+def _install_blocklist(hosts: DomainSet, snapshot):
+    """
+    Подменяет действующий список. Старый снимок не закрывается явно:
+    отображение снимается, когда на него не остаётся ссылок.
+    """
+    global AD_HOSTS_1, AD_SNAPSHOT
+    AD_HOSTS_1, AD_SNAPSHOT = hosts, snapshot
+
+
+AD_RELOADER = BlocklistReloader("ad_hosts.txt", "ad_hosts.bin",
+                                _install_blocklist, "ad_hosts.delta")
+AD_RELOADER.load()
+if AD_SNAPSHOT is not None:
+    logger.info(f"Загружен снимок списка рекламных доменов"
+                f" ({len(AD_SNAPSHOT)} доменов"
+                f"{', с фильтром Блума' if AD_SNAPSHOT.bloom_bits else ''})")
 
 
 def is_ad_host(hst: str) -> bool:
-    """Проверка, является ли домен рекламным"""
-    return any(hst == d or hst.endswith("." + d) for d in AD_HOSTS_1)
+    """
+    Проверка, является ли домен рекламным: сам домен или любой из его
+    родительских доменов есть в AD_HOSTS_1 или в снимке AD_SNAPSHOT.
+
+    Решения запоминаются в AD_HOST_CACHE и сбрасываются при любом
+    изменении AD_HOSTS_1 или замене снимка. Обычное множество (например,
+    подменённое в тестах) проверяется напрямую, без кэша. Если в снимке
+    есть фильтр Блума, суффиксы, которых нет в фильтре, в хэш-таблице
+    снимка не ищутся.
+    """
+    hosts = AD_HOSTS_1
+    snapshot = AD_SNAPSHOT
+    if isinstance(hosts, DomainSet):
+        return AD_HOST_CACHE.lookup(hosts, hst, snapshot)
+    return match_domain(hosts, hst) or (
+        snapshot is not None and match_domain(snapshot, hst))
+
+
+# Правила EasyList на URL (/adservice/, &ad_type= и т.п.), если файл
+# есть; проверяются после is_ad_host для обычных HTTP-запросов
+AD_URLS_PATH = "ad_urls.txt"
+URL_FILTER: Optional[UrlFilter] = None
+if os.path.exists(AD_URLS_PATH):
+    URL_FILTER = UrlFilter.from_file(AD_URLS_PATH)
+    logger.info(f"Загружено {len(URL_FILTER)} правил на URL")
+
+
+def ad_url_rule(head: RequestHead) -> Optional[str]:
+    """
+    Правило из AD_URLS_PATH, по которому блокируется запрос, или None.
+    """
+    url_filter = URL_FILTER
+    if url_filter is None or head.method == "CONNECT":
+        return None
+    return url_filter.match(head.url)
+
+
+def ad_host_source(hst: str) -> Optional[str]:
+    """
+    Имя списка, из-за которого заблокирован hst: источник из снимка,
+    "ad_hosts.txt" для доменов AD_HOSTS_1 или None, если домен не
+    блокируется или источник неизвестен.
+    """
+    if matching_domain(AD_HOSTS_1, hst) is not None:
+        return "ad_hosts.txt"
+    snapshot = AD_SNAPSHOT
+    if snapshot is None:
+        return None
+    domain = matching_domain(snapshot, hst)
+    return snapshot.source(domain) if domain is not None else None
+
+
+def block_reason(head: RequestHead) -> Optional[Tuple[str, Optional[str]]]:
+    """
+    Проверяет запрос по спискам блокировки: сначала хост по списку
+    рекламных доменов, затем URL по правилам AD_URLS_PATH.
+
+    Returns:
+        tuple: (имя списка, правило на URL или None), если запрос
+            блокируется, иначе None
+    """
+    HOST = head.host
+    if not HOST:
+        return None
+    if is_ad_host(HOST):
+        return ad_host_source(HOST) or "unknown", None
+    rule = ad_url_rule(head)
+    if rule is not None:
+        return AD_URLS_PATH, rule
+    return None
 
 
 def save_dump(data: bytes, direction: str):
@@ -760,83 +860,86 @@ def save_dump(data: bytes, direction: str):
 # Размер буфера
 BUFFER_SIZE = 4096
 
-# Задержка
-DELAY = 0.0001
+# Пересылать HTTPS-туннели без копирования и без дампов (os.splice на
+# Linux, иначе recv_into в заранее выделенный буфер)
+ZERO_COPY_TUNNELS = False
+
+# Период очистки неактивных соединений, секунды
+CLEANUP_INTERVAL = 60
 
 # Таймаут для операций с сокетами
 SOCKET_TIMEOUT = 5
 
+# Дедлайн неблокирующего подключения к целевому серверу, секунды
+CONNECT_TIMEOUT = 5
+
+# Сколько клиент может молчать до первого запроса, секунды
+REQUEST_TIMEOUT = 30
+
+# Таймаут простоя HTTP-соединения, секунды
+HTTP_IDLE_TIMEOUT = 60
+
+# Таймаут простоя HTTPS-туннеля, секунды
+TUNNEL_IDLE_TIMEOUT = 300
+
 # Максимальное количество соединений
 MAX_CONNECTIONS = 1000
 
+# Как часто закрывать простаивающие соединения пула, секунды
+POOL_EXPIRE_INTERVAL = 5
+
+# Как часто проверять, не изменился ли файл списка рекламных доменов,
+# секунды
+BLOCKLIST_CHECK_INTERVAL = 2
+
+# Максимальное число одновременных подключений с одного IP
+MAX_CONNECTIONS_PER_IP = 100
+
+# Сколько подключений принимать за одно событие готовности
+ACCEPT_BATCH = 64
+
+# Поведение при достижении MAX_CONNECTIONS: перестать принимать
+# подключения (они ждут в очереди ядра) или сразу отвечать 503
+OVERFLOW_PAUSE = "pause"
+OVERFLOW_REJECT = "reject"
+OVERFLOW_POLICY = OVERFLOW_PAUSE
+
+SERVICE_UNAVAILABLE = (b"HTTP/1.1 503 Service Unavailable\r\n"
+                       b"Connection: close\r\nContent-Length: 0\r\n\r\n")
+TOO_MANY_REQUESTS = (b"HTTP/1.1 429 Too Many Requests\r\n"
+                     b"Connection: close\r\nContent-Length: 0\r\n\r\n")
+
 # логгер
 logger = get_logger()
 
 
+def _head_end(data: bytes) -> int:
+    end = data.find(b"\r\n\r\n")
+    return len(data) if end == -1 else end + 4
+
+
 def modify_request(data: bytes) -> bytes:
+    """
+    Переводит запрос из absolute-form в origin-form (обёртка над
+    RequestHead.rewrite). Тело запроса не меняется.
+    """
+    end = _head_end(data)
     try:
-        lines = data.split(b"\r\n")
-        if not lines:
-            return data
-
-        # первая строка: метод, URL, протокол
-        first = lines[0].decode("utf-8",
-                                errors="ignore").split(" ")
-        if len(first) < 3:
-            return data
-        method, url, proto = first
-
-        if url.startswith("http://") or url.startswith("https://"):
-            idx = url.find("/", url.find("://") + 3)
-            path = url[idx:] if idx != -1 else "/"
-            lines[0] = b" ".join(
-                [method.encode(), path.encode(), proto.encode()]
-            )
-        return b"\r\n".join(lines)
-    except UnicodeError:
-        pass
+        head = RequestHead(data[:end])
+    except FramingError:
         return data
+    return head.rewrite() + data[end:]
 
 
 def parse_request(data: bytes):
-    """Извлекает метод, хост и порт"""
-
-    lines = data.split(b"\r\n")
-    if not lines:
-        return None, None, None
-
-    first_line = lines[0].decode("utf-8",
-                                 errors="ignore")
-    parts = first_line.split(" ")
-    if len(parts) < 2:
+    """Извлекает метод, хост и порт (обёртка над RequestHead)"""
+    try:
+        head = RequestHead(data[:_head_end(data)])
+    except FramingError:
         return None, None, None
-
-    method = parts[0]
-
-    if method == "CONNECT":
-        host_port = parts[1].split(":")
-        HOST = host_port[0]
-        port = int(host_port[1]) if len(host_port) > 1 else 443
-        return "CONNECT", HOST, port
-    else:
-        # Обработка заголовков
-        for tag_line in lines[1:]:
-            try:
-                line_str = tag_line.decode("utf-8",
-                                           errors="ignore")
-                if line_str.lower().startswith("host:"):
-                    host_port = line_str.split(":",
-                                               1)[1].strip()
-                    if ":" in host_port:
-                        HOST, port = host_port.split(":")
-                        port = int(port)
-                    else:
-                        HOST = host_port
-                        port = 80
-                    return method, HOST, port
-            except Exception:
-                pass
+    if head.host is None:
         return None, None, None
+    return head.method, head.host, head.port
 
 
 class ProxyServer:
@@ -845,55 +948,195 @@ class ProxyServer:
 
     """
 
-    def __init__(self, HOST: str, PORT: int):
+    def __init__(self, HOST: str, PORT: int,
+                 selector: Optional[selectors.BaseSelector] = None,
+                 resolver: Optional[Resolver] = None,
+                 zero_copy: bool = ZERO_COPY_TUNNELS,
+                 reuse_port: bool = False,
+                 max_connections: int = MAX_CONNECTIONS,
+                 max_per_ip: int = MAX_CONNECTIONS_PER_IP,
+                 overflow: str = OVERFLOW_POLICY,
+                 upstreams: Optional[UpstreamPool] = None):
         """
         Инициализирует прокси-сервер.
 
+        Args:
+            selector: Бэкенд ожидания событий (по умолчанию
+                selectors.DefaultSelector)
+            resolver: DNS-резолвер; по умолчанию Resolver с доставкой
+                результатов в цикл событий
+            zero_copy: Быстрая пересылка HTTPS-туннелей (см.
+                ZERO_COPY_TUNNELS)
+            reuse_port: Включить SO_REUSEPORT, чтобы несколько процессов
+                слушали один порт (см. Server.supervisor)
+            max_connections: Предел одновременных клиентских подключений
+            max_per_ip: Предел подключений с одного IP
+            overflow: OVERFLOW_PAUSE или OVERFLOW_REJECT
+            upstreams: Пул keep-alive соединений к целевым серверам
         """
         self.server = socket.socket(socket.AF_INET,
                                     socket.SOCK_STREAM)
         self.server.setsockopt(socket.SOL_SOCKET,
                                socket.SO_REUSEADDR, 1)
-        self.server.settimeout(SOCKET_TIMEOUT)
+        if reuse_port:
+            self.server.setsockopt(socket.SOL_SOCKET,
+                                   socket.SO_REUSEPORT, 1)
+        self.server.setblocking(False)
         self.server.setsockopt(socket.IPPROTO_TCP,
                                socket.TCP_NODELAY, 1)
         self.server.bind((HOST, PORT))
         self.server.listen(200)
-        self.input_list = [self.server]
-        self.channel = {}
+        self.loop = EventLoop(selector)
+        self.loop.register(self.server, EVENT_READ)
+        self.resolver = resolver or Resolver(
+            dispatch=self.loop.call_soon_threadsafe)
+        self.zero_copy = zero_copy
+        self.pool = BufferPool()
+        self.upstreams = upstreams if upstreams is not None \
+            else UpstreamPool()
+        # Открытые соединения по номеру файлового дескриптора: вместе с
+        # регистрацией в self.loop это вся бухгалтерия соединений,
+        # добавление и удаление - O(1)
+        self.channel: Dict[int, Channel] = {}
         self.running = True
+        self.max_connections = max_connections
+        self.max_per_ip = max_per_ip
+        self.overflow = overflow
+        # Принятые клиентские подключения: всего и по IP
+        self.clients = 0
+        self.per_ip: Dict[str, int] = {}
+        self.accepting = True
+        self.accepted = 0
+        self.blocked = 0
+        self.rejected_overflow = 0
+        self.rejected_per_ip = 0
+        self.accept_pauses = 0
+        # Число блокировок по спискам-источникам
+        self.blocked_by: Dict[str, int] = {}
+        self.idle = TimerWheel(start=self.loop.now)
+        self._idle_timer = None
         self.last_cleanup = time.time()
+        self.loop.call_later(CLEANUP_INTERVAL, self._periodic_cleanup)
+        self.loop.call_later(POOL_EXPIRE_INTERVAL, self._expire_upstreams)
+        self.loop.call_later(BLOCKLIST_CHECK_INTERVAL, self._check_blocklist)
         logger.info(f"Прокси-сервер инициализирован на"
                     f" {HOST}:{PORT}")
 
-    def _cleanup_inactive_connections(self):
+    def _channel_of(self, s: socket.socket) -> Optional[Channel]:
+        """
+        Возвращает канал сокета по номеру дескриптора.
+        """
+        ch = self.channel.get(s.fileno())
+        return ch if ch is not None and ch.sock is s else None
+
+    @staticmethod
+    def _idle_limit(ch: Channel) -> float:
+        """
+        Допустимое время простоя клиентского канала в его состоянии.
+        """
+        if ch.state is ChannelState.TUNNEL:
+            return TUNNEL_IDLE_TIMEOUT
+        if ch.state in (ChannelState.HTTP_RELAY, ChannelState.CLOSING):
+            return HTTP_IDLE_TIMEOUT
+        return REQUEST_TIMEOUT
+
+    def _watch_idle(self, ch: Channel):
+        """
+        Ставит клиентский канал на контроль простоя.
+        """
+        ch.last_activity = self.loop.now
+        deadline = ch.last_activity + self._idle_limit(ch)
+        self.idle.add(ch, deadline)
+        timer = self._idle_timer
+        if timer is None or timer.cancelled or timer.when > deadline:
+            self._arm_idle_timer()
+
+    def _touch(self, ch: Channel):
+        """
+        Отмечает активность соединения. Колесо таймеров при этом не
+        трогается: дедлайн перепроверяется, когда наступит его ячейка.
+        """
+        client = ch if ch.client else ch.peer
+        if client is not None:
+            client.last_activity = self.loop.now
+
+    def _arm_idle_timer(self):
+        """
+        Планирует проверку простоя на ближайшую непустую ячейку колеса.
+        """
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+        deadline = self.idle.next_deadline()
+        if deadline is not None:
+            self._idle_timer = self.loop.call_at(deadline,
+                                                 self._expire_idle)
+
+    def _expire_idle(self):
+        """
+        Закрывает соединения, простаивающие дольше допустимого. Стоит
+        O(истёкших), а не O(всех соединений).
+        """
+        self._idle_timer = None
+        now = time.monotonic()
+        for ch in self.idle.expire(now):
+            if ch.closed:
+                continue
+            deadline = ch.last_activity + self._idle_limit(ch)
+            if deadline <= now:
+                logger.info(f"Закрытие по таймауту простоя"
+                            f" ({ch.state.value})")
+                self._close_channel(ch)
+            else:
+                self.idle.add(ch, deadline)
+        self._arm_idle_timer()
+
+    def _periodic_cleanup(self):
         """
-        Очищает неактивные соединения
+        Таймер очистки: запускает её и планирует следующий вызов.
+        """
+        self._cleanup_inactive_connections(force=True)
+        if self.running:
+            self.loop.call_later(CLEANUP_INTERVAL, self._periodic_cleanup)
+
+    def _expire_upstreams(self):
+        """
+        Таймер пула: закрывает давно простаивающие соединения.
+        """
+        self.upstreams.expire()
+        if self.running:
+            self.loop.call_later(POOL_EXPIRE_INTERVAL,
+                                 self._expire_upstreams)
+
+    def _check_blocklist(self):
+        """
+        Таймер списка рекламных доменов: при изменении файла список
+        пересобирается в фоне и подменяется без остановки сервера.
+        """
+        AD_RELOADER.poll(self.loop.call_soon_threadsafe)
+        if self.running:
+            self.loop.call_later(BLOCKLIST_CHECK_INTERVAL,
+                                 self._check_blocklist)
+
+    def _cleanup_inactive_connections(self, force: bool = False):
+        """
+        Очищает неактивные соединения: каналы, чьи сокеты закрыты в
+        обход on_close.
         """
 
         current_time = time.time()
-        if current_time - self.last_cleanup < 60:
+        if not force and current_time - self.last_cleanup < CLEANUP_INTERVAL:
             return
 
         try:
+            dead = [ch for ch in self.channel.values()
+                    if ch.sock.fileno() == -1]
+            for ch in dead:
+                self._close_channel(ch)
 
-            valid_sockets = []
-
-            for s in self.input_list:
-                try:
-                    if s.fileno() != -1:
-                        valid_sockets.append(s)
-                    else:
-                        if s in self.channel:
-                            self._cleanup_peer_connection(s)
-                except OSError:
-                    if s in self.channel:
-                        self._cleanup_peer_connection(s)
-
-            self.input_list = valid_sockets
             self.last_cleanup = current_time
-            logger.info(f"Очищено {len(self.input_list)}"
-                        f" активных соединений")
+            logger.info(f"Очищено {len(dead)} закрытых соединений,"
+                        f" активных: {len(self.channel)}")
         except OSError as e:
             logger.error(f"Ошибка при очистке соединений:"
                          f" {e}")
@@ -901,31 +1144,36 @@ class ProxyServer:
     def main_loop(self):
         """
         Основной цикл обработки событий сервера.
+
+        Цикл блокируется только в ожидании событий, и не дольше, чем до
+        ближайшего таймера (очистка, дедлайны).
         """
         logger.info("Сервер запущен и ожидает"
                     " подключений")
 
         while self.running:
             try:
-                time.sleep(DELAY)
-                self._cleanup_inactive_connections()
-
-                if not self.input_list:
-                    logger.warning("Нет активных сокетов,"
+                if self.server.fileno() == -1:
+                    logger.warning("Слушающий сокет закрыт,"
                                    " завершение работы")
                     break
 
-                input_ready, _, _ = select.select(self.input_list,
-                                                  [],
-                                                  [],
-                                                  0.1)
-                for s in input_ready:
-                    if s == self.server:
+                for s, mask, ch in self.loop.poll(self.loop.next_timeout()):
+                    if s is self.server:
                         self.on_accept()
-                    else:
-                        self.on_recv(s)
-            except select.error as e:
-                if e.args[0] == errno.EBADF:
+                        continue
+                    if ch is None:
+                        ch = self._channel_of(s)
+                        if ch is None:
+                            self.on_close(s)
+                            continue
+                    if mask & EVENT_WRITE:
+                        self._on_writable(ch)
+                    if mask & EVENT_READ and not ch.closed:
+                        self._on_readable(ch)
+                self.loop.run_timers()
+            except OSError as e:
+                if e.errno == errno.EBADF:
                     logger.warning(
                         "Обнаружен"
                         " невалидный файловый дескриптор,"
@@ -933,109 +1181,172 @@ class ProxyServer:
                     )
                     self._cleanup_inactive_connections()
                 else:
-                    logger.error(f"Ошибка select: {e}")
+                    logger.error(f"Ошибка ожидания событий: {e}")
             except Exception as e:
                 logger.error(f"Ошибка в главном цикле: {e}")
                 self._cleanup_inactive_connections()
 
     def on_accept(self):
         """
-        Обрабатывает новое клиентское подключение.
+        Принимает новые клиентские подключения.
+
+        За одно событие готовности разбирается очередь ядра, но не больше
+        ACCEPT_BATCH подключений, чтобы не задерживать обработку уже
+        открытых соединений. При достижении max_connections приём
+        приостанавливается или подключения отклоняются с 503 (см.
+        OVERFLOW_POLICY), при превышении max_per_ip - отклоняются с 429.
         """
-        try:
-            clientsock, clientaddr = self.server.accept()
-            clientsock.settimeout(SOCKET_TIMEOUT)
-            clientsock.setsockopt(socket.IPPROTO_TCP,
-                                  socket.TCP_NODELAY,
-                                  1)
+        for _ in range(ACCEPT_BATCH):
+            if (self.clients >= self.max_connections
+                    and self.overflow == OVERFLOW_PAUSE):
+                self._pause_accepting()
+                return
+            try:
+                clientsock, clientaddr = self.server.accept()
+            except (BlockingIOError, InterruptedError, socket.timeout):
+                return
+            except OSError as e:
+                logger.error(f"Ошибка при принятии"
+                             f" соединения: {e}")
+                return
+
+            ip = clientaddr[0]
+            if self.clients >= self.max_connections:
+                self.rejected_overflow += 1
+                self._reject(clientsock, SERVICE_UNAVAILABLE)
+                continue
+            if self.per_ip.get(ip, 0) >= self.max_per_ip:
+                self.rejected_per_ip += 1
+                logger.warning(f"Превышен лимит подключений с {ip}")
+                self._reject(clientsock, TOO_MANY_REQUESTS)
+                continue
+
+            try:
+                clientsock.setblocking(False)
+                clientsock.setsockopt(socket.IPPROTO_TCP,
+                                      socket.TCP_NODELAY,
+                                      1)
+            except OSError as e:
+                logger.error(f"Ошибка при принятии"
+                             f" соединения: {e}")
+                clientsock.close()
+                continue
             logger.info(f"Новое подключение от"
                         f" {clientaddr}")
-            self.input_list.append(clientsock)
-            self.channel[clientsock] = {
-                "peer": None,
-                "parse": True,
-                "type": None,
-            }
-        except socket.timeout:
+            self.accepted += 1
+            self.clients += 1
+            self.per_ip[ip] = self.per_ip.get(ip, 0) + 1
+            ch = Channel(clientsock, client=True)
+            ch.ip = ip
+            self.channel[ch.fd] = ch
+            self.loop.register(clientsock, EVENT_READ, ch)
+            self._watch_idle(ch)
+
+    @staticmethod
+    def _reject(sock: socket.socket, response: bytes):
+        """
+        Отвечает отклонённому клиенту без ожидания и закрывает сокет.
+        """
+        try:
+            sock.setblocking(False)
+            sock.send(response)
+        except OSError:
             pass
-        except OSError as e:
-            logger.error(f"Ошибка при принятии"
-                         f" соединения: {e}")
+        sock.close()
+
+    def _pause_accepting(self):
+        if self.accepting:
+            self.accepting = False
+            self.accept_pauses += 1
+            self.loop.unregister(self.server)
+            logger.warning(f"Достигнут предел подключений"
+                           f" ({self.max_connections}), приём"
+                           f" приостановлен")
+
+    def _resume_accepting(self):
+        if (self.running and not self.accepting
+                and self.server.fileno() != -1):
+            self.accepting = True
+            self.loop.register(self.server, EVENT_READ)
+            logger.info("Приём подключений возобновлён")
+
+    def _forget_client(self, ch: Channel):
+        """
+        Снимает закрытое клиентское подключение с учёта лимитов.
+        """
+        ip = ch.ip
+        if ip is None:
+            return
+        ch.ip = None
+        self.clients -= 1
+        left = self.per_ip[ip] - 1
+        if left:
+            self.per_ip[ip] = left
+        else:
+            del self.per_ip[ip]
+        if self.clients < self.max_connections:
+            self._resume_accepting()
 
     def on_recv(self, s: socket.socket):
         """
         Обрабатывает данные от клиента или сервера.
         """
+        # Проверяем, что сокет всё ещё валиден
+        if s.fileno() == -1:
+            logger.warning("Получен запрос"
+                           " от невалидного сокета")
+            self._cleanup_inactive_connections()
+            return
+        ch = self._channel_of(s)
+        if ch is None:
+            self.on_close(s)
+            return
+        self._on_readable(ch)
+
+    def _on_readable(self, ch: Channel):
+        """
+        Обрабатывает готовность канала к чтению.
+        """
+        s = ch.sock
+        self._touch(ch)
         try:
-            # Проверяем, что сокет всё ещё валиден
-            if s.fileno() == -1:
-                logger.warning("Получен запрос"
-                               " от невалидного сокета")
-                self._cleanup_inactive_connections()
+            if ch.state is ChannelState.TUNNEL and self.zero_copy:
+                self._relay_tunnel(ch)
                 return
 
-            data = s.recv(BUFFER_SIZE)
+            data = self._read(ch)
             if not data:
-                self.on_close(s)
+                self._on_eof(ch)
                 return
 
             # Сохраняем запросы в дампс
 
             save_dump(data, "request")
 
-            if s in self.channel and self.channel[s]["parse"]:
-                method, HOST, port = parse_request(data)
-
-                if method == "CONNECT" and HOST and is_ad_host(HOST):
-                    logger.info(f"BLOCKING"
-                                f" CONNECT to ad host: {HOST}")
-                    s.send(b"HTTP/1.1"
-                           b" 403 Forbidden\r\n\r\n")
-                    return
-
-                if HOST and is_ad_host(HOST):
-
-                    self.channel[s].setdefault("blocked_count", 0)
-                    self.channel[s]["blocked_count"] += 1
-
-                    logger.info(
-                        f"Блокировка запроса"
-                        f" к рекламному домену: {HOST} "
-                        f"(total blocked:"
-                        f" {self.channel[s]['blocked_count']})"
-                    )
-                    if method == "CONNECT":
-                        # Блокируем HTTPS CONNECT
-                        s.send(b"HTTP/1.1"
-                               b" 403 Forbidden\r\n\r\n")
-                    else:
-                        # Блокируем HTTP-запрос
-                        resp = (b"HTTP/1.1"
-                                b" 204 No Content\r\nContent-Length:"
-                                b" 0\r\n\r\n")
-                        s.send(resp)
-                        save_dump(resp, "blocked")
-                    return
-
-                if method and HOST and port:
-                    logger.debug(f"Запрос: {method} {HOST}:{port}")
-                    forward = Forward().start(HOST, port)
-                    if forward:
-                        self._setup_forward_connection(
-                            s, forward, method, data
-                        )
-                    else:
-                        self._handle_connection_error(HOST, port, s)
-                else:
-                    self._handle_invalid_request(s)
+            if ch.client and ch.state is ChannelState.CONNECTING:
+                # Целевой сервер ещё подключается - копим данные, но не
+                # больше порога очереди: дальше клиент ждёт подключения
+                ch.pending.append(bytes(data))
+                if sum(map(len, ch.pending)) >= ch.out.high_water:
+                    ch.paused = True
+                    self._update_events(ch)
+                return
 
+            if ch.parse:
+                if ch.inbuf is None:
+                    ch.inbuf = RequestReader()
+                ch.inbuf.feed(data)
+                self._process_requests(ch)
             else:
                 # Далее передаем данные (HTTP или HTTPS-туннель)
-                self._forward_data(s, data)
+                self._forward_data(ch, data)
 
         except socket.timeout:
             # Игнорируем таймауты при чтении данных
             pass
+        except (BlockingIOError, InterruptedError):
+            # Ложное срабатывание готовности - данных пока нет
+            pass
         except ConnectionAbortedError:
             logger.warning(f"Соединение разорвано: {s.getpeername()}")
             self.on_close(s)
@@ -1043,77 +1354,403 @@ class ProxyServer:
             logger.error(f"Ошибка при получении данных: {e}")
             self.on_close(s)
 
+    def _process_requests(self, ch: Channel):
+        """
+        Разбирает запросы из входного буфера клиента.
+
+        Каждый запрос отдельно проверяется по списку рекламных доменов и
+        направляется к своему серверу. Пока не закончился ответ на
+        текущий запрос, следующие ждут в ch.inbuf.
+        """
+        while ch.state is ChannelState.AWAITING_REQUEST and ch.inbuf:
+            try:
+                head = ch.inbuf.next_head()
+            except FramingError as e:
+                logger.warning(f"Некорректный запрос: {e}")
+                self._handle_invalid_request(ch.sock)
+                return
+            if head is None:
+                return
+            method, HOST, port = head.method, head.host, head.port
+
+            reason = block_reason(head)
+            if reason is not None:
+                self._block_request(ch, method, HOST, head, *reason)
+                continue
+
+            if not (method and HOST and port):
+                self._handle_invalid_request(ch.sock)
+                return
+
+            if method != "CONNECT":
+                try:
+                    ch.req = MessageFramer.for_request(head)
+                except FramingError:
+                    self._handle_invalid_request(ch.sock)
+                    return
+
+            logger.debug(f"Запрос: {method} {HOST}:{port}")
+            rest, ch.inbuf = ch.inbuf.take(), None
+            self._start_forward_connection(ch, method, HOST, port, head)
+            if rest and ch.state is ChannelState.CONNECTING:
+                ch.pending.append(rest)
+            elif rest and ch.state is ChannelState.HTTP_RELAY:
+                self._relay_request(ch, rest)
+            return
+
+    def _block_request(self, ch: Channel, method: str, HOST: str,
+                       head: RequestHead, source: str,
+                       rule: Optional[str] = None):
+        """
+        Отвечает на запрос к рекламному домену (или по правилу на URL
+        rule) вместо сервера. source - список, по которому запрос
+        заблокирован (см. block_reason).
+        """
+        self.blocked += 1
+        self.blocked_by[source] = self.blocked_by.get(source, 0) + 1
+        if rule is not None:
+            source = f"{source}: {rule}"
+        if method == "CONNECT":
+            logger.info(f"BLOCKING"
+                        f" CONNECT to ad host: {HOST} ({source})")
+            self._send(ch, b"HTTP/1.1"
+                           b" 403 Forbidden\r\n\r\n")
+            return
+
+        ch.blocked_count += 1
+        logger.info(
+            f"Блокировка запроса"
+            f" к рекламному домену: {HOST} "
+            f"(список: {source}, total blocked:"
+            f" {ch.blocked_count})"
+        )
+        resp = (b"HTTP/1.1"
+                b" 204 No Content\r\nContent-Length:"
+                b" 0\r\n\r\n")
+        self._send(ch, resp)
+        save_dump(resp, "blocked")
+
+        try:
+            request = MessageFramer.for_request(head)
+        except FramingError:
+            request = None
+        if request is None or not request.done or not request.keep_alive:
+            # Тело запроса пропускать не будем - закрываем соединение
+            self._close_when_flushed(ch)
+
+    def _close_when_flushed(self, ch: Channel):
+        """
+        Закрывает клиента, как только уйдут данные из его очереди.
+        """
+        ch.state = ChannelState.CLOSING
+        ch.inbuf = None
+        ch.paused = True
+        if ch.has_output():
+            self._update_events(ch)
+        else:
+            self.on_close(ch.sock)
+
+    def _start_forward_connection(self, ch: Channel, method: str,
+                                  HOST: str, port: int, head: RequestHead):
+        """
+        Разрешает имя и начинает неблокирующее подключение к целевому
+        серверу.
+
+        Первый запрос клиента откладывается до завершения подключения,
+        цикл событий при этом продолжает обслуживать других клиентов.
+        Для обычного HTTP сначала проверяется пул keep-alive соединений.
+        """
+        if method != "CONNECT":
+            key = (HOST.lower(), port)
+            sock = self.upstreams.acquire(key)
+            if sock is not None:
+                logger.debug(f"Повторное использование соединения"
+                             f" с {HOST}:{port}")
+                up = Channel(sock, client=False,
+                             state=ChannelState.HTTP_RELAY, method=method)
+                up.pool_key = key
+                up.peer = ch
+                ch.peer = up
+                self.channel[up.fd] = up
+                self.loop.register(sock, EVENT_READ, up)
+                self._setup_forward_connection(ch, up, head)
+                return
+
+        ch.state = ChannelState.CONNECTING
+        ch.pending = []
+        self.resolver.resolve(
+            HOST,
+            lambda ip: self._on_resolved(ch, method, HOST, port, head, ip))
+
+    def _on_resolved(self, ch: Channel, method: str, HOST: str,
+                     port: int, head: RequestHead, ip: Optional[str]):
+        """
+        Продолжает подключение после разрешения имени.
+        """
+        if ch.state is not ChannelState.CONNECTING:
+            # Клиент успел отключиться
+            return
+        if ip is None:
+            self._handle_connection_error(HOST, port, ch.sock)
+            return
+
+        connector = Forward()
+        forward = connector.start_async(ip, port)
+        if not forward:
+            self._handle_connection_error(HOST, port, ch.sock)
+            return
+
+        up = Channel(forward, client=False,
+                     state=ChannelState.CONNECTING, method=method)
+        up.peer = ch
+        ch.peer = up
+        up.connect = (connector, HOST, port, head)
+        if method != "CONNECT":
+            up.pool_key = (HOST.lower(), port)
+        up.deadline = self.loop.call_later(CONNECT_TIMEOUT,
+                                           self._on_connect_timeout, up)
+        self.channel[up.fd] = up
+        self.loop.register(forward, EVENT_WRITE, up)
+
+    def on_write(self, s: socket.socket):
+        """
+        Обрабатывает готовность сокета к записи.
+        """
+        ch = self._channel_of(s)
+        if ch is None:
+            self.loop.unregister(s)
+            return
+        self._on_writable(ch)
+
+    def _on_writable(self, ch: Channel):
+        """
+        Дописывает исходящую очередь канала и при её опустошении
+        возобновляет чтение с другой стороны.
+        """
+        if ch.connect is not None:
+            self._on_connect_ready(ch)
+            return
+
+        self._touch(ch)
+        try:
+            drained = ch.out.flush(ch.sock)
+            if drained and ch.splice is not None:
+                drained = ch.splice.drain(ch.fd)
+        except OSError as e:
+            logger.error(f"Ошибка при отправке данных: {e}")
+            self.on_close(ch.sock)
+            return
+
+        if drained and ch.state is ChannelState.CLOSING:
+            self.on_close(ch.sock)
+            return
+
+        peer = ch.peer
+        if peer is not None and peer.paused and ch.out.is_drained() \
+                and not ch.splice:
+            peer.paused = False
+            self._update_events(peer)
+        self._update_events(ch)
+
+    def _send(self, ch: Channel, data: bytes):
+        """
+        Ставит данные в исходящую очередь канала и сразу отправляет,
+        сколько получится. Если очередь переполнена, чтение с другой
+        стороны приостанавливается до её опустошения.
+        """
+        if ch.closed:
+            return
+        try:
+            ch.out.send(ch.sock, data)
+        except OSError as e:
+            logger.error(f"Ошибка при отправке данных: {e}")
+            self.on_close(ch.sock)
+            return
+
+        peer = ch.peer
+        if ch.out.is_full() and peer is not None and not peer.closed:
+            peer.paused = True
+            self._update_events(peer)
+        self._update_events(ch)
+
+    def _update_events(self, ch: Channel):
+        """
+        Пересчитывает маску событий сокета по состоянию канала.
+        """
+        if not ch.closed:
+            self.loop.modify(ch.sock, ch.events(), ch)
+
+    def _read(self, ch: Channel):
+        """
+        Читает данные в буфер канала из пула.
+
+        Returns:
+            memoryview: Прочитанные данные. Представление действительно
+                только до следующего чтения: то, что нужно сохранить,
+                копируется.
+        """
+        buf = ch.rbuf
+        if buf is None:
+            buf = self.pool.acquire()
+        received = ch.sock.recv_into(buf)
+        ch.rbuf = self.pool.adapt(buf, received)
+        return memoryview(buf)[:received]
+
+    def _relay_tunnel(self, ch: Channel):
+        """
+        Пересылает данные HTTPS-туннеля без разбора и дампов.
+
+        Если у получателя есть pipe, байты переносятся через os.splice и
+        не попадают в память интерпретатора. Иначе (или пока очередь
+        получателя не пуста) используется recv_into в буфер из пула.
+        """
+        peer = ch.peer
+        if peer is None or peer.closed:
+            self.on_close(ch.sock)
+            return
+
+        pipe = peer.splice
+        if pipe is None or peer.out:
+            data = self._read(ch)
+            if not data:
+                self._on_eof(ch)
+                return
+            self._send(peer, data)
+            return
+
+        if pipe.fill(ch.fd) == 0:
+            self._on_eof(ch)
+            return
+        if not pipe.drain(peer.fd):
+            # Получатель не успевает - ждём, пока pipe опустеет
+            ch.paused = True
+            self._update_events(ch)
+            self._update_events(peer)
+
+    def _enable_tunnel_relay(self, ch: Channel):
+        """
+        Переводит установленный CONNECT-туннель в быстрый режим.
+        """
+        if not SPLICE_AVAILABLE:
+            return
+        for side in (ch, ch.peer):
+            try:
+                side.splice = SplicePipe()
+            except OSError as e:
+                logger.warning(f"splice недоступен: {e}")
+
+    def _on_eof(self, ch: Channel):
+        """
+        Обрабатывает закрытие соединения одной из сторон. Если другой
+        стороне ещё есть что отправить, закрытие откладывается до
+        опустошения её очереди.
+        """
+        peer = ch.peer
+        if peer is not None and not peer.closed and peer.has_output():
+            ch.eof = True
+            peer.state = ChannelState.CLOSING
+            self._update_events(ch)
+            return
+        self.on_close(ch.sock)
+
+    def _on_connect_ready(self, up: Channel):
+        """
+        Завершает неблокирующее подключение к целевому серверу.
+        """
+        connector, HOST, port, head = up.connect
+        up.connect = None
+        up.deadline.cancel()
+        up.deadline = None
+        ch = up.peer
+
+        if not connector.finish_connect(up.sock):
+            self._handle_connection_error(HOST, port, ch.sock)
+            return
+
+        logger.info(f"Успешное подключение к {HOST}:{port}")
+        pending, ch.pending = ch.pending or [], None
+        # Чтение, приостановленное при накоплении pending, возобновится,
+        # если пересылка не приостановит его снова
+        ch.paused = False
+        self._setup_forward_connection(ch, up, head)
+        for chunk in pending:
+            if ch.closed:
+                break
+            self._forward_data(ch, chunk)
+        self._update_events(ch)
+
+    def _on_connect_timeout(self, up: Channel):
+        """
+        Закрывает клиента, если целевой сервер не ответил вовремя.
+        """
+        if up.connect is None or up.closed:
+            return
+        _, HOST, port, _ = up.connect
+        up.connect = None
+        logger.error(f"Таймаут при подключении к {HOST}:{port}")
+        self._handle_connection_error(HOST, port, up.peer.sock)
+
     def _setup_forward_connection(
             self,
-            s: socket.socket,
-            forward: socket.socket,
-            method: str,
-            data: bytes,
+            ch: Channel,
+            up: Channel,
+            head: RequestHead,
     ):
         """
         Настраивает соединение с целевым сервером.
         """
         try:
-            self.channel[s]["peer"] = forward
-            self.channel[forward] = {"peer": s,
-                                     "parse": False,
-                                     "type": method}
-
-            if method == "CONNECT":
-                self._handle_https_connection(s)
+            if up.method == "CONNECT":
+                self._handle_https_connection(ch)
             else:
-                self._handle_http_connection(s, forward, data)
+                self._handle_http_connection(ch, up, head)
         except OSError as e:
             logger.error(f"Ошибка при настройке соединения: {e}")
-            self.on_close(s)
+            self.on_close(ch.sock)
 
-    def _handle_https_connection(self, s: socket.socket):
+    def _handle_https_connection(self, ch: Channel):
         """
         Обрабатывает HTTPS-соединение
         """
         try:
             logger.debug("Установка HTTPS-соединения")
-            # Отправляем успешный ответ клиенту
-            s.send(b"HTTP/1.1 200"
-                   b" Connection"
-                   b" Established\r\n\r\n")
-
             # Настраиваем соединение
-            self.channel[s]["type"] = "CONNECT"
-            self.channel[s]["parse"] = False
+            ch.state = ChannelState.TUNNEL
+            ch.peer.state = ChannelState.TUNNEL
+            if self.zero_copy:
+                self._enable_tunnel_relay(ch)
 
-            # Добавляем peer в список для мониторинга
-            peer = self.channel[s]["peer"]
-            if peer and peer not in self.input_list:
-                self.input_list.append(peer)
-                logger.debug("Peer добавлен"
-                             " в список мониторинга")
+            # Отправляем успешный ответ клиенту
+            self._send(ch, b"HTTP/1.1 200"
+                           b" Connection"
+                           b" Established\r\n\r\n")
+            self._update_events(ch.peer)
 
             logger.info("HTTPS-соединение установлено")
         except OSError as e:
             logger.error(f"Ошибка при установке"
                          f" HTTPS-соединения: {e}")
-            self.on_close(s)
+            self.on_close(ch.sock)
 
     def _handle_http_connection(
-            self, s: socket.socket,
-            forward: socket.socket,
-            data: bytes
+            self, ch: Channel,
+            up: Channel,
+            head: RequestHead
     ):
         """
         Обрабатывает HTTP-соединение.
         """
         try:
             logger.debug("Обработка HTTP-соединения")
-            new_data = modify_request(data)
-            forward.send(new_data)
-            self.channel[s]["type"] = "HTTP"
-            self.channel[s]["parse"] = False
-            self.input_list.append(forward)
+            new_data = head.rewrite()
+            ch.state = ChannelState.HTTP_RELAY
+            up.state = ChannelState.HTTP_RELAY
+            up.framer = MessageFramer(request_method=up.method)
+            self._send(up, new_data)
         except OSError as e:
             logger.error(f"Ошибка при обработке"
                          f" HTTP-соединения: {e}")
-            self.on_close(s)
+            self.on_close(ch.sock)
 
     def _handle_connection_error(self, HOST: str, PORT: int, s: socket.socket):
         """
@@ -1129,27 +1766,119 @@ class ProxyServer:
         logger.warning("Получен некорректный запрос")
         self.on_close(s)
 
-    def _forward_data(self, s: socket.socket, data: bytes):
-        peer = self.channel[s]["peer"]
-        # buf = self.channel[s].sedtdefault('resp_bu')
-        save_dump(data, "response")
-
-        if self.channel[s].get("type") != "HTTP":
-            peer.send(data)
+    def _relay_request(self, ch: Channel, data):
+        """
+        Пересылает тело текущего запроса клиента. Данные после конца
+        запроса - это следующие запросы: они откладываются в ch.inbuf,
+        а чтение от клиента приостанавливается до конца ответа.
+        """
+        req = ch.req
+        if req is not None and not req.done:
+            try:
+                used = req.feed(data)
+            except FramingError as e:
+                logger.warning(f"Некорректное тело запроса: {e}")
+                self.on_close(ch.sock)
+                return
+            if used:
+                self._send(ch.peer, data[:used])
+            data = data[used:]
+        if data and not ch.closed:
+            if ch.inbuf is None:
+                ch.inbuf = RequestReader()
+            ch.inbuf.feed(data)
+            if not ch.paused:
+                ch.paused = True
+                self._update_events(ch)
+
+    def _relay_response(self, up: Channel, data):
+        """
+        Пересылает ответ клиенту, следя за его границей.
+        """
+        framer = up.framer
+        try:
+            used = framer.feed(data)
+        except FramingError as e:
+            logger.debug(f"Ответ без корректной разметки: {e}")
+            up.framer = None
+            self._send(up.peer, data)
             return
+        self._send(up.peer, data if used == len(data) else data[:used])
+        if framer.status == 101 and framer.state == UNTIL_CLOSE:
+            self._on_upgrade(up)
+        elif framer.done and not up.closed:
+            if used < len(data):
+                logger.warning("Лишние данные после ответа сервера")
+            self._on_response_done(up, framer, used == len(data))
+
+    def _on_response_done(self, up: Channel, framer: MessageFramer,
+                          clean: bool):
+        """
+        Завершает обмен запрос-ответ: соединение с сервером уходит в пул
+        (или закрывается), клиент переходит к следующему запросу или
+        закрывается, если keep-alive невозможен.
+        """
+        ch = up.peer
+        req, ch.req = ch.req, None
+        up.framer = None
+        request_done = req is not None and req.done
+        reuse = (clean and framer.keep_alive and request_done
+                 and up.pool_key is not None and not up.out and not up.eof)
+        self._detach_upstream(up, reuse)
+
+        if request_done and req.keep_alive and clean:
+            ch.state = ChannelState.AWAITING_REQUEST
+            ch.paused = False
+            self._update_events(ch)
+            self._process_requests(ch)
+        else:
+            self._close_when_flushed(ch)
 
-        buf = self.channel[s].setdefault("resp_buf", b"") + data
-        if b"\r\n\r\n" not in buf:
-            self.channel[s]["resp_buf"] = buf
+    def _on_upgrade(self, up: Channel):
+        """
+        Переводит соединение в туннель после ответа 101 Switching
+        Protocols (WebSocket и т.п.): дальше байты идут в обе стороны
+        без разбора. Данные клиента, отложенные в ch.inbuf, уходят
+        серверу, чтение от клиента возобновляется.
+        """
+        ch = up.peer
+        if up.closed or ch is None or ch.closed:
             return
+        logger.debug("Ответ 101: соединение переведено в туннель")
+        up.framer = None
+        ch.req = None
+        ch.state = ChannelState.TUNNEL
+        up.state = ChannelState.TUNNEL
+        if self.zero_copy:
+            self._enable_tunnel_relay(ch)
+        rest, ch.inbuf = ch.inbuf.take() if ch.inbuf else b"", None
+        if rest:
+            self._send(up, rest)
+        ch.paused = False
+        self._update_events(ch)
+
+    def _detach_upstream(self, up: Channel, reuse: bool):
+        """
+        Отвязывает соединение с сервером от клиента и кладёт его в пул
+        или закрывает.
+        """
+        ch = up.peer
+        self._release_channel(up)
+        self.loop.unregister(up.fd)
+        if not (reuse and self.upstreams.release(up.pool_key, up.sock)):
+            up.sock.close()
+        if ch is not None and ch.peer is up:
+            ch.peer = None
+
+    def _forward_data(self, ch: Channel, data: bytes):
+        save_dump(data, "response")
 
-        headers, body = buf.split(b"\r\n\r\n", 1)
-        headers_str = headers.decode("utf-8", errors="ignore").lower()
-        is_html = "content-type:" in headers_str and "text/html" in headers_str
-
-        logger.debug(
-            f"is_html={is_html}, headers snippet: {headers_str[:100]!r}"
-        )
+        if ch.client and ch.state is ChannelState.HTTP_RELAY:
+            self._relay_request(ch, data)
+        elif not ch.client and ch.framer is not None:
+            self._relay_response(ch, data)
+        else:
+            self._send(ch.peer, data)
 
     def on_close(self, s: socket.socket):
         """
@@ -1157,43 +1886,94 @@ class ProxyServer:
 
         """
         try:
-            if s in self.input_list:
-                try:
-                    client_addr = s.getpeername()
-                    logger.info(f"Закрытие соединения с {client_addr}")
-                except OSError:
-                    logger.info("Закрытие соединения"
-                                " с неизвестным адресом")
-
-                self.input_list.remove(s)
-                if s in self.channel:
-                    self._cleanup_peer_connection(s)
-
-                try:
-                    s.close()
-                except OSError:
-                    pass
+            if s.fileno() == -1:
+                # Уже закрыт
+                return
+            ch = self._channel_of(s)
+            if ch is not None:
+                self._close_channel(ch)
+            else:
+                self.loop.unregister(s)
+                s.close()
         except OSError as e:
             logger.error(f"Ошибка при закрытии соединения: {e}")
 
-    def _cleanup_peer_connection(self, s: socket.socket):
+    def _close_channel(self, ch: Channel):
         """
-        Очищает связанные соединения.
+        Закрывает канал вместе со связанным каналом другой стороны.
         """
         try:
-            if s in self.channel:
-                peer = self.channel[s]["peer"]
-                if peer and peer in self.input_list:
-                    self.input_list.remove(peer)
-                    try:
-                        peer.close()
-                    except OSError:
-                        pass
-                del self.channel[s]
-                if peer in self.channel:
-                    del self.channel[peer]
-        except OSError as e:
-            logger.error(f"Ошибка при очистке соединения: {e}")
+            client_addr = ch.sock.getpeername()
+            logger.info(f"Закрытие соединения с {client_addr}")
+        except OSError:
+            logger.info("Закрытие соединения"
+                        " с неизвестным адресом")
+
+        for side in (ch, ch.peer):
+            if side is None or side.closed:
+                continue
+            self._release_channel(side)
+            # Снимаем с регистрации по номеру дескриптора: так это O(1)
+            # и работает даже для сокета, закрытого в обход on_close
+            self.loop.unregister(side.fd)
+            try:
+                side.sock.close()
+            except OSError:
+                pass
+
+    def _release_channel(self, ch: Channel):
+        """
+        Удаляет канал из таблицы и освобождает его ресурсы: таймер
+        подключения, pipe для splice и буфер чтения.
+        """
+        if self.channel.get(ch.fd) is ch:
+            del self.channel[ch.fd]
+        self.idle.remove(ch)
+        self._forget_client(ch)
+        ch.state = ChannelState.CLOSED
+        ch.connect = None
+        if ch.deadline is not None:
+            ch.deadline.cancel()
+            ch.deadline = None
+        if ch.splice is not None:
+            ch.splice.close()
+            ch.splice = None
+        if ch.rbuf is not None:
+            self.pool.release(ch.rbuf)
+            ch.rbuf = None
+        ch.out.clear()
+
+    def stats(self) -> dict:
+        """
+        Возвращает счётчики сервера.
+        """
+        resolver = self.resolver.stats()
+        snapshot = AD_SNAPSHOT
+        return {
+            "connections": len(self.channel),
+            "accepted": self.accepted,
+            "blocked": self.blocked,
+            "clients": self.clients,
+            "rejected_overflow": self.rejected_overflow,
+            "rejected_per_ip": self.rejected_per_ip,
+            "accept_pauses": self.accept_pauses,
+            "upstream_reused": self.upstreams.hits,
+            "upstream_idle": len(self.upstreams),
+            "dns_hits": resolver["hits"],
+            "dns_misses": resolver["misses"],
+            "adhost_cache_hits": AD_HOST_CACHE.hits,
+            "adhost_cache_misses": AD_HOST_CACHE.misses,
+            "blocklist_reloads": AD_RELOADER.reloads,
+            "blocklist_deltas": AD_RELOADER.deltas,
+            "blocklist_reload_seconds": AD_RELOADER.last_duration,
+            "adhost_bloom_saved": snapshot.bloom_saved if snapshot else 0,
+            "adhost_bloom_false_positives": (
+                snapshot.bloom_false_positives if snapshot else 0),
+            "blocked_by": dict(self.blocked_by),
+            "url_filter_checked": URL_FILTER.checked if URL_FILTER else 0,
+            "url_filter_matched": URL_FILTER.matched if URL_FILTER else 0,
+            "buffers_allocated": self.pool.allocated,
+        }
 
     def shutdown(self):
         """
@@ -1201,17 +1981,21 @@ class ProxyServer:
         """
         logger.info("Завершение работы сервера")
         self.running = False
+        self.loop.wakeup()
 
-        for s in list(self.input_list):
+        for ch in list(self.channel.values()):
             try:
-                if s != self.server:
-                    self.on_close(s)
+                self._close_channel(ch)
             except OSError:
                 pass
 
+        self.loop.unregister(self.server)
         try:
             self.server.close()
         except OSError:
             pass
+        self.resolver.close()
+        self.upstreams.close()
+        self.loop.close()
 
         logger.info("Сервер остановлен")
@@ -1,9 +1,53 @@
 # ad_domains.py
+import os
 import re
-from typing import Set
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
+if __name__ == "__main__" and not __package__:
+    # Запуск скриптом из каталога Server (python ad_domens.py): пакеты
+    # Server и Logs лежат уровнем выше
+    sys.path.insert(
+        0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-def extract_domains(input_lines: list) -> Set[str]:
+from Server.blocklist import (EXCEPTION_PREFIX, Delta, fingerprint,
+                              load_blocklist, write_snapshot)
+
+# Буфер чтения списка при компиляции, байты
+READ_CHUNK = 64 * 1024
+
+# Сетевое правило на весь домен: [@@]||домен^ (или ^|), опции после $
+NETWORK_RULE = re.compile(
+    r"\s*(@@)?\|\|([a-zA-Z0-9.-]+)\^\|?(?:\$(\S*))?\s*$")
+
+# Опции, не сужающие правило: домен блокируется (или разрешается)
+# целиком. Прокси не отличает сторонние запросы, поэтому third-party
+# тоже считается правилом на весь домен; правила с $domain=, типами
+# ресурсов и прочими ограничениями пропускаются
+DOMAIN_RULE_OPTIONS = {"important", "all", "document", "doc",
+                       "third-party", "3p"}
+
+# Форматы списков: правила Adblock (EasyList, EasyPrivacy), hosts-файл
+# ("0.0.0.0 домен"), список доменов по одному на строку
+FORMAT_ADBLOCK = "adblock"
+FORMAT_HOSTS = "hosts"
+FORMAT_DOMAINS = "domains"
+
+# Строка hosts-файла: адрес и имена
+HOSTS_LINE = re.compile(r"\s*(?:0\.0\.0\.0|127\.\d+\.\d+\.\d+|::1?|::)"
+                        r"\s+([^#]+)")
+
+# Допустимое имя домена после нормализации
+DOMAIN_NAME = re.compile(r"[a-z0-9_-]+(?:\.[a-z0-9_-]+)+")
+
+# Имена из hosts-файлов, которые не являются рекламными доменами
+HOSTS_IGNORED = {"localhost", "localhost.localdomain", "local",
+                 "broadcasthost", "ip6-localhost", "ip6-loopback",
+                 "0.0.0.0"}
+
+
+def extract_domains(input_lines: Iterable[str]) -> Set[str]:
     """Извлекает домены из списка
      строк по правилам EasyList."""
     pattern = re.compile(r"^([^#|/$@:\s]+)")
@@ -31,18 +75,341 @@ def save_domains(domains: Set[str],
         raise RuntimeError(f"Ошибка записи файла: {e}")
 
 
+def parse_network_rule(line: str) -> Optional[Tuple[str, bool]]:
+    """
+    Разбирает правило EasyList, действующее на домен целиком.
+
+    Returns:
+        Optional[Tuple[str, bool]]: (домен, правило-исключение @@) или
+            None, если строка не является таким правилом (комментарии,
+            косметические правила, правила на пути, правила с $domain=)
+    """
+    match = NETWORK_RULE.match(line)
+    if match is None:
+        return None
+    exception, domain, options = match.groups()
+    if ".." in domain or domain[0] == "." or domain[-1] == ".":
+        return None
+    if options and not DOMAIN_RULE_OPTIONS.issuperset(
+            options.lower().split(",")):
+        return None
+    return domain.lower(), exception is not None
+
+
+def prune_domains(domains: Set[str],
+                  allowed: Optional[Set[str]] = None) -> Set[str]:
+    """
+    Убирает домены, покрытые родительским доменом из того же множества
+    (a.ads.com не нужен, если есть ads.com), и домены, совпадающие с
+    разрешёнными allowed или вложенные в них.
+    """
+    allowed = allowed or set()
+    pruned = set()
+    for domain in domains:
+        if domain in allowed:
+            continue
+        # Один проход по родительским доменам: покрыт блокируемым
+        # (значит, лишний) или разрешённым (значит, не блокируется)
+        dot = domain.find(".")
+        while dot != -1:
+            parent = domain[dot + 1:]
+            if parent in domains or parent in allowed:
+                break
+            dot = domain.find(".", dot + 1)
+        else:
+            pruned.add(domain)
+    return pruned
+
+
+def exception_entries(domains: Set[str], allowed: Set[str]) -> Set[str]:
+    """
+    Записи-исключения (EXCEPTION_PREFIX + домен) для разрешённых
+    доменов, вложенных в блокируемый домен из domains: без них прокси
+    заблокировал бы их по родительскому. Исключения для остальных
+    доменов не нужны - prune_domains уже убрал всё, что они разрешают.
+    """
+    entries = set()
+    for domain in allowed:
+        dot = domain.find(".")
+        while dot != -1:
+            if domain[dot + 1:] in domains:
+                entries.add(EXCEPTION_PREFIX + domain)
+                break
+            dot = domain.find(".", dot + 1)
+    return entries
+
+
+def collect_rules(lines: Iterable[str]) -> Tuple[Set[str], Set[str]]:
+    """
+    Собирает домены сетевых правил EasyList: блокируемые и разрешённые
+    исключениями @@. Строки читаются по одной, в памяти держатся только
+    домены правил.
+    """
+    blocked = set()
+    allowed = set()
+    for line in lines:
+        # Быстрый отсев: правило на домен начинается с || или @@||
+        prefix = line[:2]
+        if prefix != "||" and prefix != "@@" and not line[:1].isspace():
+            continue
+        rule = parse_network_rule(line)
+        if rule is not None:
+            domain, exception = rule
+            (allowed if exception else blocked).add(domain)
+    return blocked, allowed
+
+
+def compile_rules(lines: Iterable[str]) -> Set[str]:
+    """
+    Потоково компилирует правила EasyList в множество блокируемых
+    доменов.
+
+    Домен, совпадающий с исключением @@||домен^ или вложенный в него,
+    не блокируется; домены, покрытые родительским, убираются.
+    Исключение для поддомена блокируемого домена сохраняется записью
+    "@@поддомен" (см. exception_entries).
+    """
+    blocked, allowed = collect_rules(lines)
+    domains = prune_domains(blocked, allowed)
+    return domains | exception_entries(domains, allowed)
+
+
+def normalize_domain(name: str) -> Optional[str]:
+    """Приводит имя к нижнему регистру без точки в конце или None."""
+    name = name.strip().lower().rstrip(".")
+    if DOMAIN_NAME.fullmatch(name) is None:
+        return None
+    return name
+
+
+def detect_format(path: str) -> str:
+    """
+    Определяет формат списка по первым значимым строкам.
+    """
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line[0] in "#!":
+                continue
+            if (line.startswith(("[Adblock", "||", "@@", "/"))
+                    or "##" in line or "^" in line):
+                return FORMAT_ADBLOCK
+            if HOSTS_LINE.match(line):
+                return FORMAT_HOSTS
+            return FORMAT_DOMAINS
+    return FORMAT_DOMAINS
+
+
+def collect_list(path: str, fmt: Optional[str] = None
+                 ) -> Tuple[Set[str], Set[str]]:
+    """
+    Читает один список любого формата.
+
+    Returns:
+        Tuple[Set[str], Set[str]]: Блокируемые домены и домены,
+            разрешённые исключениями (только у списков Adblock)
+    """
+    fmt = fmt or detect_format(path)
+    with open(path, "r", encoding="utf-8", buffering=READ_CHUNK) as f:
+        if fmt == FORMAT_ADBLOCK:
+            return collect_rules(f)
+        blocked = set()
+        for line in f:
+            if fmt == FORMAT_HOSTS:
+                match = HOSTS_LINE.match(line)
+                names = match.group(1).split() if match else ()
+            else:
+                names = line.split("#", 1)[0].split("!", 1)[0].split()
+            for name in names:
+                domain = normalize_domain(name)
+                if domain is not None and domain not in HOSTS_IGNORED:
+                    blocked.add(domain)
+        return blocked, set()
+
+
+def _collect_source(path: str) -> Tuple[Set[str], Set[str]]:
+    # Выполняется в процессе пула, поэтому функция модульного уровня
+    return collect_list(path)
+
+
+def merge_lists(paths: List[str],
+                workers: Optional[int] = None) -> Dict[str, str]:
+    """
+    Разбирает несколько списков параллельно (по процессу на список) и
+    объединяет их.
+
+    Исключения @@ любого списка действуют на все списки. Домены,
+    покрытые родительским доменом из любого списка, убираются. Если
+    домен есть в нескольких списках, источником считается первый из
+    paths. Исключения для поддоменов блокируемых доменов входят в
+    результат записями "@@поддомен" (см. exception_entries).
+
+    Returns:
+        Dict[str, str]: Домен -> имя списка-источника (имя файла)
+    """
+    if workers is None:
+        workers = min(len(paths), os.cpu_count() or 1)
+    if workers > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_collect_source, paths))
+    else:
+        results = [collect_list(path) for path in paths]
+
+    provenance: Dict[str, str] = {}
+    allowed: Dict[str, str] = {}
+    for path, (blocked, exceptions) in zip(paths, results):
+        source = os.path.basename(path)
+        for domain in blocked:
+            provenance.setdefault(domain, source)
+        for domain in exceptions:
+            allowed.setdefault(domain, source)
+    kept = prune_domains(provenance.keys(), allowed.keys())
+    merged = {domain: provenance[domain] for domain in kept}
+    for entry in exception_entries(kept, allowed.keys()):
+        merged[entry] = allowed[entry[len(EXCEPTION_PREFIX):]]
+    return merged
+
+
+def compile_lists(paths: List[str], output_file: str,
+                  snapshot_file: Optional[str] = None,
+                  workers: Optional[int] = None,
+                  delta_file: Optional[str] = None,
+                  bloom_fp_rate: Optional[float] = None) -> int:
+    """
+    Компилирует несколько списков (EasyList, EasyPrivacy, hosts-файлы,
+    списки доменов) в один список для прокси. В снимок записывается
+    источник каждого домена, по нему прокси сообщает, какой список
+    заблокировал запрос.
+
+    Args:
+        delta_file: Куда записать изменения относительно предыдущей
+            компиляции (см. save_delta). Пишется только без снимка:
+            снимок прокси перезагружает целиком, это и так дёшево, а
+            дельту применяет лишь к списку из текстового файла
+        bloom_fp_rate: Доля ложных срабатываний фильтра Блума в снимке
+            (None - без фильтра)
+
+    Returns:
+        int: Число записанных доменов
+    """
+    if snapshot_file is not None and delta_file is not None:
+        # Старая дельта не относится к новому списку
+        if os.path.exists(delta_file):
+            os.remove(delta_file)
+        delta_file = None
+    try:
+        provenance = merge_lists(paths, workers)
+        previous = (load_previous(output_file)
+                    if delta_file is not None else None)
+    except FileNotFoundError as e:
+        raise RuntimeError(f"Входной файл не найден: {e.filename}")
+    except UnicodeDecodeError:
+        raise RuntimeError("Ошибка декодирования файла")
+    domains = set(provenance)
+    count = save_domains(domains, output_file)
+    if snapshot_file is not None:
+        save_snapshot(domains, snapshot_file, provenance, bloom_fp_rate)
+    if delta_file is not None:
+        save_delta(domains, previous, output_file, delta_file)
+    return count
+
+
+def load_previous(output_file: str):
+    """
+    Результат предыдущей компиляции - текстовый список output_file, или
+    None. Нужен только для дельты, а она пишется лишь без снимка.
+    """
+    if not os.path.exists(output_file):
+        return None
+    return load_blocklist(output_file)[0]
+
+
+def save_delta(domains: Set[str], previous, output_file: str,
+               delta_file: str) -> Optional[Delta]:
+    """
+    Записывает дельту от предыдущего списка previous к domains, уже
+    сохранённым в output_file. Прокси применяет её к загруженному
+    списку на месте, вместо того чтобы перечитывать output_file.
+
+    Returns:
+        Optional[Delta]: Дельта или None, если предыдущего списка нет
+            (старая дельта тогда удаляется)
+    """
+    try:
+        if previous is None:
+            if os.path.exists(delta_file):
+                os.remove(delta_file)
+            return None
+        st = os.stat(output_file)
+        delta = Delta(
+            text=(st.st_size, st.st_mtime_ns),
+            base=fingerprint(previous),
+            target=fingerprint(domains),
+            added=sorted(d for d in domains if d not in previous),
+            removed=sorted(d for d in previous if d not in domains))
+        delta.write(delta_file)
+        return delta
+    except IOError as e:
+        raise RuntimeError(f"Ошибка записи файла: {e}")
+
+
+def compile_adblock_list(input_file: str,
+                         output_file: str,
+                         snapshot_file: Optional[str] = None) -> int:
+    """
+    Компилирует EasyList в список доменов (и снимок) для прокси.
+
+    В отличие от process_adblock_list учитывает только сетевые правила
+    ||домен^ с исключениями и опциями, а файл читается построчно, без
+    загрузки целиком.
+
+    Returns:
+        int: Число записанных доменов
+    """
+    try:
+        with open(input_file, "r", encoding="utf-8",
+                  buffering=READ_CHUNK) as f:
+            domains = compile_rules(f)
+    except FileNotFoundError:
+        raise RuntimeError("Входной файл не найден")
+    except UnicodeDecodeError:
+        raise RuntimeError("Ошибка декодирования файла")
+    count = save_domains(domains, output_file)
+    if snapshot_file is not None:
+        save_snapshot(domains, snapshot_file)
+    return count
+
+
+def save_snapshot(domains: Set[str],
+                  output_file: str,
+                  provenance: Optional[Dict[str, str]] = None,
+                  bloom_fp_rate: Optional[float] = None) -> int:
+    """
+    Сохраняет домены в бинарный снимок, который прокси отображает в
+    память (Server.blocklist.Snapshot) вместо чтения текстового списка.
+    С bloom_fp_rate в снимок добавляется фильтр Блума по всем доменам.
+    """
+    try:
+        return write_snapshot(domains, output_file, provenance,
+                              bloom_fp_rate)
+    except IOError as e:
+        raise RuntimeError(f"Ошибка записи файла: {e}")
+
+
 def process_adblock_list(input_file: str,
-                         output_file: str) -> None:
+                         output_file: str,
+                         snapshot_file: Optional[str] = None) -> None:
     """Основная функция обработки файла."""
     try:
         with open(input_file, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-
-        domains = extract_domains(lines)
+            domains = extract_domains(f)
         count = save_domains(domains, output_file)
         print(f"Сохранено"
               f" {count} доменов в"
               f" {output_file}")
+        if snapshot_file is not None:
+            save_snapshot(domains, snapshot_file)
+            print(f"Снимок записан в {snapshot_file}")
 
     except FileNotFoundError:
         raise RuntimeError("Входной файл не найден")
@@ -51,5 +418,25 @@ def process_adblock_list(input_file: str,
 
 
 if __name__ == "__main__":
-    process_adblock_list("../easylist.txt",
-                         "ad_hosts.txt")
+    # python ad_domens.py [--bloom ДОЛЯ | --text] [список ...]
+    # --text: только ad_hosts.txt и дельта ad_hosts.delta, без снимка
+    args = sys.argv[1:]
+    bloom_fp_rate = None
+    snapshot_file: Optional[str] = "ad_hosts.bin"
+    while args[:1] in (["--bloom"], ["--text"]):
+        if args[0] == "--bloom":
+            bloom_fp_rate = float(args[1])
+            args = args[2:]
+        else:
+            snapshot_file = None
+            args = args[1:]
+    if snapshot_file is None and os.path.exists("ad_hosts.bin"):
+        # Прокси предпочёл бы устаревший снимок текстовому списку
+        os.remove("ad_hosts.bin")
+    count = compile_lists(args or ["../easylist.txt"],
+                          "ad_hosts.txt",
+                          snapshot_file,
+                          delta_file="ad_hosts.delta",
+                          bloom_fp_rate=bloom_fp_rate)
+    print(f"Сохранено {count} доменов в ad_hosts.txt"
+          f"{' и ad_hosts.bin' if snapshot_file else ''}")
@@ -0,0 +1,439 @@
+import asyncio
+import socket
+from typing import Dict, Optional
+
+from Logs.logger import get_logger
+from Server.http_message import (UNTIL_CLOSE, FramingError, MessageFramer,
+                                 RequestHead, RequestReader)
+import Server.ProxyServer as ps
+from Server.ProxyServer import (AD_HOST_CACHE, AD_RELOADER,
+                                BLOCKLIST_CHECK_INTERVAL, BUFFER_SIZE,
+                                CONNECT_TIMEOUT, HTTP_IDLE_TIMEOUT,
+                                REQUEST_TIMEOUT, TUNNEL_IDLE_TIMEOUT,
+                                block_reason, save_dump)
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+logger = get_logger()
+
+# Размер чтения при пересылке, байты
+RELAY_CHUNK = 64 * 1024
+
+FORBIDDEN = b"HTTP/1.1 403 Forbidden\r\n\r\n"
+NO_CONTENT = b"HTTP/1.1 204 No Content\r\nContent-Length: 0\r\n\r\n"
+ESTABLISHED = b"HTTP/1.1 200 Connection Established\r\n\r\n"
+
+
+class AsyncProxyServer:
+    """
+    Прокси-сервер на asyncio.
+
+    Обрабатывает запросы так же, как ProxyServer: каждый запрос
+    keep-alive соединения разбирается (RequestReader, MessageFramer),
+    отдельно проверяется по списку рекламных доменов и получает те же
+    ответы 403/204; счётчики stats() совпадают по смыслу. Каждое
+    соединение обслуживается отдельной корутиной. DNS разрешается через
+    loop.getaddrinfo, дампы пишутся в пуле потоков, так что сервер
+    легко объединяется с другими асинхронными компонентами.
+    """
+
+    def __init__(self, HOST: str, PORT: int, dump: bool = True,
+                 connect_timeout: float = CONNECT_TIMEOUT):
+        """
+        Args:
+            dump: Сохранять дампы трафика (как ProxyServer)
+            connect_timeout: Таймаут подключения к целевому серверу
+        """
+        self.host = HOST
+        self.port = PORT
+        self.dump = dump
+        self.connect_timeout = connect_timeout
+        self.server: Optional[asyncio.AbstractServer] = None
+        self._reload_timer: Optional[asyncio.TimerHandle] = None
+        self.connections = 0
+        self.accepted = 0
+        self.blocked = 0
+        self.blocked_by: Dict[str, int] = {}
+        self.upstream_reused = 0
+
+    async def start(self):
+        self.server = await asyncio.start_server(
+            self.handle_client, self.host, self.port, backlog=200)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self._check_blocklist()
+        logger.info(f"Асинхронный прокси-сервер запущен на"
+                    f" {self.host}:{self.port}")
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    def _check_blocklist(self):
+        """Проверка файла списка рекламных доменов, как в ProxyServer."""
+        loop = asyncio.get_running_loop()
+        AD_RELOADER.poll(loop.call_soon_threadsafe)
+        self._reload_timer = loop.call_later(BLOCKLIST_CHECK_INTERVAL,
+                                             self._check_blocklist)
+
+    async def close(self):
+        if self._reload_timer is not None:
+            self._reload_timer.cancel()
+            self._reload_timer = None
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            logger.info("Асинхронный прокси-сервер остановлен")
+
+    def _dump(self, data: bytes, direction: str):
+        if self.dump:
+            asyncio.get_running_loop().run_in_executor(
+                None, save_dump, bytes(data), direction)
+
+    async def handle_client(self, reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter):
+        """
+        Обрабатывает одно клиентское соединение.
+
+        Запросы читаются по одному: каждый отдельно проверяется по
+        списку рекламных доменов и направляется к своему серверу.
+        Соединение с сервером остаётся открытым, пока следующие запросы
+        идут к нему же.
+        """
+        self.accepted += 1
+        self.connections += 1
+        peer = writer.get_extra_info("peername")
+        logger.info(f"Новое подключение от {peer}")
+        client = RequestReader()
+        upstream = None
+        try:
+            while True:
+                try:
+                    head = await self._next_head(reader, client)
+                except FramingError as e:
+                    logger.warning(f"Некорректный запрос: {e}")
+                    return
+                if head is None:
+                    return
+                method, HOST, port = head.method, head.host, head.port
+
+                reason = block_reason(head)
+                if reason is not None:
+                    if not await self._block_request(writer, head, *reason):
+                        return
+                    continue
+
+                if not (method and HOST and port):
+                    logger.warning("Получен некорректный запрос")
+                    return
+
+                logger.debug(f"Запрос: {method} {HOST}:{port}")
+                if (upstream is not None and upstream[0] == (HOST, port)
+                        and not upstream[1].at_eof()):
+                    self.upstream_reused += 1
+                else:
+                    if upstream is not None:
+                        upstream[2].close()
+                        upstream = None
+                    connection = await self._connect(HOST, port)
+                    if connection is None:
+                        return
+                    upstream = ((HOST, port),) + connection
+                _, up_reader, up_writer = upstream
+
+                if method == "CONNECT":
+                    writer.write(ESTABLISHED)
+                    logger.info("HTTPS-соединение установлено")
+                    await self._tunnel(reader, writer, up_reader, up_writer,
+                                       client.take())
+                    return
+
+                try:
+                    keep_client, keep_upstream = await self._exchange(
+                        head, client, reader, writer, up_reader, up_writer)
+                except FramingError:
+                    logger.warning("Получен некорректный запрос")
+                    return
+                if not keep_client:
+                    return
+                if not keep_upstream:
+                    up_writer.close()
+                    upstream = None
+        except (asyncio.TimeoutError, ConnectionError) as e:
+            logger.debug(f"Соединение {peer} прервано: {e!r}")
+        except OSError as e:
+            logger.error(f"Ошибка при обработке соединения: {e}")
+        finally:
+            self.connections -= 1
+            if upstream is not None:
+                upstream[2].close()
+            writer.close()
+            logger.info(f"Закрытие соединения с {peer}")
+
+    async def _next_head(self, reader: asyncio.StreamReader,
+                         client: RequestReader) -> Optional[RequestHead]:
+        """
+        Дочитывает заголовки следующего запроса клиента.
+
+        Returns:
+            RequestHead: Запрос или None, если клиент закрыл соединение
+
+        Raises:
+            FramingError: Некорректные или слишком большие заголовки
+        """
+        while True:
+            head = client.next_head()
+            if head is not None:
+                return head
+            data = await asyncio.wait_for(reader.read(BUFFER_SIZE),
+                                          REQUEST_TIMEOUT)
+            if not data:
+                return None
+            self._dump(data, "request")
+            client.feed(data)
+
+    async def _block_request(self, writer: asyncio.StreamWriter,
+                             head: RequestHead, source: str,
+                             rule: Optional[str] = None) -> bool:
+        """
+        Отвечает на запрос к рекламному домену (или по правилу на URL
+        rule) вместо сервера.
+
+        Returns:
+            bool: Можно ли читать следующий запрос клиента
+        """
+        self.blocked += 1
+        self.blocked_by[source] = self.blocked_by.get(source, 0) + 1
+        if rule is not None:
+            source = f"{source}: {rule}"
+        logger.info(f"Блокировка запроса к рекламному домену:"
+                    f" {head.host} (список: {source},"
+                    f" total blocked: {self.blocked})")
+        if head.method == "CONNECT":
+            writer.write(FORBIDDEN)
+            await writer.drain()
+            return False
+        writer.write(NO_CONTENT)
+        self._dump(NO_CONTENT, "blocked")
+        await writer.drain()
+        try:
+            request = MessageFramer.for_request(head)
+        except FramingError:
+            return False
+        # Тело запроса пропускать не будем - закрываем соединение
+        return request.done and request.keep_alive
+
+    async def _connect(self, HOST: str, port: int):
+        """
+        Подключается к целевому серверу.
+
+        Returns:
+            tuple: (StreamReader, StreamWriter) или None при ошибке
+        """
+        try:
+            up_reader, up_writer = await asyncio.wait_for(
+                asyncio.open_connection(HOST, port), self.connect_timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            logger.error(f"Не удалось подключиться к {HOST}:{port}: {e}")
+            return None
+        sock = up_writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return up_reader, up_writer
+
+    async def _exchange(self, head: RequestHead, client: RequestReader,
+                        reader: asyncio.StreamReader,
+                        writer: asyncio.StreamWriter,
+                        up_reader: asyncio.StreamReader,
+                        up_writer: asyncio.StreamWriter):
+        """
+        Пересылает один запрос и ответ на него. Тело запроса идёт
+        серверу параллельно с ответом (сервер может ответить раньше,
+        например 100 Continue); данные после конца запроса остаются в
+        client.
+
+        Returns:
+            tuple: (можно ли читать следующий запрос клиента, можно ли
+                снова использовать соединение с сервером)
+
+        Raises:
+            FramingError: Некорректная разметка запроса
+        """
+        request = MessageFramer.for_request(head)
+        up_writer.write(head.rewrite())
+        sender = None
+        if not request.done:
+            sender = asyncio.ensure_future(
+                self._send_body(request, client, reader, up_writer))
+        response = MessageFramer(request_method=head.method)
+        try:
+            clean = await self._relay_response(response, up_reader, writer)
+        finally:
+            if sender is not None:
+                sender.cancel()
+
+        if response.status == 101 and response.state == UNTIL_CLOSE:
+            # Сервер перешёл на другой протокол (WebSocket и т.п.):
+            # дальше байты идут в обе стороны без разбора
+            logger.debug("Ответ 101: соединение переведено в туннель")
+            await self._tunnel(reader, writer, up_reader, up_writer,
+                               client.take())
+            return False, False
+        keep_client = clean and request.done and request.keep_alive
+        return keep_client, clean and request.done and response.keep_alive
+
+    async def _send_body(self, request: MessageFramer,
+                         client: RequestReader,
+                         reader: asyncio.StreamReader,
+                         up_writer: asyncio.StreamWriter):
+        """
+        Пересылает тело запроса серверу; данные после конца запроса
+        возвращаются в client.
+        """
+        data = client.take()
+        try:
+            while True:
+                if data:
+                    used = request.feed(data)
+                    if used < len(data):
+                        client.feed(data[used:])
+                    if used:
+                        up_writer.write(data[:used])
+                        await up_writer.drain()
+                if request.done:
+                    return
+                data = await asyncio.wait_for(reader.read(RELAY_CHUNK),
+                                              HTTP_IDLE_TIMEOUT)
+                if not data:
+                    return
+                self._dump(data, "request")
+        except FramingError as e:
+            logger.warning(f"Некорректное тело запроса: {e}")
+        except (asyncio.TimeoutError, OSError) as e:
+            logger.debug(f"Тело запроса не передано: {e!r}")
+
+    async def _relay_response(self, response: MessageFramer,
+                              up_reader: asyncio.StreamReader,
+                              writer: asyncio.StreamWriter) -> bool:
+        """
+        Пересылает ответ клиенту, следя за его границей. Ответ без
+        корректной разметки пересылается до закрытия соединения.
+
+        Returns:
+            bool: Ответ закончился ровно на границе прочитанных данных
+        """
+        while True:
+            data = await asyncio.wait_for(up_reader.read(RELAY_CHUNK),
+                                          HTTP_IDLE_TIMEOUT)
+            if not data:
+                return False
+            self._dump(data, "response")
+            try:
+                used = response.feed(data)
+            except FramingError as e:
+                logger.debug(f"Ответ без корректной разметки: {e}")
+                writer.write(data)
+                await self._relay(up_reader, writer, HTTP_IDLE_TIMEOUT,
+                                  "response")
+                return False
+            writer.write(data if used == len(data) else data[:used])
+            await writer.drain()
+            if response.status == 101 and response.state == UNTIL_CLOSE:
+                return True
+            if response.done:
+                if used < len(data):
+                    logger.warning("Лишние данные после ответа сервера")
+                return used == len(data)
+
+    async def _tunnel(self, reader: asyncio.StreamReader,
+                      writer: asyncio.StreamWriter,
+                      up_reader: asyncio.StreamReader,
+                      up_writer: asyncio.StreamWriter, rest: bytes):
+        """
+        Пересылает байты в обе стороны без разбора до закрытия одной из
+        сторон. rest - уже прочитанные данные клиента.
+        """
+        if rest:
+            up_writer.write(rest)
+        tasks = [
+            asyncio.ensure_future(self._relay(
+                reader, up_writer, TUNNEL_IDLE_TIMEOUT, "request")),
+            asyncio.ensure_future(self._relay(
+                up_reader, writer, TUNNEL_IDLE_TIMEOUT, "response")),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _relay(self, reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter, idle: float,
+                     direction: str):
+        """
+        Пересылает данные в одну сторону до EOF или таймаута простоя.
+        drain() даёт обратное давление: чтение ждёт, пока получатель
+        не примет данные.
+        """
+        try:
+            while True:
+                data = await asyncio.wait_for(reader.read(RELAY_CHUNK),
+                                              idle)
+                if not data:
+                    break
+                self._dump(data, direction)
+                writer.write(data)
+                await writer.drain()
+        finally:
+            if writer.can_write_eof() and not writer.is_closing():
+                try:
+                    writer.write_eof()
+                except OSError:
+                    pass
+
+    def stats(self) -> dict:
+        """
+        Возвращает счётчики сервера под теми же именами, что и
+        ProxyServer.stats.
+        """
+        snapshot = ps.AD_SNAPSHOT
+        url_filter = ps.URL_FILTER
+        return {
+            "connections": self.connections,
+            "accepted": self.accepted,
+            "blocked": self.blocked,
+            "upstream_reused": self.upstream_reused,
+            "adhost_cache_hits": AD_HOST_CACHE.hits,
+            "adhost_cache_misses": AD_HOST_CACHE.misses,
+            "blocklist_reloads": AD_RELOADER.reloads,
+            "blocklist_deltas": AD_RELOADER.deltas,
+            "blocklist_reload_seconds": AD_RELOADER.last_duration,
+            "adhost_bloom_saved": snapshot.bloom_saved if snapshot else 0,
+            "adhost_bloom_false_positives": (
+                snapshot.bloom_false_positives if snapshot else 0),
+            "blocked_by": dict(self.blocked_by),
+            "url_filter_checked": url_filter.checked if url_filter else 0,
+            "url_filter_matched": url_filter.matched if url_filter else 0,
+        }
+
+
+def new_event_loop(use_uvloop: bool = True) -> asyncio.AbstractEventLoop:
+    """Создаёт цикл событий: uvloop, если установлен, иначе asyncio."""
+    if use_uvloop and uvloop is not None:
+        return uvloop.new_event_loop()
+    return asyncio.new_event_loop()
+
+
+def run(HOST: str, PORT: int, use_uvloop: bool = True):
+    """Запускает асинхронный прокси до прерывания."""
+    loop = new_event_loop(use_uvloop)
+    server = AsyncProxyServer(HOST, PORT)
+    try:
+        loop.run_until_complete(server.serve_forever())
+    finally:
+        loop.run_until_complete(server.close())
+        loop.close()
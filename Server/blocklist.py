@@ -0,0 +1,727 @@
+import collections
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from array import array
+from typing import (Callable, Container, Iterable, Iterator, List, Mapping,
+                    Optional, Tuple)
+
+from Logs.logger import get_logger
+
+logger = get_logger()
+
+# Сколько решений "блокировать/пропустить" хранит кэш хостов
+DECISION_CACHE_SIZE = 4096
+
+# Заголовок снимка: сигнатура, версия формата, число списков-источников,
+# число доменов, число ячеек хэш-таблицы; за ним - размер фильтра Блума
+# в битах и число хэш-функций (нули, если фильтра нет)
+SNAPSHOT_MAGIC = b"ADHS"
+SNAPSHOT_VERSION = 3
+SNAPSHOT_HEADER = struct.Struct("<4sHHII")
+BLOOM_HEADER = struct.Struct("<II")
+
+# Префикс записей-исключений списка (как @@ в EasyList): запись
+# "@@good.ads.com" разрешает good.ads.com и его поддомены, даже если
+# ads.com в списке
+EXCEPTION_PREFIX = "@@"
+
+
+def _excepted(hosts: Container[str], hst: str, match: str) -> bool:
+    """
+    Есть ли в hosts исключение для hst, не менее точное, чем найденная
+    запись match (сам hst или его родительский домен вплоть до match).
+    """
+    suffix = hst
+    while True:
+        if EXCEPTION_PREFIX + suffix in hosts:
+            return True
+        if len(suffix) <= len(match):
+            return False
+        suffix = suffix[suffix.find(".") + 1:]
+
+
+def matching_domain(hosts: Container[str], hst: str) -> Optional[str]:
+    """
+    Запись hosts, по которой блокируется hst: сам домен или ближайший
+    родительский, или None (в том числе если более точная запись -
+    исключение).
+    """
+    match = None
+    if hst in hosts:
+        match = hst
+    else:
+        dot = hst.find(".")
+        while dot != -1:
+            suffix = hst[dot + 1:]
+            if suffix in hosts:
+                match = suffix
+                break
+            dot = hst.find(".", dot + 1)
+    if match is None or _excepted(hosts, hst, match):
+        return None
+    return match
+
+
+def match_domain(hosts: Container[str], hst: str) -> bool:
+    """
+    Есть ли в hosts сам домен hst или любой из его родительских доменов.
+
+    Суффиксы хоста перебираются по границам меток справа от каждой
+    точки ("a.ads.com" -> "ads.com" -> "com"), и каждый ищется в
+    множестве, так что проверка стоит O(число меток), а не O(размер
+    списка). Исключения (EXCEPTION_PREFIX) проверяются только при
+    совпадении: побеждает самая точная запись.
+    """
+    if hst in hosts:
+        return not _excepted(hosts, hst, hst)
+    dot = hst.find(".")
+    while dot != -1:
+        suffix = hst[dot + 1:]
+        if suffix in hosts:
+            return not _excepted(hosts, hst, suffix)
+        dot = hst.find(".", dot + 1)
+    return False
+
+
+def _mutator(name: str):
+    method = getattr(set, name)
+
+    def wrapper(self, *args):
+        result = method(self, *args)
+        self.generation += 1
+        return result
+
+    wrapper.__name__ = name
+    return wrapper
+
+
+class DomainSet(set):
+    """
+    Множество рекламных доменов с номером поколения.
+
+    Любое изменение множества увеличивает generation, по нему кэш
+    решений понимает, что сохранённые ответы устарели.
+    """
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.generation = 0
+
+
+for _name in ("add", "discard", "remove", "pop", "clear", "update",
+              "difference_update", "intersection_update",
+              "symmetric_difference_update", "__ior__", "__iand__",
+              "__isub__", "__ixor__"):
+    setattr(DomainSet, _name, _mutator(_name))
+del _name
+
+
+class DecisionCache:
+    """
+    LRU-кэш решений is_ad_host: хост -> блокировать ли его.
+
+    Браузер обращается к одним и тем же сотням хостов, так что после
+    прогрева проверка сводится к одному поиску в словаре. Кэш привязан к
+    конкретному множеству доменов и его поколению: если множество
+    заменили или изменили, при следующем обращении кэш целиком
+    сбрасывается.
+    """
+
+    def __init__(self, maxsize: int = DECISION_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data: collections.OrderedDict = collections.OrderedDict()
+        self._hosts: Optional[DomainSet] = None
+        self._snapshot: Optional[Snapshot] = None
+        self._generation = -1
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def lookup(self, hosts: DomainSet, hst: str,
+               snapshot: Optional["Snapshot"] = None) -> bool:
+        """
+        Решение для hst по списку hosts и снимку snapshot, из кэша или
+        через match_domain.
+        """
+        if (hosts is not self._hosts or snapshot is not self._snapshot
+                or hosts.generation != self._generation):
+            self.invalidate()
+            self._hosts = hosts
+            self._snapshot = snapshot
+            self._generation = hosts.generation
+        data = self._data
+        decision = data.get(hst)
+        if decision is not None:
+            data.move_to_end(hst)
+            self.hits += 1
+            return decision
+        self.misses += 1
+        decision = match_domain(hosts, hst) or (
+            snapshot is not None and match_domain(snapshot, hst))
+        if self.maxsize > 0:
+            data[hst] = decision
+            if len(data) > self.maxsize:
+                data.popitem(last=False)
+        return decision
+
+    def invalidate(self):
+        """Сбрасывает все сохранённые решения."""
+        if self._data:
+            self._data.clear()
+            self.invalidations += 1
+        self._hosts = self._snapshot = None
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+def bloom_size(count: int, fp_rate: float) -> Tuple[int, int]:
+    """
+    Размер фильтра Блума на count доменов с долей ложных срабатываний
+    fp_rate.
+
+    Returns:
+        Tuple[int, int]: Число бит и число хэш-функций
+    """
+    if not 0 < fp_rate < 1:
+        raise ValueError(f"Доля ложных срабатываний должна быть от 0 до 1,"
+                         f" а не {fp_rate}")
+    nbits = max(64, math.ceil(-count * math.log(fp_rate) / math.log(2) ** 2))
+    return nbits, max(1, round(nbits / max(count, 1) * math.log(2)))
+
+
+def write_snapshot(domains: Iterable[str], path: str,
+                   provenance: Optional[Mapping[str, str]] = None,
+                   bloom_fp_rate: Optional[float] = None) -> int:
+    """
+    Записывает домены в бинарный снимок для Snapshot.
+
+    Формат: заголовок SNAPSHOT_HEADER и BLOOM_HEADER; таблица имён
+    списков-источников ("длина (1 байт) + имя", выровнена до 4 байт);
+    биты фильтра Блума (выровнены до 4 байт); хэш-таблица с
+    открытой адресацией (ячейки uint32 little-endian, 0 - пусто, иначе
+    смещение записи + 1); записи "длина (1 байт) + домен + номер
+    источника (1 байт, 0 - неизвестен)". Ячейка домена - crc32 & (ячеек
+    - 1), коллизии разрешаются линейным пробированием, таблица
+    заполнена не больше чем наполовину. Бит i-й хэш-функции фильтра -
+    (crc32 + i * (adler32 | 1)) mod (число бит). Файл заменяется
+    атомарно, так что процессы, отобразившие старый снимок, продолжают с
+    ним работать.
+
+    Args:
+        provenance: Имя списка, из которого взят домен
+        bloom_fp_rate: Доля ложных срабатываний фильтра Блума; None -
+            снимок без фильтра
+
+    Returns:
+        int: Число записанных доменов
+    """
+    provenance = provenance or {}
+    sources: List[str] = sorted(set(provenance.values()))
+    if len(sources) > 255:
+        raise ValueError("Снимок поддерживает не больше 255 списков")
+    source_ids = {name: i + 1 for i, name in enumerate(sources)}
+    table = bytearray()
+    for name in sources:
+        raw = name.encode("utf-8")[:255]
+        table.append(len(raw))
+        table += raw
+    table += bytes(-len(table) % 4)
+
+    names = [domain for domain in sorted(set(domains))
+             if 0 < len(domain.encode("utf-8")) <= 255]
+    nbits = nhashes = 0
+    if bloom_fp_rate is not None and names:
+        nbits, nhashes = bloom_size(len(names), bloom_fp_rate)
+    bloom = bytearray(-(-nbits // 32) * 4)
+    nslots = 8
+    while nslots < 2 * len(names):
+        nslots *= 2
+    mask = nslots - 1
+    slots = array("I", bytes(4 * nslots))
+    blob = bytearray()
+    count = 0
+    for domain in names:
+        name = domain.encode("utf-8")
+        h = zlib.crc32(name)
+        if nbits:
+            q, step = h % nbits, zlib.adler32(name) | 1
+            for _ in range(nhashes):
+                bloom[q >> 3] |= 1 << (q & 7)
+                q = (q + step) % nbits
+        i = h & mask
+        while slots[i]:
+            i = (i + 1) & mask
+        slots[i] = len(blob) + 1
+        blob.append(len(name))
+        blob += name
+        blob.append(source_ids.get(provenance.get(domain), 0))
+        count += 1
+    if sys.byteorder != "little":
+        slots.byteswap()
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION,
+                                         len(sources), count, nslots))
+            f.write(BLOOM_HEADER.pack(nbits, nhashes))
+            f.write(table)
+            f.write(bloom)
+            f.write(slots.tobytes())
+            f.write(blob)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return count
+
+
+class Snapshot:
+    """
+    Снимок списка рекламных доменов, отображённый в память (mmap).
+
+    Поиск идёт прямо по отображённому файлу, без построения объектов
+    Python, поэтому открытие снимка мгновенно при любом размере списка,
+    а все рабочие процессы делят одну копию файла в кэше страниц.
+    Поддерживает `in`, так что подходит для match_domain.
+
+    Если в снимке есть фильтр Блума, `in` сначала проверяет его: для
+    большинства отсутствующих имён хэш-таблица не просматривается.
+    bloom_saved - сколько таких проверок фильтр сэкономил,
+    bloom_false_positives - сколько раз он пропустил имя, которого в
+    снимке нет.
+    """
+
+    def __init__(self, path: str):
+        """
+        Raises:
+            OSError: Файл не открывается
+            ValueError: Файл не является снимком поддерживаемой версии
+        """
+        self.path = path
+        self.bloom_saved = 0
+        self.bloom_false_positives = 0
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._open()
+        except ValueError:
+            self._mm.close()
+            raise
+
+    def _open(self):
+        mm = self._mm
+        header = SNAPSHOT_HEADER.size + BLOOM_HEADER.size
+        if len(mm) < SNAPSHOT_HEADER.size:
+            raise ValueError(f"{self.path}: файл слишком короткий")
+        magic, version, nsources, count, nslots = \
+            SNAPSHOT_HEADER.unpack_from(mm)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{self.path}: не снимок списка доменов")
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"{self.path}: неподдерживаемая версия"
+                             f" снимка {version}")
+        if len(mm) < header:
+            raise ValueError(f"{self.path}: файл слишком короткий")
+        nbits, nhashes = BLOOM_HEADER.unpack_from(mm, SNAPSHOT_HEADER.size)
+        pos = header
+        self.sources: List[str] = []
+        try:
+            for _ in range(nsources):
+                n = mm[pos]
+                self.sources.append(mm[pos + 1:pos + 1 + n].decode("utf-8"))
+                pos += n + 1
+        except (IndexError, UnicodeDecodeError):
+            raise ValueError(f"{self.path}: повреждённый снимок")
+        bloom = pos + -(pos - header) % 4
+        table = bloom + -(-nbits // 32) * 4
+        blob = table + 4 * nslots
+        if nslots & (nslots - 1) or len(mm) < blob:
+            raise ValueError(f"{self.path}: повреждённый снимок")
+        self._count = count
+        self._mask = nslots - 1
+        # Позиция записи - _base + значение ячейки
+        self._base = blob - 1
+        self.bloom_bits = nbits
+        self.bloom_hashes = nhashes
+        self._bloom = memoryview(mm)[bloom:table]
+        self._view = memoryview(mm)[table:blob]
+        if sys.byteorder == "little":
+            self._slots = self._view.cast("I")
+        else:
+            self._slots = array("I", self._view)
+            self._slots.byteswap()
+
+    def _find(self, name: str) -> int:
+        """Позиция записи домена или -1."""
+        key = name.encode("utf-8")
+        mm = self._mm
+        slots = self._slots
+        mask = self._mask
+        i = zlib.crc32(key) & mask
+        while True:
+            pos = slots[i]
+            if not pos:
+                return -1
+            pos += self._base
+            if mm[pos] == len(key) and mm[pos + 1:pos + 1 + len(key)] == key:
+                return pos
+            i = (i + 1) & mask
+
+    def __contains__(self, name: str) -> bool:
+        # То же, что _find, но сначала проверяется фильтр Блума; crc32
+        # общий для фильтра и хэш-таблицы
+        key = name.encode("utf-8")
+        h = zlib.crc32(key)
+        nbits = self.bloom_bits
+        if nbits:
+            bloom = self._bloom
+            q, step = h % nbits, zlib.adler32(key) | 1
+            for _ in range(self.bloom_hashes):
+                if not bloom[q >> 3] >> (q & 7) & 1:
+                    self.bloom_saved += 1
+                    return False
+                q = (q + step) % nbits
+        mm = self._mm
+        slots = self._slots
+        mask = self._mask
+        i = h & mask
+        while True:
+            pos = slots[i]
+            if not pos:
+                if nbits:
+                    self.bloom_false_positives += 1
+                return False
+            pos += self._base
+            if mm[pos] == len(key) and mm[pos + 1:pos + 1 + len(key)] == key:
+                return True
+            i = (i + 1) & mask
+
+    def source(self, name: str) -> Optional[str]:
+        """Имя списка, из которого взят домен name, если оно известно."""
+        pos = self._find(name)
+        if pos < 0:
+            return None
+        sid = self._mm[pos + 1 + self._mm[pos]]
+        return self.sources[sid - 1] if sid else None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[str]:
+        mm = self._mm
+        pos = self._base + 1
+        end = len(mm)
+        while pos < end:
+            n = mm[pos]
+            yield mm[pos + 1:pos + 1 + n].decode("utf-8")
+            pos += n + 2
+
+    def close(self):
+        """Снимает отображение файла."""
+        if isinstance(self._slots, memoryview):
+            self._slots.release()
+        self._bloom.release()
+        self._view.release()
+        self._mm.close()
+
+
+def load_snapshot(path: str) -> Optional[Snapshot]:
+    """
+    Открывает снимок, если он есть.
+
+    Returns:
+        Optional[Snapshot]: None, если файла нет или он не читается
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        return Snapshot(path)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Не удалось открыть снимок списка доменов: {e}")
+        return None
+
+
+def load_blocklist(text_path: str, snapshot_path: Optional[str] = None
+                   ) -> Tuple[DomainSet, Optional[Snapshot]]:
+    """
+    Загружает список рекламных доменов: снимок snapshot_path, если он
+    есть, иначе текстовый файл text_path (домен на строку, # -
+    комментарий).
+
+    Returns:
+        Tuple[DomainSet, Optional[Snapshot]]: Домены из текстового файла
+            (пустое множество, если загружен снимок) и снимок
+    """
+    snapshot = load_snapshot(snapshot_path) if snapshot_path else None
+    hosts = DomainSet()
+    if snapshot is None:
+        with open(text_path, "r") as f:
+            for line in f:
+                host = line.strip()
+                if host and not host.startswith("#"):
+                    hosts.add(host)
+    return hosts, snapshot
+
+
+def fingerprint(domains: Iterable[str]) -> Tuple[int, int]:
+    """
+    Отпечаток набора доменов, не зависящий от порядка: число доменов и
+    сумма их crc32. По нему дельта проверяет, к какому списку она
+    применима.
+    """
+    count = total = 0
+    for domain in domains:
+        count += 1
+        total += zlib.crc32(domain.encode("utf-8"))
+    return count, total
+
+
+class Delta:
+    """
+    Изменения списка доменов между двумя компиляциями.
+
+    Файл дельты - текст: строки "text <размер> <mtime_ns>" (состояние
+    текстового списка, к которому относится дельта), "base <n> <сумма>"
+    и "target <n> <сумма>" (отпечатки старого и нового списка), затем
+    "+домен" и "-домен".
+    """
+
+    __slots__ = ("text", "base", "target", "added", "removed")
+
+    def __init__(self, text: Tuple[int, int], base: Tuple[int, int],
+                 target: Tuple[int, int], added: List[str],
+                 removed: List[str]):
+        self.text = text
+        self.base = base
+        self.target = target
+        self.added = added
+        self.removed = removed
+
+    def write(self, path: str):
+        """Записывает дельту; файл заменяется атомарно."""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write("# ad_hosts delta\n")
+                f.write("text %d %d\n" % self.text)
+                f.write("base %d %d\n" % self.base)
+                f.write("target %d %d\n" % self.target)
+                for domain in self.added:
+                    f.write(f"+{domain}\n")
+                for domain in self.removed:
+                    f.write(f"-{domain}\n")
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    @classmethod
+    def read(cls, path: str) -> "Delta":
+        """
+        Raises:
+            OSError: Файл не читается
+            ValueError: Файл не является дельтой
+        """
+        fields = {}
+        added, removed = [], []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line[0] == "#":
+                    continue
+                if line[0] == "+":
+                    added.append(line[1:])
+                elif line[0] == "-":
+                    removed.append(line[1:])
+                else:
+                    key, a, b = line.split()
+                    fields[key] = (int(a), int(b))
+        try:
+            return cls(fields["text"], fields["base"], fields["target"],
+                       added, removed)
+        except KeyError as e:
+            raise ValueError(f"{path}: в дельте нет поля {e}")
+
+    def apply(self, hosts: DomainSet):
+        """Применяет изменения к множеству на месте."""
+        hosts.difference_update(self.removed)
+        hosts.update(self.added)
+
+
+class BlocklistReloader:
+    """
+    Горячая перезагрузка списка рекламных доменов.
+
+    poll() вызывается по таймеру из цикла событий и сравнивает mtime,
+    размер и inode файлов списка с прошлой загрузкой - это один stat на
+    файл. Если файлы изменились, новый список строится в фоновом потоке,
+    а устанавливается (install) снова из poll(), в потоке цикла, так что
+    запросы видят либо старый, либо новый список целиком.
+
+    Если список загружен из текстового файла и рядом появилась дельта
+    (delta_path) от загруженного списка к текущему файлу, она
+    применяется к загруженному множеству на месте: обновление занимает
+    миллисекунды и не держит в памяти две копии списка. Снимок (mmap)
+    при изменении просто открывается заново - это и так дёшево.
+    """
+
+    def __init__(self, text_path: str, snapshot_path: Optional[str],
+                 install: Callable[[DomainSet, Optional[Snapshot]], None],
+                 delta_path: Optional[str] = None):
+        """
+        Args:
+            install: Функция (домены, снимок), заменяющая действующий
+                список
+            delta_path: Файл дельты (см. Delta), пишется ad_domens
+        """
+        self.text_path = text_path
+        self.snapshot_path = snapshot_path
+        self.delta_path = delta_path
+        self.install = install
+        self.hosts: Optional[DomainSet] = None
+        self.snapshot: Optional[Snapshot] = None
+        # Отпечаток загруженного текстового списка (None для снимка)
+        self._fingerprint = None
+        self._signature = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = None
+        self.reloads = 0
+        self.deltas = 0
+        self.failures = 0
+        # Длительность последней сборки списка, секунды
+        self.last_duration = 0.0
+
+    def _stat(self) -> tuple:
+        signature = []
+        for path in (self.text_path, self.snapshot_path, self.delta_path):
+            try:
+                st = os.stat(path) if path else None
+            except OSError:
+                st = None
+            signature.append(st and (st.st_mtime_ns, st.st_size, st.st_ino))
+        return tuple(signature)
+
+    def _load(self) -> tuple:
+        hosts, snapshot = load_blocklist(self.text_path, self.snapshot_path)
+        return hosts, snapshot, (
+            fingerprint(hosts) if snapshot is None else None)
+
+    def _set(self, hosts: DomainSet, snapshot: Optional[Snapshot],
+             fp: Optional[Tuple[int, int]]):
+        self.hosts, self.snapshot, self._fingerprint = hosts, snapshot, fp
+        self.install(hosts, snapshot)
+
+    def load(self):
+        """Синхронная загрузка (при запуске)."""
+        self._signature = self._stat()
+        self._set(*self._load())
+
+    def poll(self, notify: Optional[Callable] = None) -> bool:
+        """
+        Устанавливает готовый список или запускает сборку, если файлы
+        изменились.
+
+        Args:
+            notify: call_soon_threadsafe цикла событий; фоновый поток
+                через него вызывает poll() сразу после сборки, не
+                дожидаясь следующего таймера
+
+        Returns:
+            bool: True, если список был заменён или изменён
+        """
+        ready, self._ready = self._ready, None
+        if ready is not None:
+            return self._install_ready(*ready)
+        if self._thread is not None and self._thread.is_alive():
+            return False
+        signature = self._stat()
+        if signature == self._signature:
+            return False
+        self._signature = signature
+        self._thread = threading.Thread(target=self._build, args=(notify,),
+                                        name="blocklist-reload",
+                                        daemon=True)
+        self._thread.start()
+        return False
+
+    def _install_ready(self, kind: str, data, duration: float) -> bool:
+        if kind == "noop":
+            return False
+        self.reloads += 1
+        self.last_duration = duration
+        if kind == "delta":
+            start = time.monotonic()
+            data.apply(self.hosts)
+            self._fingerprint = data.target
+            self.deltas += 1
+            self.last_duration += time.monotonic() - start
+            logger.info(f"К списку рекламных доменов применена дельта:"
+                        f" +{len(data.added)} -{len(data.removed)} за"
+                        f" {self.last_duration * 1000:.1f} мс")
+            return True
+        hosts, snapshot, fp = data
+        self._set(hosts, snapshot, fp)
+        size = len(snapshot) if snapshot is not None else len(hosts)
+        logger.info(f"Список рекламных доменов перезагружен: {size}"
+                    f" доменов за {duration * 1000:.1f} мс")
+        return True
+
+    def _check_delta(self) -> Optional[tuple]:
+        """
+        Можно ли обновить текстовый список дельтой вместо полной
+        перезагрузки. Вызывается в фоновом потоке.
+
+        Returns:
+            Optional[tuple]: ("delta", Delta), ("noop", None), если
+                список уже совпадает с файлом, или None - нужна полная
+                перезагрузка
+        """
+        if (not self.delta_path or self._fingerprint is None
+                or (self.snapshot_path
+                    and os.path.exists(self.snapshot_path))):
+            return None
+        try:
+            delta = Delta.read(self.delta_path)
+            st = os.stat(self.text_path)
+        except (OSError, ValueError):
+            return None
+        if delta.text != (st.st_size, st.st_mtime_ns):
+            return None
+        if delta.target == self._fingerprint:
+            return "noop", None
+        if delta.base == self._fingerprint:
+            return "delta", delta
+        return None
+
+    def _build(self, notify: Optional[Callable]):
+        start = time.monotonic()
+        try:
+            ready = self._check_delta() or ("full", self._load())
+        except (OSError, UnicodeDecodeError) as e:
+            self.failures += 1
+            logger.error(f"Не удалось перезагрузить список рекламных"
+                         f" доменов: {e}")
+            return
+        self._ready = ready + (time.monotonic() - start,)
+        if notify is not None:
+            notify(self.poll)
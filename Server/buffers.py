@@ -0,0 +1,179 @@
+import collections
+import socket
+
+# Порог заполнения исходящего буфера, после которого чтение
+# с противоположной стороны приостанавливается, байты
+HIGH_WATER = 256 * 1024
+
+# Порог, ниже которого чтение возобновляется, байты
+LOW_WATER = 64 * 1024
+
+# Начальный и максимальный размер буфера чтения, байты
+MIN_READ_SIZE = 4 * 1024
+MAX_READ_SIZE = 256 * 1024
+
+# Сколько свободных буферов каждого размера держать в пуле
+POOL_FREE_LIMIT = 64
+
+
+class OutboundBuffer:
+    """
+    Очередь исходящих данных одного сокета.
+
+    Данные отправляются по мере готовности сокета к записи, частичные
+    отправки учитываются. По size и порогам HIGH_WATER/LOW_WATER
+    сервер решает, когда приостановить и возобновить чтение с другой
+    стороны туннеля.
+    """
+
+    __slots__ = ("_chunks", "_offset", "size", "high_water", "low_water")
+
+    def __init__(self, high_water: int = HIGH_WATER,
+                 low_water: int = LOW_WATER):
+        self._chunks = collections.deque()
+        self._offset = 0
+        self.size = 0
+        self.high_water = high_water
+        self.low_water = low_water
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __bool__(self) -> bool:
+        return self.size > 0
+
+    def write(self, data: bytes):
+        """Ставит данные в очередь на отправку (данные копируются)."""
+        if data:
+            self._chunks.append(bytes(data))
+            self.size += len(data)
+
+    def send(self, sock: socket.socket, data) -> bool:
+        """
+        Отправляет данные с учётом очереди. Если очередь пуста, данные
+        (bytes или memoryview) уходят в сокет напрямую и копируется
+        только неотправленный остаток.
+
+        Returns:
+            bool: True, если очередь пуста
+
+        Raises:
+            OSError: Ошибка сокета (кроме EAGAIN)
+        """
+        if self.size:
+            self.write(data)
+            return self.flush(sock)
+        try:
+            sent = sock.send(data)
+        except (BlockingIOError, InterruptedError):
+            sent = 0
+        if sent < len(data):
+            self.write(data[sent:])
+            return False
+        return True
+
+    def flush(self, sock: socket.socket) -> bool:
+        """
+        Отправляет сколько получится без блокировки.
+
+        Returns:
+            bool: True, если очередь опустела
+
+        Raises:
+            OSError: Ошибка сокета (кроме EAGAIN)
+        """
+        chunks = self._chunks
+        while chunks:
+            view = memoryview(chunks[0])[self._offset:]
+            try:
+                sent = sock.send(view)
+            except (BlockingIOError, InterruptedError):
+                return False
+            self.size -= sent
+            if sent < len(view):
+                self._offset += sent
+                return False
+            chunks.popleft()
+            self._offset = 0
+        return True
+
+    def is_full(self) -> bool:
+        return self.size >= self.high_water
+
+    def is_drained(self) -> bool:
+        return self.size <= self.low_water
+
+    def clear(self):
+        self._chunks.clear()
+        self._offset = 0
+        self.size = 0
+
+
+class BufferPool:
+    """
+    Пул буферов чтения.
+
+    Буферы (bytearray) раздаются соединениям для recv_into и
+    возвращаются в пул при закрытии или смене размера, поэтому
+    при установившейся пересылке новые объекты не создаются. Размер
+    буфера соединения подстраивается под трафик: растёт от
+    MIN_READ_SIZE до MAX_READ_SIZE, пока чтения заполняют буфер
+    целиком, и уменьшается, когда данные приходят мелкими порциями.
+    """
+
+    def __init__(self, min_size: int = MIN_READ_SIZE,
+                 max_size: int = MAX_READ_SIZE,
+                 free_limit: int = POOL_FREE_LIMIT):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.free_limit = free_limit
+        self._free = {}
+        self.allocated = 0
+        self.reused = 0
+
+    def acquire(self, size: int = 0) -> bytearray:
+        """Выдаёт буфер размера size (округляется до степени двойки)."""
+        size = self._size_class(size)
+        free = self._free.get(size)
+        if free:
+            self.reused += 1
+            return free.pop()
+        self.allocated += 1
+        return bytearray(size)
+
+    def release(self, buf: bytearray):
+        """Возвращает буфер в пул."""
+        free = self._free.setdefault(len(buf), [])
+        if len(free) < self.free_limit:
+            free.append(buf)
+
+    def adapt(self, buf: bytearray, received: int) -> bytearray:
+        """
+        Подбирает буфер для следующего чтения по результату текущего.
+
+        Старый буфер возвращается в пул сразу: данные из него должны
+        быть использованы (отправлены или скопированы) до следующего
+        чтения любого соединения.
+        """
+        size = len(buf)
+        if received >= size and size < self.max_size:
+            new_size = size * 2
+        elif received < size // 8 and size > self.min_size:
+            new_size = size // 2
+        else:
+            return buf
+        self.release(buf)
+        return self.acquire(new_size)
+
+    def _size_class(self, size: int) -> int:
+        cls = self.min_size
+        while cls < size and cls < self.max_size:
+            cls *= 2
+        return cls
+
+    def stats(self) -> dict:
+        return {
+            "allocated": self.allocated,
+            "reused": self.reused,
+            "free": sum(len(v) for v in self._free.values()),
+        }
@@ -0,0 +1,106 @@
+import enum
+import socket
+from typing import List, Optional
+
+from Server.buffers import OutboundBuffer
+from Server.event_loop import EVENT_READ, EVENT_WRITE
+from Server.http_message import RequestReader
+
+
+class ChannelState(enum.Enum):
+    """Состояние соединения."""
+
+    # Клиент подключился, ждём первый запрос
+    AWAITING_REQUEST = "awaiting-request"
+    # Разрешение имени и подключение к целевому серверу
+    CONNECTING = "connecting"
+    # Установленный CONNECT-туннель
+    TUNNEL = "tunnel"
+    # Пересылка обычного HTTP
+    HTTP_RELAY = "http-relay"
+    # Другая сторона закрылась, дописываем очередь и закрываем
+    CLOSING = "closing"
+    # Соединение закрыто
+    CLOSED = "closed"
+
+
+class Channel:
+    """
+    Состояние одного сокета прокси (клиентского или к целевому
+    серверу).
+
+    Используются __slots__: при десятках тысяч соединений это заметно
+    экономит память и ускоряет доступ к полям по сравнению со словарём.
+    Канал хранится в ProxyServer.channel по номеру дескриптора и
+    передаётся в цикл событий как данные регистрации, так что при
+    обработке события поиск не нужен.
+    """
+
+    __slots__ = (
+        "sock", "fd", "peer", "state", "client", "method", "out", "rbuf",
+        "pending", "connect", "deadline", "splice", "paused", "eof",
+        "blocked_count", "inbuf", "req", "last_activity", "ip",
+        "framer", "pool_key",
+    )
+
+    def __init__(self, sock: socket.socket, client: bool,
+                 state: ChannelState = ChannelState.AWAITING_REQUEST,
+                 method: Optional[str] = None):
+        self.sock = sock
+        self.fd = sock.fileno()
+        self.peer: Optional["Channel"] = None
+        self.state = state
+        self.client = client
+        self.method = method
+        self.out = OutboundBuffer()
+        self.rbuf: Optional[bytearray] = None
+        # Данные клиента, пришедшие до подключения к серверу
+        self.pending: Optional[List[bytes]] = None
+        # (Forward, HOST, port, первый запрос) пока идёт подключение
+        self.connect = None
+        self.deadline = None
+        self.splice = None
+        self.paused = False
+        self.eof = False
+        self.blocked_count = 0
+        # Принятые, но ещё не разобранные данные клиента (заголовки
+        # запроса, запросы, пришедшие до конца текущего ответа)
+        self.inbuf: Optional[RequestReader] = None
+        # Разбор тела текущего запроса клиента
+        self.req = None
+        # Время последней активности (time.monotonic) для таймаутов
+        self.last_activity = 0.0
+        # IP клиента, учтённый в лимитах подключений (только у принятых
+        # клиентских каналов)
+        self.ip: Optional[str] = None
+        # Разбор ответа целевого сервера и ключ пула keep-alive
+        # соединений; framer None - граница ответа неизвестна, ответ
+        # идёт до закрытия соединения
+        self.framer = None
+        self.pool_key = None
+
+    @property
+    def parse(self) -> bool:
+        """Нужно ли разбирать следующие данные как новый запрос."""
+        return self.state is ChannelState.AWAITING_REQUEST
+
+    @property
+    def closed(self) -> bool:
+        return self.state is ChannelState.CLOSED
+
+    def has_output(self) -> bool:
+        """Есть ли неотправленные данные для этого сокета."""
+        return bool(self.out) or bool(self.splice)
+
+    def events(self) -> int:
+        """Маска событий, которые нужно ждать для сокета."""
+        events = 0
+        if not self.paused and not self.eof:
+            events |= EVENT_READ
+        if self.connect is not None or self.has_output():
+            events |= EVENT_WRITE
+        return events
+
+    def __repr__(self) -> str:
+        side = "client" if self.client else "upstream"
+        return f"<Channel fd={self.fd} {side} {self.state.value}>"
@@ -0,0 +1,244 @@
+import collections
+import heapq
+import itertools
+import selectors
+import socket
+import threading
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+from Logs.logger import get_logger
+
+logger = get_logger()
+
+EVENT_READ = selectors.EVENT_READ
+EVENT_WRITE = selectors.EVENT_WRITE
+
+
+class TimerHandle:
+    """Отложенный вызов, возвращаемый EventLoop.call_later."""
+
+    __slots__ = ("when", "callback", "args", "cancelled")
+
+    def __init__(self, when: float, callback: Callable, args: tuple):
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class EventLoop:
+    """
+    Движок событий поверх selectors.
+
+    По умолчанию используется selectors.DefaultSelector (epoll на Linux,
+    kqueue на BSD/macOS), поэтому стоимость одного ожидания не зависит от
+    количества открытых сокетов и нет ограничения FD_SETSIZE, как у
+    select.select. Сокеты регистрируются один раз и затем меняют маску
+    через modify, список заново не собирается.
+
+    Таймеры хранятся в куче: poll ждёт ровно до ближайшего таймера, так
+    что простаивающий сервер не просыпается без причины. Для пробуждения
+    из другого потока есть wakeup() и call_soon_threadsafe().
+    """
+
+    def __init__(self, selector: Optional[selectors.BaseSelector] = None):
+        """
+        Args:
+            selector: Экземпляр селектора. Если не задан, берётся
+                selectors.DefaultSelector.
+        """
+        self.selector = selector or selectors.DefaultSelector()
+        self._timers: List[Tuple[float, int, TimerHandle]] = []
+        self._timer_seq = itertools.count()
+        # Время последнего пробуждения (time.monotonic), чтобы
+        # обработчики не вызывали часы на каждое событие
+        self.now = time.monotonic()
+        self._ready = collections.deque()
+        self._ready_lock = threading.Lock()
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+        self.selector.register(self._wakeup_r, EVENT_READ)
+        logger.debug(f"Движок событий: {type(self.selector).__name__}")
+
+    def register(self, sock: socket.socket, events: int = EVENT_READ,
+                 data: Any = None) -> bool:
+        """
+        Начинает отслеживать сокет.
+
+        Returns:
+            bool: False, если сокет уже закрыт или зарегистрирован
+        """
+        try:
+            self.selector.register(sock, events, data)
+            return True
+        except (KeyError, ValueError, OSError) as e:
+            logger.debug(f"Не удалось зарегистрировать сокет: {e}")
+            return False
+
+    def modify(self, sock: socket.socket, events: int,
+               data: Any = None) -> bool:
+        """
+        Меняет маску событий сокета. Незарегистрированный сокет
+        регистрируется, при пустой маске снимается с регистрации.
+        """
+        if not events:
+            self.unregister(sock)
+            return True
+        try:
+            key = self.selector.get_key(sock)
+        except (KeyError, ValueError):
+            return self.register(sock, events, data)
+        if data is None:
+            data = key.data
+        if key.events == events and key.data is data:
+            return True
+        try:
+            self.selector.modify(sock, events, data)
+            return True
+        except (KeyError, ValueError, OSError) as e:
+            logger.debug(f"Не удалось изменить маску сокета: {e}")
+            return False
+
+    def unregister(self, sock: socket.socket) -> bool:
+        """
+        Прекращает отслеживать сокет. Работает и для уже закрытых
+        сокетов, если они были зарегистрированы.
+        """
+        try:
+            self.selector.unregister(sock)
+            return True
+        except (KeyError, ValueError, OSError):
+            return False
+
+    def is_registered(self, sock: socket.socket) -> bool:
+        try:
+            self.selector.get_key(sock)
+            return True
+        except (KeyError, ValueError):
+            return False
+
+    def call_at(self, when: float, callback: Callable,
+                *args) -> TimerHandle:
+        """
+        Планирует вызов callback(*args) на момент when
+        (по часам time.monotonic).
+        """
+        handle = TimerHandle(when, callback, args)
+        heapq.heappush(self._timers, (when, next(self._timer_seq), handle))
+        return handle
+
+    def call_later(self, delay: float, callback: Callable,
+                   *args) -> TimerHandle:
+        """Планирует вызов callback(*args) через delay секунд."""
+        return self.call_at(time.monotonic() + delay, callback, *args)
+
+    def call_soon_threadsafe(self, callback: Callable, *args):
+        """
+        Планирует вызов callback(*args) в потоке цикла событий.
+        Используется фоновыми потоками (резолвер и т.п.) для передачи
+        результатов в цикл.
+        """
+        with self._ready_lock:
+            self._ready.append((callback, args))
+        self.wakeup()
+
+    def next_timeout(self) -> Optional[float]:
+        """
+        Возвращает время до ближайшего таймера в секундах или None,
+        если таймеров нет и ждать можно бесконечно.
+        """
+        if self._ready:
+            return 0.0
+        timers = self._timers
+        while timers and timers[0][2].cancelled:
+            heapq.heappop(timers)
+        if not timers:
+            return None
+        return max(0.0, timers[0][0] - time.monotonic())
+
+    def run_timers(self) -> int:
+        """
+        Выполняет вызовы из call_soon_threadsafe и все наступившие
+        таймеры.
+
+        Returns:
+            int: Количество выполненных вызовов
+        """
+        count = 0
+        if self._ready:
+            with self._ready_lock:
+                ready, self._ready = self._ready, collections.deque()
+            for callback, args in ready:
+                try:
+                    callback(*args)
+                except Exception as e:
+                    logger.error(f"Ошибка в отложенном вызове: {e}")
+                count += 1
+
+        now = time.monotonic()
+        timers = self._timers
+        while timers and timers[0][0] <= now:
+            _, _, handle = heapq.heappop(timers)
+            if handle.cancelled:
+                continue
+            handle.cancelled = True
+            try:
+                handle.callback(*handle.args)
+            except Exception as e:
+                logger.error(f"Ошибка в таймере: {e}")
+            count += 1
+        return count
+
+    def wakeup(self):
+        """Прерывает текущий poll (можно вызывать из другого потока)."""
+        try:
+            self._wakeup_w.send(b"\0")
+        except OSError:
+            pass
+
+    def poll(self, timeout: Optional[float] = None
+             ) -> List[Tuple[Any, int, Any]]:
+        """
+        Ждёт события не дольше timeout секунд.
+
+        Returns:
+            list: Кортежи (сокет, маска событий, данные регистрации)
+        """
+        events = []
+        ready = self.selector.select(timeout)
+        self.now = time.monotonic()
+        for key, mask in ready:
+            if key.fileobj is self._wakeup_r:
+                self._drain_wakeup()
+                continue
+            events.append((key.fileobj, mask, key.data))
+        return events
+
+    def _drain_wakeup(self):
+        try:
+            while self._wakeup_r.recv(4096):
+                pass
+        except OSError:
+            pass
+
+    def __len__(self) -> int:
+        mapping = self.selector.get_map()
+        if mapping is None:
+            return 0
+        return len(mapping) - 1
+
+    def close(self):
+        """Закрывает селектор (сами сокеты не закрываются)."""
+        try:
+            self.selector.close()
+        except OSError:
+            pass
+        self._timers.clear()
+        self._ready.clear()
+        self._wakeup_r.close()
+        self._wakeup_w.close()
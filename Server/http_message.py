@@ -0,0 +1,431 @@
+from typing import Dict, Optional
+
+# Максимальный размер заголовков сообщения, байты
+MAX_HEAD_SIZE = 64 * 1024
+
+# Сколько байт за раз просматривать в поисках конца служебной строки
+LINE_STEP = 256
+
+# Состояния разбора сообщения
+HEAD = 0
+LENGTH = 1
+CHUNK_SIZE = 2
+CHUNK_DATA = 3
+CHUNK_END = 4
+TRAILER = 5
+UNTIL_CLOSE = 6
+DONE = 7
+
+
+class FramingError(ValueError):
+    """Нарушение формата HTTP/1.1-сообщения."""
+
+
+def parse_headers(head: bytes) -> Dict[bytes, bytes]:
+    """
+    Разбирает заголовки сообщения (стартовая строка пропускается) в
+    словарь с именами в нижнем регистре. Повторяющиеся заголовки
+    склеиваются через ", ".
+    """
+    headers: Dict[bytes, bytes] = {}
+    for line in head.split(b"\r\n")[1:]:
+        name, sep, value = line.partition(b":")
+        if not sep:
+            continue
+        name = name.strip().lower()
+        value = value.strip()
+        if name in headers:
+            headers[name] += b", " + value
+        else:
+            headers[name] = value
+    return headers
+
+
+def _tokens(value: Optional[bytes]) -> set:
+    if not value:
+        return set()
+    return {t.strip().lower() for t in value.split(b",")}
+
+
+class MessageFramer:
+    """
+    Определяет границы одного HTTP/1.1-сообщения в потоке байтов.
+
+    Данные подаются в feed по мере чтения из сокета; framer не копирует
+    тело, а только считает его по Content-Length или разметке chunked.
+    По keep_alive и done видно, закончилось ли сообщение и можно ли
+    использовать соединение для следующего.
+    """
+
+    __slots__ = ("response", "request_method", "state", "remaining",
+                 "keep_alive", "head", "headers", "status", "_buf")
+
+    def __init__(self, response: bool = True,
+                 request_method: Optional[str] = None):
+        """
+        Args:
+            response: Разбирается ответ (иначе запрос)
+            request_method: Метод запроса, на который пришёл ответ
+                (у ответа на HEAD нет тела)
+        """
+        self.response = response
+        self.request_method = request_method
+        self.state = HEAD
+        self.remaining = 0
+        self.keep_alive = False
+        self.head = b""
+        self.headers: Dict[bytes, bytes] = {}
+        self.status = 0
+        self._buf = bytearray()
+
+    @property
+    def done(self) -> bool:
+        return self.state == DONE
+
+    def feed(self, data) -> int:
+        """
+        Учитывает очередную порцию данных.
+
+        Returns:
+            int: Сколько байт из data относится к этому сообщению;
+                остаток - начало следующего
+
+        Raises:
+            FramingError: Некорректное сообщение
+        """
+        pos = 0
+        end = len(data)
+        while pos < end and self.state != DONE:
+            state = self.state
+            if state == LENGTH or state == CHUNK_DATA:
+                take = min(self.remaining, end - pos)
+                pos += take
+                self.remaining -= take
+                if not self.remaining:
+                    self.state = DONE if state == LENGTH else CHUNK_END
+            elif state == UNTIL_CLOSE:
+                pos = end
+            elif state == HEAD:
+                pos = self._feed_head(data, pos)
+            else:
+                line, pos = self._line(data, pos)
+                if line is not None:
+                    self._on_line(line)
+        return pos
+
+    def _feed_head(self, data, pos: int) -> int:
+        buf = self._buf
+        start = max(0, len(buf) - 3)
+        part = data[pos:pos + MAX_HEAD_SIZE]
+        buf += part
+        idx = buf.find(b"\r\n\r\n", start)
+        if idx == -1:
+            if len(buf) >= MAX_HEAD_SIZE:
+                raise FramingError("Слишком большие заголовки")
+            return pos + len(part)
+        used = idx + 4 - (len(buf) - len(part))
+        self.head = bytes(buf[:idx + 4])
+        buf.clear()
+        self._on_head()
+        return pos + used
+
+    def _line(self, data, pos: int):
+        """
+        Читает строку служебной разметки (размер чанка, трейлеры),
+        которая может быть разорвана между чтениями. За шаг берётся не
+        больше LINE_STEP байт, чтобы не копировать тело.
+        """
+        buf = self._buf
+        start = max(0, len(buf) - 1)
+        part = data[pos:pos + LINE_STEP]
+        buf += part
+        idx = buf.find(b"\r\n", start)
+        if idx == -1:
+            if len(buf) > MAX_HEAD_SIZE:
+                raise FramingError("Слишком длинная строка")
+            return None, pos + len(part)
+        used = idx + 2 - (len(buf) - len(part))
+        line = bytes(buf[:idx])
+        buf.clear()
+        return line, pos + used
+
+    def _on_line(self, line: bytes):
+        state = self.state
+        if state == CHUNK_SIZE:
+            try:
+                size = int(line.split(b";", 1)[0].strip(), 16)
+            except ValueError:
+                raise FramingError("Некорректный размер чанка")
+            if size:
+                self.remaining = size
+                self.state = CHUNK_DATA
+            else:
+                self.state = TRAILER
+        elif state == CHUNK_END:
+            if line:
+                raise FramingError("Нет CRLF после чанка")
+            self.state = CHUNK_SIZE
+        elif state == TRAILER and not line:
+            self.state = DONE
+
+    @classmethod
+    def for_request(cls, head: "RequestHead") -> "MessageFramer":
+        """
+        Создаёт разбор тела запроса по уже разобранным заголовкам.
+        """
+        framer = cls(response=False)
+        framer.head = head.raw
+        framer._frame(head.version, head.header)
+        return framer
+
+    def _on_head(self):
+        head = self.head
+        start_line = head[:head.find(b"\r\n")]
+        parts = start_line.split(b" ", 2)
+        if len(parts) < 2:
+            raise FramingError("Некорректная стартовая строка")
+        self.headers = parse_headers(head)
+        if self.response:
+            try:
+                self.status = int(parts[1])
+            except ValueError:
+                raise FramingError("Некорректный код ответа")
+        self._frame(parts[0] if self.response else parts[-1],
+                    self.headers.get)
+
+    def _frame(self, version: bytes, header):
+        """
+        Определяет keep-alive и способ разметки тела.
+
+        Args:
+            header: Функция имя заголовка (в нижнем регистре) -> значение
+        """
+        connection = _tokens(header(b"connection"))
+        if version == b"HTTP/1.1":
+            self.keep_alive = b"close" not in connection
+        else:
+            self.keep_alive = b"keep-alive" in connection
+
+        if self.response:
+            if 100 <= self.status < 200 and self.status != 101:
+                # Промежуточный ответ, настоящий придёт следом
+                self.head = b""
+                return
+            if (self.request_method == "HEAD"
+                    or self.status in (204, 304)):
+                self.state = DONE
+                return
+            if self.status == 101 or (self.request_method == "CONNECT"
+                                      and 200 <= self.status < 300):
+                self.keep_alive = False
+                self.state = UNTIL_CLOSE
+                return
+
+        encoding = header(b"transfer-encoding")
+        if encoding is not None:
+            if encoding.split(b",")[-1].strip().lower() == b"chunked":
+                self.state = CHUNK_SIZE
+            elif self.response:
+                self.keep_alive = False
+                self.state = UNTIL_CLOSE
+            else:
+                raise FramingError("Неподдерживаемый Transfer-Encoding")
+            return
+
+        length = header(b"content-length")
+        if length is not None:
+            try:
+                self.remaining = int(length.split(b",")[0])
+            except ValueError:
+                raise FramingError("Некорректный Content-Length")
+            if self.remaining < 0:
+                raise FramingError("Некорректный Content-Length")
+            self.state = LENGTH if self.remaining else DONE
+        elif self.response:
+            # Тело до закрытия соединения
+            self.keep_alive = False
+            self.state = UNTIL_CLOSE
+        else:
+            self.state = DONE
+
+
+def _split_authority(authority: bytes, default_port: int):
+    """Разделяет "хост[:порт]" (в том числе "[IPv6]:порт")."""
+    if authority.startswith(b"["):
+        close = authority.find(b"]")
+        if close == -1:
+            raise FramingError("Некорректный адрес")
+        host, rest = authority[1:close], authority[close + 1:]
+        port = rest[1:] if rest.startswith(b":") else b""
+    else:
+        host, _, port = authority.partition(b":")
+    try:
+        port = int(port) if port else default_port
+    except ValueError:
+        raise FramingError("Некорректный порт")
+    return host.decode("utf-8", errors="ignore").strip(), port
+
+
+class RequestHead:
+    """
+    Разобранные заголовки запроса.
+
+    Хранит исходные байты и находит заголовки по смещениям в копии,
+    приведённой к нижнему регистру; декодируются только метод и хост,
+    значения остальных заголовков достаются срезом по запросу. Тело
+    запроса сюда не попадает.
+    """
+
+    __slots__ = ("raw", "method", "version", "host", "port",
+                 "_target", "_path", "_lower")
+
+    def __init__(self, raw: bytes):
+        """
+        Raises:
+            FramingError: Некорректная стартовая строка или порт
+        """
+        self.raw = raw
+        self._lower = lower = raw.lower()
+        line_end = raw.find(b"\r\n")
+        if line_end == -1:
+            line_end = len(raw)
+        parts = raw[:line_end].split(b" ", 2)
+        if len(parts) < 2 or not parts[0]:
+            raise FramingError("Некорректная стартовая строка")
+        method, target = parts[0], parts[1]
+        self.version = parts[2] if len(parts) > 2 else b""
+        self.method = method = method.decode("latin-1")
+        start = len(parts[0]) + 1
+        self._target = (start, start + len(target))
+
+        # Начало пути в absolute-form (-1 - путь пустой), None - цель
+        # запроса уже в origin-form
+        self._path = None
+        if method == "CONNECT":
+            self.host, self.port = _split_authority(target, 443)
+            return
+        absolute = target.startswith((b"http://", b"https://"))
+        if absolute:
+            begin = target.find(b"://") + 3
+            slash = target.find(b"/", begin)
+            self._path = start + slash if slash != -1 else -1
+        idx = lower.find(b"\nhost:")
+        if idx != -1:
+            end = raw.find(b"\r\n", idx)
+            host = raw[idx + 6:end if end != -1 else line_end].strip()
+            if b":" in host:
+                self.host, self.port = _split_authority(host, 80)
+            else:
+                self.host = host.decode("utf-8", errors="ignore")
+                self.port = 80
+        elif absolute:
+            authority = target[begin:slash] if slash != -1 \
+                else target[begin:]
+            default = 443 if target.startswith(b"https") else 80
+            self.host, self.port = _split_authority(authority, default)
+        else:
+            self.host = None
+        if not self.host:
+            self.host = self.port = None
+
+    @property
+    def target(self) -> bytes:
+        start, end = self._target
+        return self.raw[start:end]
+
+    @property
+    def url(self) -> str:
+        """
+        Адрес запроса в absolute-form (для CONNECT - хост:порт как в
+        запросе).
+        """
+        target = self.target.decode("latin-1")
+        if self._path is not None or self.method == "CONNECT":
+            return target
+        port = "" if self.port in (80, None) else f":{self.port}"
+        return f"http://{self.host}{port}{target}"
+
+    def header(self, name: bytes) -> Optional[bytes]:
+        """Значение заголовка name (в нижнем регистре) или None."""
+        idx = self._lower.find(b"\n" + name + b":")
+        if idx == -1:
+            return None
+        start = idx + len(name) + 2
+        end = self.raw.find(b"\r\n", start)
+        return self.raw[start:end if end != -1 else len(self.raw)].strip()
+
+    def rewrite(self) -> bytes:
+        """
+        Переводит цель запроса из absolute-form ("GET http://host/path")
+        в origin-form ("GET /path"), меняя только этот участок байтов.
+        """
+        path = self._path
+        if path is None:
+            return self.raw
+        start, end = self._target
+        raw = self.raw
+        if path == -1:
+            return raw[:start] + b"/" + raw[end:]
+        return raw[:start] + raw[path:]
+
+
+class RequestReader:
+    """
+    Накапливает данные клиента и выдаёт заголовки запросов по мере
+    поступления. Уже просмотренные байты повторно не сканируются, размер
+    заголовков ограничен max_size.
+    """
+
+    __slots__ = ("buf", "max_size", "_scanned")
+
+    def __init__(self, max_size: int = MAX_HEAD_SIZE):
+        self.buf = bytearray()
+        self.max_size = max_size
+        self._scanned = 0
+
+    def __len__(self) -> int:
+        return len(self.buf)
+
+    def __bool__(self) -> bool:
+        return bool(self.buf)
+
+    def feed(self, data):
+        self.buf += data
+
+    def next_head(self) -> Optional[RequestHead]:
+        """
+        Returns:
+            RequestHead: Следующий полный запрос или None, если заголовки
+                ещё не пришли целиком
+
+        Raises:
+            FramingError: Заголовки больше max_size или некорректны
+        """
+        buf = self.buf
+        if buf[:2] == b"\r\n":
+            # Пустые строки перед запросом допускаются (RFC 7230, 3.5)
+            while buf.startswith(b"\r\n"):
+                del buf[:2]
+            self._scanned = 0
+        end = buf.find(b"\r\n\r\n", self._scanned)
+        if end == -1 or end + 4 > self.max_size:
+            self._scanned = max(0, len(buf) - 3)
+            if len(buf) > self.max_size:
+                raise FramingError("Слишком большие заголовки запроса")
+            return None
+        end += 4
+        if end == len(buf):
+            raw = bytes(buf)
+            buf.clear()
+        else:
+            raw = bytes(buf[:end])
+            del buf[:end]
+        self._scanned = 0
+        return RequestHead(raw)
+
+    def take(self) -> bytes:
+        """Забирает все накопленные байты."""
+        data = bytes(self.buf)
+        self.buf.clear()
+        self._scanned = 0
+        return data
@@ -0,0 +1,77 @@
+import os
+
+from Logs.logger import get_logger
+
+logger = get_logger()
+
+# os.splice есть только на Linux начиная с Python 3.10
+SPLICE_AVAILABLE = hasattr(os, "splice")
+
+# Сколько байт за раз переносить через канал (ёмкость pipe по умолчанию)
+PIPE_CHUNK = 64 * 1024
+
+
+class SplicePipe:
+    """
+    Канал ядра для переноса байтов из одного сокета в другой без
+    копирования в память интерпретатора.
+
+    Данные читаются из сокета-источника в pipe через os.splice и затем
+    переносятся из pipe в сокет-получатель. Пока получатель не принял
+    всё, байты остаются в pipe (pending) - это исходящая очередь
+    получателя, ограниченная ёмкостью pipe.
+    """
+
+    __slots__ = ("_r", "_w", "pending")
+
+    def __init__(self):
+        self._r, self._w = os.pipe2(os.O_NONBLOCK | os.O_CLOEXEC)
+        self.pending = 0
+
+    def __bool__(self) -> bool:
+        return self.pending > 0
+
+    def fill(self, src_fd: int) -> int:
+        """
+        Переносит данные из сокета в pipe.
+
+        Returns:
+            int: Число байт, 0 - источник закрыл соединение,
+                -1 - данных пока нет или pipe заполнен
+        """
+        if self.pending >= PIPE_CHUNK:
+            return -1
+        try:
+            moved = os.splice(src_fd, self._w, PIPE_CHUNK - self.pending,
+                              flags=os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK)
+        except (BlockingIOError, InterruptedError):
+            return -1
+        self.pending += moved
+        return moved
+
+    def drain(self, dst_fd: int) -> bool:
+        """
+        Переносит данные из pipe в сокет-получатель.
+
+        Returns:
+            bool: True, если pipe опустел
+        """
+        while self.pending:
+            try:
+                moved = os.splice(self._r, dst_fd, self.pending,
+                                  flags=os.SPLICE_F_MOVE
+                                  | os.SPLICE_F_NONBLOCK)
+            except (BlockingIOError, InterruptedError):
+                return False
+            if not moved:
+                return False
+            self.pending -= moved
+        return True
+
+    def close(self):
+        for fd in (self._r, self._w):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self.pending = 0
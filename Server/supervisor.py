@@ -0,0 +1,311 @@
+import json
+import os
+import select
+import signal
+import socket
+import time
+from typing import Callable, Dict, Optional
+
+from Logs.logger import get_logger
+
+logger = get_logger()
+
+# Число рабочих процессов по умолчанию - по одному на ядро
+WORKER_COUNT = os.cpu_count() or 1
+
+# Как часто рабочий процесс присылает статистику (она же heartbeat),
+# секунды
+HEARTBEAT_INTERVAL = 1.0
+
+# Через сколько секунд без heartbeat процесс считается зависшим
+HEARTBEAT_TIMEOUT = 10.0
+
+# Задержка перед перезапуском упавшего процесса и её верхняя граница,
+# секунды. Если процесс падает сразу после запуска, задержка удваивается
+RESPAWN_DELAY = 0.5
+MAX_RESPAWN_DELAY = 30.0
+
+# Процесс, проработавший дольше этого, считается стабильным, секунды
+STABLE_UPTIME = 10.0
+
+# Сколько ждать завершения процессов при остановке, секунды
+STOP_TIMEOUT = 5.0
+
+REUSE_PORT_AVAILABLE = hasattr(socket, "SO_REUSEPORT")
+
+# Поля статистики процессов, которые не складываются, а берутся по
+# максимуму (длительности, а не счётчики)
+MAX_STATS = {"blocklist_reload_seconds"}
+
+
+def _default_factory(host: str, port: int):
+    from Server.ProxyServer import ProxyServer
+    return ProxyServer(host, port, reuse_port=True)
+
+
+class Worker:
+    """Рабочий процесс с точки зрения супервизора."""
+
+    __slots__ = ("slot", "pid", "fd", "buf", "started", "last_seen",
+                 "stats", "delay")
+
+    def __init__(self, slot: int):
+        self.slot = slot
+        self.pid = 0
+        self.fd = -1
+        self.buf = b""
+        self.started = 0.0
+        self.last_seen = 0.0
+        self.stats: dict = {}
+        self.delay = RESPAWN_DELAY
+
+    @property
+    def alive(self) -> bool:
+        return self.pid > 0
+
+
+def _worker_main(factory: Callable, host: str, port: int, fd: int):
+    """
+    Тело рабочего процесса: свой слушающий сокет с SO_REUSEPORT, свой
+    цикл событий. Статистика раз в HEARTBEAT_INTERVAL пишется в канал
+    супервизору строкой JSON.
+    """
+    server = factory(host, port)
+
+    def stop(signum, frame):
+        server.running = False
+        server.loop.wakeup()
+
+    def report():
+        line = json.dumps(server.stats()).encode() + b"\n"
+        try:
+            os.write(fd, line)
+        except BlockingIOError:
+            pass
+        except OSError:
+            # Супервизор пропал - завершаемся
+            stop(None, None)
+            return
+        server.loop.call_later(HEARTBEAT_INTERVAL, report)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    report()
+    try:
+        server.main_loop()
+    finally:
+        server.shutdown()
+
+
+class Supervisor:
+    """
+    Запускает несколько процессов ProxyServer на одном порту.
+
+    Каждый процесс открывает свой слушающий сокет с SO_REUSEPORT, и ядро
+    распределяет новые подключения между ними, так что сервер
+    масштабируется по ядрам без общего состояния. Супервизор следит за
+    процессами по heartbeat, перезапускает упавшие и зависшие и собирает
+    их статистику.
+    """
+
+    def __init__(self, host: str, port: int, workers: int = WORKER_COUNT,
+                 factory: Callable = _default_factory):
+        """
+        Args:
+            workers: Число рабочих процессов
+            factory: Функция (host, port) -> сервер, вызывается в рабочем
+                процессе. Сервер должен иметь main_loop, shutdown, stats,
+                running и loop
+        """
+        if not REUSE_PORT_AVAILABLE and workers > 1:
+            logger.warning("SO_REUSEPORT недоступен, запускается"
+                           " один рабочий процесс")
+            workers = 1
+        self.host = host
+        self.port = port
+        self.factory = factory
+        self.workers = [Worker(i) for i in range(max(1, workers))]
+        self.running = False
+        self.respawns = 0
+        self._respawn_at: Dict[int, float] = {}
+
+    def start(self):
+        self.running = True
+        for worker in self.workers:
+            self._spawn(worker)
+
+    def _spawn(self, worker: Worker):
+        r, w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            # Дочерний процесс
+            code = 0
+            try:
+                os.close(r)
+                for other in self.workers:
+                    if other.fd >= 0:
+                        os.close(other.fd)
+                os.set_blocking(w, False)
+                _worker_main(self.factory, self.host, self.port, w)
+            except BaseException as e:
+                logger.error(f"Рабочий процесс {os.getpid()}"
+                             f" завершился с ошибкой: {e}")
+                code = 1
+            finally:
+                os._exit(code)
+
+        os.close(w)
+        os.set_blocking(r, False)
+        worker.pid = pid
+        worker.fd = r
+        worker.buf = b""
+        worker.started = worker.last_seen = time.monotonic()
+        worker.stats = {}
+        logger.info(f"Запущен рабочий процесс {pid}"
+                    f" (слот {worker.slot})")
+
+    def _read(self, worker: Worker):
+        try:
+            data = os.read(worker.fd, 65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            # Процесс закрыл канал - его подберёт _reap
+            self._close_pipe(worker)
+            return
+        worker.buf += data
+        *lines, worker.buf = worker.buf.split(b"\n")
+        for line in lines:
+            try:
+                worker.stats = json.loads(line)
+            except ValueError:
+                continue
+            worker.last_seen = time.monotonic()
+
+    def _close_pipe(self, worker: Worker):
+        if worker.fd >= 0:
+            os.close(worker.fd)
+            worker.fd = -1
+
+    def _reap(self):
+        """Подбирает завершившиеся процессы и планирует перезапуск."""
+        now = time.monotonic()
+        for worker in self.workers:
+            if not worker.alive:
+                continue
+            try:
+                pid, status = os.waitpid(worker.pid, os.WNOHANG)
+            except ChildProcessError:
+                pid, status = worker.pid, 0
+            if pid == 0:
+                if now - worker.last_seen > HEARTBEAT_TIMEOUT:
+                    logger.warning(f"Рабочий процесс {worker.pid} не"
+                                   f" отвечает, перезапуск")
+                    self._kill(worker.pid, signal.SIGKILL)
+                continue
+
+            logger.warning(f"Рабочий процесс {worker.pid} завершился"
+                           f" (статус {status})")
+            self._close_pipe(worker)
+            worker.pid = 0
+            if now - worker.started >= STABLE_UPTIME:
+                worker.delay = RESPAWN_DELAY
+            if self.running:
+                self._respawn_at[worker.slot] = now + worker.delay
+                worker.delay = min(worker.delay * 2, MAX_RESPAWN_DELAY)
+
+    def _respawn_due(self):
+        now = time.monotonic()
+        for slot, when in list(self._respawn_at.items()):
+            if when <= now:
+                del self._respawn_at[slot]
+                self.respawns += 1
+                self._spawn(self.workers[slot])
+
+    @staticmethod
+    def _kill(pid: int, sig: int):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def poll(self, timeout: float = HEARTBEAT_INTERVAL):
+        """
+        Одна итерация надзора: чтение heartbeat, подбор завершившихся
+        процессов и перезапуск.
+        """
+        fds = {w.fd: w for w in self.workers if w.fd >= 0}
+        if fds:
+            try:
+                ready, _, _ = select.select(list(fds), [], [], timeout)
+            except InterruptedError:
+                ready = []
+            for fd in ready:
+                self._read(fds[fd])
+        else:
+            time.sleep(timeout)
+        self._reap()
+        self._respawn_due()
+
+    def run(self):
+        """Запускает процессы и надзирает за ними до stop()."""
+        if not self.running:
+            self.start()
+        while self.running:
+            self.poll()
+
+    def stats(self) -> dict:
+        """
+        Суммарная статистика всех процессов.
+
+        Returns:
+            dict: Суммы счётчиков процессов (для полей MAX_STATS -
+                максимум), а также число живых процессов (workers) и
+                перезапусков (respawns)
+        """
+        total: Dict[str, float] = {}
+        for worker in self.workers:
+            for key, value in worker.stats.items():
+                if not isinstance(value, (int, float)):
+                    continue
+                if key in MAX_STATS:
+                    total[key] = max(total.get(key, value), value)
+                else:
+                    total[key] = total.get(key, 0) + value
+        total["workers"] = sum(1 for w in self.workers if w.alive)
+        total["respawns"] = self.respawns
+        return total
+
+    def pids(self) -> Dict[int, int]:
+        """Номера процессов по слотам."""
+        return {w.slot: w.pid for w in self.workers if w.alive}
+
+    def stop(self, timeout: Optional[float] = STOP_TIMEOUT):
+        """
+        Останавливает все процессы: SIGTERM, а тем, кто не завершился за
+        timeout секунд, SIGKILL. timeout None - ждать без ограничения.
+        """
+        self.running = False
+        self._respawn_at.clear()
+        for worker in self.workers:
+            if worker.alive:
+                self._kill(worker.pid, signal.SIGTERM)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for worker in self.workers:
+            while worker.alive:
+                try:
+                    pid, _ = os.waitpid(worker.pid, os.WNOHANG)
+                except ChildProcessError:
+                    pid = worker.pid
+                if pid:
+                    worker.pid = 0
+                elif deadline is not None and time.monotonic() >= deadline:
+                    self._kill(worker.pid, signal.SIGKILL)
+                    os.waitpid(worker.pid, 0)
+                    worker.pid = 0
+                else:
+                    time.sleep(0.05)
+            self._close_pipe(worker)
+        logger.info("Все рабочие процессы остановлены")
@@ -0,0 +1,102 @@
+import math
+from typing import Dict, Hashable, List, Optional
+
+# Длительность одного тика колеса, секунды
+WHEEL_TICK = 1.0
+
+# Количество ячеек колеса (один оборот = WHEEL_SIZE * WHEEL_TICK секунд)
+WHEEL_SIZE = 512
+
+
+class TimerWheel:
+    """
+    Хэшированное колесо таймеров для дедлайнов соединений.
+
+    Элемент кладётся в ячейку, соответствующую тику его дедлайна;
+    дедлайны дальше одного оборота хранят число оставшихся оборотов.
+    Добавление и удаление - O(1), продвижение колеса стоит
+    O(пройденных тиков + истёкших элементов) и не зависит от общего
+    числа соединений.
+
+    Колесо не знает о причинах дедлайна: expire возвращает элементы,
+    чья ячейка наступила, а вызывающий решает, закрыть соединение или
+    переставить его на новый дедлайн (если была активность).
+    """
+
+    def __init__(self, tick: float = WHEEL_TICK, size: int = WHEEL_SIZE,
+                 start: float = 0.0):
+        self.tick = tick
+        self.size = size
+        self._slots: List[Dict[Hashable, int]] = [{} for _ in range(size)]
+        self._where: Dict[Hashable, int] = {}
+        self._current = self._tick_of(start)
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, item: Hashable) -> bool:
+        return item in self._where
+
+    def _tick_of(self, when: float) -> int:
+        return int(math.floor(when / self.tick))
+
+    def add(self, item: Hashable, deadline: float):
+        """Ставит (или переставляет) элемент на дедлайн deadline."""
+        self.remove(item)
+        target = max(math.ceil(deadline / self.tick), self._current + 1)
+        rounds, _ = divmod(target - self._current - 1, self.size)
+        slot = target % self.size
+        self._slots[slot][item] = rounds
+        self._where[item] = slot
+
+    def remove(self, item: Hashable):
+        slot = self._where.pop(item, None)
+        if slot is not None:
+            self._slots[slot].pop(item, None)
+
+    def expire(self, now: float) -> List[Hashable]:
+        """
+        Продвигает колесо до момента now.
+
+        Returns:
+            list: Элементы, чей дедлайн наступил
+        """
+        expired = []
+        target = self._tick_of(now)
+        if not self._where:
+            self._current = max(self._current, target)
+            return expired
+        while self._current < target:
+            self._current += 1
+            slot = self._slots[self._current % self.size]
+            if not slot:
+                continue
+            for item, rounds in list(slot.items()):
+                if rounds:
+                    slot[item] = rounds - 1
+                else:
+                    del slot[item]
+                    del self._where[item]
+                    expired.append(item)
+        return expired
+
+    def next_deadline(self) -> Optional[float]:
+        """
+        Ближайший дедлайн (с точностью до тика) или None.
+
+        Первая непустая ячейка не обязательно ближайшая: её элементы
+        могут ждать ещё несколько оборотов, поэтому при ненулевом числе
+        оборотов просматриваются и остальные ячейки.
+        """
+        if not self._where:
+            return None
+        best = None
+        for step in range(1, self.size + 1):
+            slot = self._slots[(self._current + step) % self.size]
+            if slot:
+                ticks = step + min(slot.values()) * self.size
+                if best is None or ticks < best:
+                    best = ticks
+                if ticks <= self.size:
+                    break
+        return (self._current + best) * self.tick
@@ -0,0 +1,330 @@
+import collections
+import re
+from itertools import chain
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from Server.ad_domens import DOMAIN_RULE_OPTIONS
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Токен URL: то, что правило может "привязать" к границам слова
+TOKEN = re.compile(r"[a-z0-9%]+")
+
+# Длина начала/конца токена, по которой индексируются правила с токеном,
+# ограниченным только с одной стороны
+KEY_SIZE = 3
+
+# Разделитель ^ в правилах EasyList: любой символ, кроме букв, цифр и
+# _-.%, или конец адреса
+SEPARATOR = r"(?:[^a-z0-9_.%-]|$)"
+
+# Начало адреса для правил ||: схема и любые поддомены
+HOST_ANCHOR = r"^[a-z][a-z0-9+.-]*://(?:[^/?#]*\.)?"
+
+# Символы, после которых правило с / по краям считается регулярным
+# выражением, а не путём
+REGEX_CHARS = set("\\^$.*+?()[]{}|")
+
+# Опции правила после последнего $
+OPTIONS = re.compile(r"[\w~,=.|-]+")
+
+# Метки косметических правил
+COSMETIC = ("##", "#@#", "#?#", "#$#")
+
+
+class Rule:
+    """Одно правило на URL."""
+
+    __slots__ = ("text", "literal", "regex")
+
+    def __init__(self, text: str, literal: str,
+                 regex: Optional["re.Pattern"] = None):
+        # Правило как в списке (для журнала), самая длинная буквальная
+        # часть и регулярное выражение (None - правило и есть подстрока)
+        self.text = text
+        self.literal = literal
+        self.regex = regex
+
+    def test(self, url: str) -> bool:
+        if self.regex is None:
+            return self.literal in url
+        return self.regex.search(url) is not None
+
+    def __repr__(self) -> str:
+        return f"<Rule {self.text!r}>"
+
+
+class AhoCorasick:
+    """
+    Автомат Ахо-Корасик: за один проход по тексту находит все вхождения
+    всех добавленных строк.
+
+    Используется модуль ahocorasick (pyahocorasick), если он установлен,
+    иначе - реализация на словарях.
+    """
+
+    def __init__(self):
+        self._words: Dict[str, List] = {}
+        self._native = None
+        self._goto: List[dict] = []
+        self._fail: List[int] = []
+        self._out: List[list] = []
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    def add(self, word: str, value):
+        self._words.setdefault(word, []).append(value)
+
+    def build(self):
+        """Строит автомат; после этого add не вызывается."""
+        if ahocorasick is not None:
+            self._native = ahocorasick.Automaton()
+            for word, values in self._words.items():
+                self._native.add_word(word, values)
+            if self._words:
+                self._native.make_automaton()
+            return
+
+        goto, out = [{}], [[]]
+        for word, values in self._words.items():
+            state = 0
+            for ch in word:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto.append({})
+                    out.append([])
+                    goto[state][ch] = nxt
+                state = nxt
+            out[state] = out[state] + values
+        fail = [0] * len(goto)
+        queue = collections.deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                f = goto[f].get(ch, 0)
+                fail[nxt] = f if f != nxt else 0
+                if out[fail[nxt]]:
+                    out[nxt] = out[nxt] + out[fail[nxt]]
+        self._goto, self._fail, self._out = goto, fail, out
+
+    def iter(self, text: str) -> Iterator:
+        """Значения всех строк, входящих в text, в порядке вхождения."""
+        if self._native is not None:
+            if self._words:
+                for _, values in self._native.iter(text):
+                    yield from values
+            return
+        if not self._words:
+            return
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for ch in text:
+            nxt = goto[state].get(ch)
+            while nxt is None and state:
+                state = fail[state]
+                nxt = goto[state].get(ch)
+            state = nxt or 0
+            if out[state]:
+                yield from out[state]
+
+
+def parse_url_rule(line: str) -> Optional[tuple]:
+    """
+    Разбирает правило EasyList на URL.
+
+    Returns:
+        Optional[tuple]: (шаблон в нижнем регистре, правило-исключение
+            @@) или None для комментариев, косметических правил,
+            регулярных выражений и правил с опциями, которые прокси не
+            может проверить ($domain=, типы ресурсов)
+    """
+    line = line.strip()
+    if not line or line[0] in "![" or any(m in line for m in COSMETIC):
+        return None
+    exception = line.startswith("@@")
+    if exception:
+        line = line[2:]
+    pattern, sep, options = line.rpartition("$")
+    if sep and OPTIONS.fullmatch(options):
+        if not DOMAIN_RULE_OPTIONS.issuperset(options.lower().split(",")):
+            return None
+    else:
+        pattern = line
+    pattern = pattern.lower()
+    if (len(pattern) > 2 and pattern[0] == "/" and pattern[-1] == "/"
+            and REGEX_CHARS.intersection(pattern[1:-1])):
+        return None
+    pattern = pattern.strip("*")
+    if pattern in ("", "|", "||"):
+        return None
+    return pattern, exception
+
+
+def compile_rule(pattern: str) -> Rule:
+    """Переводит шаблон EasyList в Rule."""
+    if not any(ch in pattern for ch in "*^|"):
+        return Rule(pattern, pattern)
+    body = pattern
+    prefix = suffix = ""
+    if body.startswith("||"):
+        prefix, body = HOST_ANCHOR, body[2:]
+    elif body.startswith("|"):
+        prefix, body = "^", body[1:]
+    if body.endswith("|"):
+        suffix, body = "$", body[:-1]
+    parts = []
+    for piece in re.split(r"(\*|\^)", body):
+        if piece == "*":
+            parts.append(".*")
+        elif piece == "^":
+            parts.append(SEPARATOR)
+        else:
+            parts.append(re.escape(piece))
+    literal = max(re.split(r"[*^|]", body), key=len)
+    return Rule(pattern, literal, re.compile(prefix + "".join(parts) + suffix))
+
+
+def rule_token(pattern: str) -> Optional[Tuple[str, str]]:
+    """
+    Ключ, по которому правило ищется в индексе RuleSet.
+
+    Returns:
+        Optional[tuple]: ("=", токен) - самый длинный токен шаблона,
+            который в любом подходящем URL будет целым токеном (с обеих
+            сторон - не буквы и не цифры, разделитель ^ или начало
+            адреса); если такого нет - ("<", первые KEY_SIZE символов) или
+            (">", последние KEY_SIZE символов) самого длинного токена,
+            ограниченного только в начале или только в конце: токен URL
+            с ним начинается или им заканчивается. None, если нет и таких
+    """
+    exact = partial = None
+    body = pattern[2:] if pattern.startswith("||") else pattern.lstrip("|")
+    # Начало адреса (|) и начало имени хоста (||) - тоже граница токена
+    anchored = pattern.startswith("|")
+    for match in TOKEN.finditer(body):
+        start, end = match.span()
+        before = body[start - 1] if start else ("|" if anchored else "*")
+        after = body[end] if end < len(body) else "*"
+        token = match.group()
+        if before != "*" and after != "*":
+            if exact is None or len(token) > len(exact):
+                exact = token
+        elif (before != after and len(token) >= KEY_SIZE
+                and (partial is None or len(token) > len(partial[1]))):
+            partial = ("<", token) if after == "*" else (">", token)
+    if exact is not None:
+        return "=", exact
+    if partial is None:
+        return None
+    kind, token = partial
+    return kind, token[:KEY_SIZE] if kind == "<" else token[-KEY_SIZE:]
+
+
+class RuleSet:
+    """
+    Набор правил на URL.
+
+    Правила индексируются по токену (rule_token): для URL достаточно
+    разбить его на токены и проверить только правила с совпавшим токеном
+    или его началом/концом. Правила без такого токена ищутся автоматом
+    Ахо-Корасик по их буквальной части (на C, если установлен
+    pyahocorasick). Правила без буквальной части проверяются перебором.
+    """
+
+    def __init__(self, patterns: Iterable[str] = ()):
+        self.tokens: Dict[str, List[Rule]] = {}
+        self.prefixes: Dict[str, List[Rule]] = {}
+        self.suffixes: Dict[str, List[Rule]] = {}
+        self.automaton = AhoCorasick()
+        self.generic: List[Rule] = []
+        self.count = 0
+        for pattern in patterns:
+            self.add(pattern)
+        self.automaton.build()
+
+    def add(self, pattern: str):
+        rule = compile_rule(pattern)
+        self.count += 1
+        key = rule_token(pattern)
+        if key is not None:
+            kind, token = key
+            index = {"=": self.tokens, "<": self.prefixes,
+                     ">": self.suffixes}[kind]
+            index.setdefault(token, []).append(rule)
+        elif rule.literal:
+            self.automaton.add(rule.literal, rule)
+        else:
+            self.generic.append(rule)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def match(self, url: str) -> Optional[Rule]:
+        """Первое подходящее правило для url (в нижнем регистре)."""
+        tokens, prefixes, suffixes = self.tokens, self.prefixes, self.suffixes
+        if tokens or prefixes or suffixes:
+            for token in TOKEN.findall(url):
+                for rule in chain(tokens.get(token, ()),
+                                  prefixes.get(token[:KEY_SIZE], ()),
+                                  suffixes.get(token[-KEY_SIZE:], ())):
+                    if rule.test(url):
+                        return rule
+        for rule in self.automaton.iter(url):
+            if rule.regex is None or rule.regex.search(url):
+                return rule
+        for rule in self.generic:
+            if rule.test(url):
+                return rule
+        return None
+
+
+class UrlFilter:
+    """
+    Фильтр запросов по правилам EasyList на URL (/adservice/, &ad_type=,
+    ||host/path^ и т.п.) - дополнение к is_ad_host, который проверяет
+    только имя хоста.
+    """
+
+    def __init__(self, lines: Iterable[str]):
+        blocks, allows = [], []
+        for line in lines:
+            rule = parse_url_rule(line)
+            if rule is not None:
+                (allows if rule[1] else blocks).append(rule[0])
+        self.blocks = RuleSet(blocks)
+        self.allows = RuleSet(allows)
+        self.checked = 0
+        self.matched = 0
+
+    @classmethod
+    def from_file(cls, path: str) -> "UrlFilter":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(f)
+
+    def __len__(self) -> int:
+        return len(self.blocks) + len(self.allows)
+
+    def match(self, url: str) -> Optional[str]:
+        """
+        Проверяет URL запроса.
+
+        Returns:
+            Optional[str]: Правило, по которому запрос блокируется, или
+                None
+        """
+        self.checked += 1
+        url = url.lower()
+        rule = self.blocks.match(url)
+        if rule is None or self.allows.match(url) is not None:
+            return None
+        self.matched += 1
+        return rule.text
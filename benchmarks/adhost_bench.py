@@ -0,0 +1,60 @@
+"""
+Проверка хоста по списку рекламных доменов: прежний линейный перебор
+AD_HOSTS_1, поиск суффиксов хоста в множестве и is_ad_host с прогретым
+кэшем решений.
+
+    python -m benchmarks.adhost_bench --domains 50000
+"""
+import argparse
+import random
+import string
+import time
+
+import Server.ProxyServer as ps
+from Server.blocklist import match_domain
+
+
+def legacy_is_ad_host(hst: str) -> bool:
+    """is_ad_host до перехода на поиск по суффиксам."""
+    return any(hst == d or hst.endswith("." + d) for d in ps.AD_HOSTS_1)
+
+
+def random_domain(rng: random.Random) -> str:
+    labels = ["".join(rng.choices(string.ascii_lowercase,
+                                  k=rng.randint(3, 10)))
+              for _ in range(rng.randint(1, 3))]
+    return ".".join(labels) + rng.choice((".com", ".net", ".ru", ".io"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--domains", type=int, default=50000)
+    parser.add_argument("--hosts", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    blocklist = {random_domain(rng) for _ in range(args.domains)}
+    listed = rng.sample(sorted(blocklist), args.hosts // 2)
+    hosts = ["cdn." + d for d in listed]
+    hosts += [random_domain(rng) for _ in range(args.hosts - len(hosts))]
+    rng.shuffle(hosts)
+
+    ps.AD_HOSTS_1.clear()
+    ps.AD_HOSTS_1.update(blocklist)
+    print(f"{len(blocklist)} доменов в списке, {len(hosts)} хостов")
+    for h in hosts:
+        ps.is_ad_host(h)
+    results = {}
+    for name, func in (("линейный перебор", legacy_is_ad_host),
+                       ("суффиксы в множестве",
+                        lambda h: match_domain(ps.AD_HOSTS_1, h)),
+                       ("кэш решений", ps.is_ad_host)):
+        start = time.perf_counter()
+        results[name] = [func(h) for h in hosts]
+        elapsed = time.perf_counter() - start
+        print(f"  {name:22} {elapsed / len(hosts) * 1e6:10.2f} мкс/хост")
+    assert len({tuple(r) for r in results.values()}) == 1
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Проверка хостов по снимку списка рекламных доменов с фильтром Блума и
+без него, при разной доле ложных срабатываний фильтра.
+
+    python -m benchmarks.bloom_bench --domains 500000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from Server.blocklist import Snapshot, match_domain, write_snapshot
+from benchmarks.adhost_bench import random_domain
+
+
+def measure(snapshot: Snapshot, hosts) -> float:
+    start = time.perf_counter()
+    for host in hosts:
+        match_domain(snapshot, host)
+    return (time.perf_counter() - start) / len(hosts) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--domains", type=int, default=500000)
+    parser.add_argument("--hosts", type=int, default=20000)
+    parser.add_argument("--blocked", type=float, default=0.05,
+                        help="доля хостов из списка")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    domains = {random_domain(rng) for _ in range(args.domains)}
+    listed = rng.sample(sorted(domains), int(args.hosts * args.blocked))
+    hosts = ["cdn." + d for d in listed]
+    hosts += ["www." + random_domain(rng)
+              for _ in range(args.hosts - len(hosts))]
+    rng.shuffle(hosts)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for rate in (None, 0.1, 0.01, 0.001):
+            path = os.path.join(tmp, f"ad_hosts_{rate}.bin")
+            write_snapshot(domains, path, bloom_fp_rate=rate)
+            snapshot = Snapshot(path)
+            # Первый проход прогревает страницы отображённого файла;
+            # счётчики - за последний проход
+            costs = []
+            for _ in range(4):
+                snapshot.bloom_saved = snapshot.bloom_false_positives = 0
+                costs.append(measure(snapshot, hosts))
+            cost = min(costs[1:])
+            name = "без фильтра" if rate is None else f"фильтр {rate:g}"
+            line = (f"  {name:14} {cost:6.2f} мкс/хост, снимок"
+                    f" {os.path.getsize(path) / 2 ** 20:5.1f} МиБ")
+            if rate is not None:
+                checks = snapshot.bloom_saved + snapshot.bloom_false_positives
+                line += (f", k={snapshot.bloom_hashes}, сэкономлено"
+                         f" {snapshot.bloom_saved} поисков, ложных"
+                         f" {snapshot.bloom_false_positives}"
+                         f" ({snapshot.bloom_false_positives / checks:.2%})")
+            print(line)
+            snapshot.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Обновление загруженного списка рекламных доменов: полная перезагрузка
+ad_hosts.txt против применения дельты на месте.
+
+    python -m benchmarks.delta_bench --domains 500000 --changes 500
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from Server.ad_domens import save_delta, save_domains
+from Server.blocklist import Delta, fingerprint, load_blocklist
+from benchmarks.adhost_bench import random_domain
+
+
+def measure(func):
+    """Время без трассировки памяти и пик памяти отдельным прогоном."""
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--domains", type=int, default=500000)
+    parser.add_argument("--changes", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    old = {random_domain(rng) for _ in range(args.domains)}
+    removed = set(rng.sample(sorted(old), args.changes // 2))
+    new = (old - removed) | {random_domain(rng)
+                             for _ in range(args.changes // 2)}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        text = os.path.join(tmp, "ad_hosts.txt")
+        delta_path = os.path.join(tmp, "ad_hosts.delta")
+        save_domains(new, text)
+        save_delta(new, old, text, delta_path)
+        loaded, _ = load_blocklist(text)
+        hosts = loaded.copy()
+        hosts.difference_update(new - old)
+        hosts.update(removed)
+        print(f"{len(new)} доменов, {args.changes} изменений")
+
+        def full():
+            reloaded, _ = load_blocklist(text)
+            return reloaded, fingerprint(reloaded)
+
+        def delta():
+            # Применение дельты идемпотентно, повторный прогон безопасен
+            Delta.read(delta_path).apply(hosts)
+
+        for name, func in (("полная перезагрузка", full),
+                           ("дельта на месте", delta)):
+            elapsed, peak = measure(func)
+            print(f"  {name:20} {elapsed * 1000:9.2f} мс, пик памяти"
+                  f" {peak / 2 ** 20:7.2f} МиБ")
+        assert hosts == loaded
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Компиляция EasyList: process_adblock_list (regex по каждой строке)
+против потокового compile_adblock_list на синтетическом списке.
+
+    python -m benchmarks.easylist_bench --rules 300000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from Server.ad_domens import compile_adblock_list, process_adblock_list
+from benchmarks.adhost_bench import random_domain
+
+
+def synthetic_list(rng: random.Random, rules: int):
+    """Строки, похожие на EasyList: сетевые, косметические, на пути."""
+    yield "[Adblock Plus 2.0]"
+    yield "! Title: synthetic"
+    for _ in range(rules):
+        domain = random_domain(rng)
+        kind = rng.random()
+        if kind < 0.35:
+            yield f"||{domain}^"
+        elif kind < 0.45:
+            yield f"||{domain}^$third-party"
+        elif kind < 0.55:
+            yield f"||cdn.{domain}^$script,domain=news.example"
+        elif kind < 0.6:
+            yield f"@@||{domain}^$document"
+        elif kind < 0.8:
+            yield f"{domain}##.ad-banner"
+        elif kind < 0.9:
+            yield f"/adservice/{domain.split('.')[0]}/*"
+        else:
+            yield f"! {domain}"
+
+
+def measure(func, *args):
+    """Время без трассировки памяти и пик памяти отдельным прогоном."""
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rules", type=int, default=300000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        easylist = os.path.join(tmp, "easylist.txt")
+        with open(easylist, "w", encoding="utf-8") as f:
+            for line in synthetic_list(rng, args.rules):
+                f.write(line + "\n")
+        size = os.path.getsize(easylist) / 2 ** 20
+        print(f"{args.rules} правил, {size:.1f} МиБ")
+        out = os.path.join(tmp, "ad_hosts.txt")
+        for name, func in (("process_adblock_list", process_adblock_list),
+                           ("compile_adblock_list", compile_adblock_list)):
+            elapsed, peak = measure(func, easylist, out)
+            with open(out, encoding="utf-8") as f:
+                count = sum(1 for _ in f)
+            print(f"  {name:22} {elapsed:7.2f} с {size / elapsed:7.1f} МиБ/с,"
+                  f" пик памяти {peak / 2 ** 20:6.1f} МиБ, {count} доменов")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Стоимость разбора заголовков запроса: прежние parse_request и
+modify_request (разбиение всего пакета на строки с декодированием)
+против RequestHead (смещения без декодирования, замена цели запроса
+срезами).
+
+    python -m benchmarks.parse_bench
+"""
+import argparse
+import timeit
+
+from Server.http_message import RequestHead, RequestReader
+
+REQUEST = (b"GET http://www.example.com/static/js/app.js?v=123 HTTP/1.1\r\n"
+           b"Host: www.example.com\r\n"
+           b"User-Agent: Mozilla/5.0 (X11; Linux x86_64) Firefox/128.0\r\n"
+           b"Accept: */*\r\n"
+           b"Accept-Language: ru-RU,ru;q=0.8,en-US;q=0.5,en;q=0.3\r\n"
+           b"Accept-Encoding: gzip, deflate\r\n"
+           b"Referer: http://www.example.com/\r\n"
+           b"Cookie: session=0123456789abcdef; theme=dark\r\n"
+           b"Connection: keep-alive\r\n\r\n")
+
+# Тот же запрос с телом в первом пакете: прежние функции разбирали и его
+POST = (REQUEST.replace(b"GET", b"POST", 1)[:-2]
+        + b"Content-Length: 16384\r\n\r\n" + b"a=1\r\n" * 3276 + b"xxxx")
+
+
+def legacy_modify_request(data: bytes) -> bytes:
+    """modify_request до перехода на RequestHead."""
+    try:
+        lines = data.split(b"\r\n")
+        if not lines:
+            return data
+        first = lines[0].decode("utf-8", errors="ignore").split(" ")
+        if len(first) < 3:
+            return data
+        method, url, proto = first
+        if url.startswith("http://") or url.startswith("https://"):
+            idx = url.find("/", url.find("://") + 3)
+            path = url[idx:] if idx != -1 else "/"
+            lines[0] = b" ".join(
+                [method.encode(), path.encode(), proto.encode()]
+            )
+        return b"\r\n".join(lines)
+    except UnicodeError:
+        return data
+
+
+def legacy_parse_request(data: bytes):
+    """parse_request до перехода на RequestHead."""
+    lines = data.split(b"\r\n")
+    if not lines:
+        return None, None, None
+    parts = lines[0].decode("utf-8", errors="ignore").split(" ")
+    if len(parts) < 2:
+        return None, None, None
+    method = parts[0]
+    if method == "CONNECT":
+        host_port = parts[1].split(":")
+        port = int(host_port[1]) if len(host_port) > 1 else 443
+        return "CONNECT", host_port[0], port
+    for tag_line in lines[1:]:
+        line_str = tag_line.decode("utf-8", errors="ignore")
+        if line_str.lower().startswith("host:"):
+            host_port = line_str.split(":", 1)[1].strip()
+            if ":" in host_port:
+                host, port = host_port.split(":")
+                return method, host, int(port)
+            return method, host_port, 80
+    return None, None, None
+
+
+def legacy(data: bytes):
+    legacy_parse_request(data)
+    return legacy_modify_request(data)
+
+
+_reader = RequestReader()
+
+
+def incremental(data: bytes):
+    # Один RequestReader на соединение, как в ProxyServer
+    _reader.feed(data)
+    head = _reader.next_head().rewrite()
+    return head + _reader.take()
+
+
+def head_only(data: bytes):
+    end = data.find(b"\r\n\r\n") + 4
+    return RequestHead(data[:end]).rewrite() + data[end:]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=100000)
+    args = parser.parse_args()
+
+    for title, data in (("GET без тела", REQUEST),
+                        ("POST с телом 16 КБ", POST)):
+        assert legacy(data) == incremental(data) == head_only(data)
+        print(f"{title}, {len(data)} байт:")
+        for name, func in (("parse_request+modify_request", legacy),
+                           ("RequestReader+RequestHead", incremental),
+                           ("RequestHead", head_only)):
+            best = min(timeit.repeat(lambda: func(data), number=args.n,
+                                     repeat=5))
+            print(f"  {name:30} {best / args.n * 1e6:8.2f} мкс/запрос")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Сравнение движков прокси под одинаковой нагрузкой.
+
+Поднимает локальный целевой HTTP-сервер, запускает выбранный движок
+(ProxyServer на select или AsyncProxyServer на asyncio) и гоняет через
+него CLIENTS параллельных клиентов, каждый делает REQUESTS запросов
+(одно соединение на запрос, как у обычного HTTP/1.0-клиента).
+
+    python -m benchmarks.proxy_bench --engine select
+    python -m benchmarks.proxy_bench --engine asyncio --clients 50
+"""
+import argparse
+import logging
+import socket
+import threading
+import time
+from unittest import mock
+
+import Server.ProxyServer as ps
+from Logs.logger import get_logger
+from Server import async_proxy
+
+BODY = b"x" * 1024
+RESPONSE = (b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n"
+            b"Connection: close\r\n\r\n" % len(BODY)) + BODY
+
+
+def start_origin() -> int:
+    """Целевой сервер: на каждый запрос отвечает RESPONSE и закрывает."""
+    srv = socket.socket()
+    srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    srv.bind(("127.0.0.1", 0))
+    srv.listen(1024)
+
+    def serve(conn):
+        with conn:
+            conn.recv(4096)
+            conn.sendall(RESPONSE)
+
+    def accept_loop():
+        while True:
+            conn, _ = srv.accept()
+            threading.Thread(target=serve, args=(conn,), daemon=True).start()
+
+    threading.Thread(target=accept_loop, daemon=True).start()
+    return srv.getsockname()[1]
+
+
+def start_select() -> int:
+    server = ps.ProxyServer("127.0.0.1", 0)
+    threading.Thread(target=server.main_loop, daemon=True).start()
+    return server.server.getsockname()[1]
+
+
+def start_asyncio(use_uvloop: bool) -> int:
+    ready = threading.Event()
+    server = async_proxy.AsyncProxyServer("127.0.0.1", 0, dump=False)
+
+    def runner():
+        loop = async_proxy.new_event_loop(use_uvloop)
+        loop.run_until_complete(server.start())
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=runner, daemon=True).start()
+    ready.wait()
+    return server.port
+
+
+def client(proxy_port: int, origin_port: int, requests: int,
+           latencies: list):
+    req = (b"GET http://127.0.0.1:%d/ HTTP/1.1\r\nHost: 127.0.0.1:%d\r\n"
+           b"Connection: close\r\n\r\n" % (origin_port, origin_port))
+    for _ in range(requests):
+        start = time.perf_counter()
+        with socket.create_connection(("127.0.0.1", proxy_port)) as s:
+            s.sendall(req)
+            received = 0
+            while received < len(RESPONSE):
+                chunk = s.recv(65536)
+                if not chunk:
+                    break
+                received += len(chunk)
+        latencies.append(time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--engine", choices=("select", "asyncio"),
+                        default="select")
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--no-uvloop", action="store_true")
+    args = parser.parse_args()
+
+    get_logger().setLevel(logging.WARNING)
+    origin_port = start_origin()
+    # Дампы отключаются для обоих движков, чтобы мерить только пересылку
+    with mock.patch.object(ps, "save_dump", lambda *a: None):
+        if args.engine == "select":
+            proxy_port = start_select()
+        else:
+            proxy_port = start_asyncio(not args.no_uvloop)
+
+        latencies: list = []
+        threads = [
+            threading.Thread(target=client, args=(
+                proxy_port, origin_port, args.requests, latencies))
+            for _ in range(args.clients)
+        ]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    total = len(latencies)
+    print(f"engine={args.engine} clients={args.clients}"
+          f" requests={total}")
+    print(f"  {total / elapsed:.0f} req/s,"
+          f" p50={latencies[total // 2] * 1000:.2f} ms,"
+          f" p99={latencies[int(total * 0.99)] * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Загрузка списка рекламных доменов: чтение ad_hosts.txt в множество
+против открытия скомпилированного снимка (mmap), и стоимость проверки
+хоста в обоих случаях.
+
+    python -m benchmarks.snapshot_bench --domains 500000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from Server.ad_domens import save_domains, save_snapshot
+from Server.blocklist import Snapshot, match_domain
+from benchmarks.adhost_bench import random_domain
+
+
+def load_text(path: str) -> set:
+    """Загрузка как в ProxyServer до появления снимка."""
+    hosts = set()
+    with open(path, "r") as f:
+        for line in f:
+            host = line.strip()
+            if host and not host.startswith("#"):
+                hosts.add(host)
+    return hosts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--domains", type=int, default=500000)
+    parser.add_argument("--hosts", type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    domains = {random_domain(rng) for _ in range(args.domains)}
+    listed = rng.sample(sorted(domains), args.hosts // 2)
+    hosts = ["cdn." + d for d in listed]
+    hosts += [random_domain(rng) for _ in range(args.hosts - len(hosts))]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        text_path = os.path.join(tmp, "ad_hosts.txt")
+        bin_path = os.path.join(tmp, "ad_hosts.bin")
+        save_domains(domains, text_path)
+        save_snapshot(domains, bin_path)
+        print(f"{len(domains)} доменов: текст"
+              f" {os.path.getsize(text_path) / 2 ** 20:.1f} МиБ, снимок"
+              f" {os.path.getsize(bin_path) / 2 ** 20:.1f} МиБ")
+
+        start = time.perf_counter()
+        as_set = load_text(text_path)
+        elapsed = time.perf_counter() - start
+        print(f"  загрузка текста  {elapsed * 1e3:9.2f} мс")
+        start = time.perf_counter()
+        snapshot = Snapshot(bin_path)
+        elapsed = time.perf_counter() - start
+        print(f"  открытие снимка  {elapsed * 1e3:9.2f} мс")
+
+        results = {}
+        for name, source in (("множество", as_set), ("снимок", snapshot)):
+            start = time.perf_counter()
+            results[name] = [match_domain(source, h) for h in hosts]
+            elapsed = time.perf_counter() - start
+            print(f"  проверка: {name:10} {elapsed / len(hosts) * 1e6:8.2f}"
+                  f" мкс/хост")
+        assert results["множество"] == results["снимок"]
+        snapshot.close()
+
+
+if __name__ == "__main__":
+    main()
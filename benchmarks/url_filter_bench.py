@@ -0,0 +1,95 @@
+"""
+Проверка URL по правилам EasyList: UrlFilter (индекс токенов и автомат
+Ахо-Корасик) против перебора всех правил на синтетическом списке.
+
+    python -m benchmarks.url_filter_bench --rules 50000
+"""
+import argparse
+import random
+import string
+import time
+
+import Server.url_filter as uf
+from Server.url_filter import UrlFilter, compile_rule, parse_url_rule
+from benchmarks.adhost_bench import random_domain
+
+
+def random_word(rng: random.Random) -> str:
+    return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9)))
+
+
+def synthetic_rules(rng: random.Random, rules: int):
+    """Правила на URL в пропорциях, похожих на EasyList."""
+    for _ in range(rules):
+        kind = rng.random()
+        word = random_word(rng)
+        if kind < 0.4:
+            yield f"/{word}/"
+        elif kind < 0.55:
+            yield f"&{word}="
+        elif kind < 0.7:
+            yield f"||{random_domain(rng)}/{word}^"
+        elif kind < 0.8:
+            yield f"/{word}/*/{random_word(rng)}."
+        elif kind < 0.9:
+            yield f"-{word}-"
+        elif kind < 0.97:
+            yield f"{word}_"
+        else:
+            yield f"@@/{word}/ok/"
+
+
+def synthetic_urls(rng: random.Random, rules, count: int):
+    """Адреса запросов; часть содержит слова из правил."""
+    words = [p.strip("/&=-_|^") for p in rules if p[0] in "/&-"]
+    for _ in range(count):
+        path = "/".join(random_word(rng) for _ in range(rng.randint(1, 4)))
+        if rng.random() < 0.1:
+            path += "/" + rng.choice(words).split("/")[0] + "/x.js"
+        yield (f"http://{random_domain(rng)}/{path}"
+               f"?id={rng.randint(0, 10 ** 6)}&v={random_word(rng)}")
+
+
+def legacy_match(rules, url: str):
+    """Перебор всех правил подряд."""
+    for rule in rules:
+        if rule.test(url):
+            return rule.text
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rules", type=int, default=50000)
+    parser.add_argument("--urls", type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    lines = list(synthetic_rules(rng, args.rules))
+    urls = list(synthetic_urls(rng, lines, args.urls))
+    backend = "pyahocorasick" if uf.ahocorasick is not None else "Python"
+    start = time.perf_counter()
+    url_filter = UrlFilter(lines)
+    built = time.perf_counter() - start
+    print(f"{len(url_filter)} правил, автомат: {backend},"
+          f" построение {built:.2f} с")
+
+    start = time.perf_counter()
+    blocked = sum(url_filter.match(url) is not None for url in urls)
+    elapsed = time.perf_counter() - start
+    print(f"  {'UrlFilter.match':16} {elapsed / len(urls) * 1e6:9.2f} мкс/URL,"
+          f" заблокировано {blocked} из {len(urls)}")
+
+    # Перебор медленный: хватит малой выборки
+    blocks = [compile_rule(r[0]) for r in map(parse_url_rule, lines)
+              if r is not None and not r[1]]
+    sample = urls[:200]
+    start = time.perf_counter()
+    for url in sample:
+        legacy_match(blocks, url.lower())
+    per_url = (time.perf_counter() - start) / len(sample) * 1e6
+    print(f"  {'перебор правил':16} {per_url:9.2f} мкс/URL")
+
+
+if __name__ == "__main__":
+    main()
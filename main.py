@@ -3,6 +3,8 @@ import math
 import sys
 import time
 from Server.ProxyServer import ProxyServer
+from Server.supervisor import Supervisor
+from Server import async_proxy
 from Logs.logger import get_logger
 from typing import Union, List
 
@@ -10,6 +12,15 @@ logger = get_logger()
 HOST = "localhost"
 PORT = 8080
 
+# Число рабочих процессов прокси; больше 1 - режим с супервизором и
+# SO_REUSEPORT (см. Server/supervisor.py)
+WORKERS = 1
+
+# Движок прокси: "select" - ProxyServer, "asyncio" - AsyncProxyServer.
+# Оба проверяют каждый запрос keep-alive соединения по спискам
+# блокировки; asyncio работает в одном процессе (WORKERS не учитывается)
+ENGINE = "select"
+
 
 def is_prime(n: int) -> bool:
     """Проверяет, является ли число простым"""
@@ -115,7 +126,41 @@ def run_demo_functions():
 
 # Основная логик
 
-def run():
+def run_workers(workers: int):
+    supervisor = Supervisor(HOST, PORT, workers)
+    try:
+        logger.info(f"Запуск {workers} рабочих процессов"
+                    f" на {HOST}:{PORT}")
+        supervisor.run()
+    except KeyboardInterrupt:
+        logger.info("Получен сигнал"
+                    " прерывания, остановка"
+                    " сервера")
+    finally:
+        logger.info(f"Статистика: {supervisor.stats()}")
+        supervisor.stop()
+
+
+def run_async():
+    try:
+        async_proxy.run(HOST, PORT)
+    except KeyboardInterrupt:
+        logger.info("Получен сигнал"
+                    " прерывания, остановка"
+                    " сервера")
+
+
+def run(workers: int = WORKERS, engine: str = ENGINE):
+    if engine == "asyncio":
+        run_demo_functions()
+        run_async()
+        return
+
+    if workers > 1:
+        run_demo_functions()
+        run_workers(workers)
+        return
+
     server = None
     try:
         run_demo_functions()
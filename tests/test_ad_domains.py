@@ -1,10 +1,20 @@
+import os
 import unittest
 import tempfile
 from pathlib import Path
 from Server.ad_domens import (extract_domains,
                               save_domains,
-                              process_adblock_list
+                              save_snapshot,
+                              process_adblock_list,
+                              parse_network_rule,
+                              compile_rules,
+                              compile_adblock_list,
+                              detect_format,
+                              collect_list,
+                              merge_lists,
+                              compile_lists
                               )
+from Server.blocklist import Delta, Snapshot, fingerprint, match_domain
 
 
 class TestAdDomains(unittest.TestCase):
@@ -63,6 +73,19 @@ class TestAdDomains(unittest.TestCase):
             content = output_path.read_text(encoding="utf-8").splitlines()
             self.assertEqual(len(content), 3)
 
+    def test_process_adblock_list_snapshot(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = Path(tmpdir) / "input.txt"
+            input_path.write_text("example.com\nads.example.net##x\n",
+                                  encoding="utf-8")
+            snapshot_path = Path(tmpdir) / "ad_hosts.bin"
+            process_adblock_list(str(input_path),
+                                 str(Path(tmpdir) / "output.txt"),
+                                 str(snapshot_path))
+            snap = Snapshot(str(snapshot_path))
+            self.assertEqual(set(snap), {"example.com", "ads.example.net"})
+            snap.close()
+
     def test_error_handling(self):
         # Проверка несуществующего файла
         with self.assertRaises(RuntimeError):
@@ -75,6 +98,156 @@ class TestAdDomains(unittest.TestCase):
             invalid_path = Path(tmpdir) / "nonexistent_folder/output.txt"
             save_domains({"test.com"}, str(invalid_path))
 
+        with self.assertRaises(RuntimeError), \
+                tempfile.TemporaryDirectory() as tmpdir:
+            invalid_path = Path(tmpdir) / "nonexistent_folder/output.bin"
+            save_snapshot({"test.com"}, str(invalid_path))
+
+
+class TestCompileRules(unittest.TestCase):
+    def test_parse_network_rule(self):
+        self.assertEqual(parse_network_rule("||Ads.Example.com^\n"),
+                         ("ads.example.com", False))
+        self.assertEqual(parse_network_rule("@@||good.com^$document"),
+                         ("good.com", True))
+        self.assertEqual(parse_network_rule("||track.net^$third-party"),
+                         ("track.net", False))
+        for line in ("||ads.com^$script", "||ads.com^$domain=news.com",
+                     "||ads.com/banner.js", "||ads.com", "||ads*.com^",
+                     "ads.com##.banner", "! ||ads.com^", "||a..com^",
+                     "/adservice/*"):
+            self.assertIsNone(parse_network_rule(line), line)
+
+    def test_exceptions_and_parent_pruning(self):
+        lines = [
+            "[Adblock Plus 2.0]",
+            "||ads.com^",
+            "||cdn.ads.com^",
+            "||tracker.net^",
+            "||pixel.tracker.net^$third-party",
+            "||good.org^",
+            "||x.good.org^",
+            "@@||good.org^",
+            "||widgets.net^",
+            "@@||widgets.net^$domain=example.com",
+            "@@||api.tracker.net^",
+            "@@||unrelated.io^",
+        ]
+        self.assertEqual(compile_rules(lines),
+                         {"ads.com", "tracker.net", "widgets.net",
+                          "@@api.tracker.net"})
+
+    def test_compile_adblock_list(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = Path(tmpdir) / "easylist.txt"
+            input_path.write_text("||b.com^\n||a.com^\nc.com##.ad\n",
+                                  encoding="utf-8")
+            output_path = Path(tmpdir) / "ad_hosts.txt"
+            count = compile_adblock_list(str(input_path), str(output_path))
+            self.assertEqual(count, 2)
+            self.assertEqual(
+                output_path.read_text(encoding="utf-8").splitlines(),
+                ["a.com", "b.com"])
+            with self.assertRaises(RuntimeError):
+                compile_adblock_list(str(Path(tmpdir) / "missing.txt"),
+                                     str(output_path))
+
+
+class TestMergeLists(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.easylist = self.write("easylist.txt",
+                                   "[Adblock Plus 2.0]\n||ads.com^\n"
+                                   "@@||good.tracker.net^\n")
+        self.hosts = self.write("hosts",
+                                "# hosts\n127.0.0.1 localhost\n"
+                                "0.0.0.0 tracker.net pixel.ads.com\n"
+                                "0.0.0.0 Metrics.Example.ORG. # tail\n")
+        self.domains = self.write("domains.txt",
+                                  "! plain list\nads.com\nsolo.io\n")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, text):
+        path = self.dir / name
+        path.write_text(text, encoding="utf-8")
+        return str(path)
+
+    def test_detect_format_and_collect(self):
+        self.assertEqual(detect_format(self.easylist), "adblock")
+        self.assertEqual(detect_format(self.hosts), "hosts")
+        self.assertEqual(detect_format(self.domains), "domains")
+        self.assertEqual(collect_list(self.hosts),
+                         ({"tracker.net", "pixel.ads.com",
+                           "metrics.example.org"}, set()))
+        self.assertEqual(collect_list(self.domains),
+                         ({"ads.com", "solo.io"}, set()))
+
+    def test_provenance_and_pruning(self):
+        for workers in (1, 2):
+            merged = merge_lists([self.easylist, self.hosts, self.domains],
+                                 workers=workers)
+            # pixel.ads.com покрыт ads.com; исключение good.tracker.net
+            # из easylist.txt действует на tracker.net из hosts
+            self.assertEqual(merged, {
+                "ads.com": "easylist.txt",
+                "tracker.net": "hosts",
+                "@@good.tracker.net": "easylist.txt",
+                "metrics.example.org": "hosts",
+                "solo.io": "domains.txt",
+            })
+
+    def test_compile_lists_snapshot_sources(self):
+        output = str(self.dir / "ad_hosts.txt")
+        snapshot = str(self.dir / "ad_hosts.bin")
+        count = compile_lists([self.easylist, self.hosts], output, snapshot,
+                              workers=1)
+        self.assertEqual(count, 4)
+        snap = Snapshot(snapshot)
+        self.assertTrue(match_domain(snap, "x.tracker.net"))
+        self.assertFalse(match_domain(snap, "good.tracker.net"))
+        self.assertFalse(match_domain(snap, "a.good.tracker.net"))
+        self.assertEqual(snap.source("ads.com"), "easylist.txt")
+        self.assertEqual(snap.source("tracker.net"), "hosts")
+        self.assertIsNone(snap.source("other.com"))
+        self.assertEqual(snap.bloom_bits, 0)
+        snap.close()
+        compile_lists([self.easylist, self.hosts], output, snapshot,
+                      workers=1, bloom_fp_rate=0.01)
+        snap = Snapshot(snapshot)
+        self.assertGreater(snap.bloom_bits, 0)
+        self.assertIn("tracker.net", snap)
+        snap.close()
+        with self.assertRaises(RuntimeError):
+            compile_lists([str(self.dir / "missing")], output)
+
+    def test_compile_lists_delta(self):
+        output = str(self.dir / "ad_hosts.txt")
+        snapshot = str(self.dir / "ad_hosts.bin")
+        delta_path = self.dir / "ad_hosts.delta"
+        compile_lists([self.easylist], output, workers=1,
+                      delta_file=str(delta_path))
+        self.assertFalse(delta_path.exists())
+
+        compile_lists([self.hosts], output, workers=1,
+                      delta_file=str(delta_path))
+        delta = Delta.read(str(delta_path))
+        new = {"tracker.net", "pixel.ads.com", "metrics.example.org"}
+        self.assertEqual(delta.added, sorted(new))
+        self.assertEqual(delta.removed, ["ads.com"])
+        self.assertEqual(delta.base, fingerprint({"ads.com"}))
+        self.assertEqual(delta.target, fingerprint(new))
+        st = os.stat(output)
+        self.assertEqual(delta.text, (st.st_size, st.st_mtime_ns))
+
+        # Снимок прокси перезагружает целиком: дельта не пишется, а
+        # старая удаляется
+        compile_lists([self.easylist], output, snapshot, workers=1,
+                      delta_file=str(delta_path))
+        self.assertFalse(delta_path.exists())
+
 
 if __name__ == "__main__":
     unittest.main(verbosity=2)
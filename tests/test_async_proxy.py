@@ -0,0 +1,162 @@
+import asyncio
+import unittest
+from unittest import mock
+
+import Server.ProxyServer as ps
+from Server.async_proxy import NO_CONTENT, AsyncProxyServer
+from Server.url_filter import UrlFilter
+
+
+class TestAsyncProxyServer(unittest.IsolatedAsyncioTestCase):
+    OK = b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok"
+
+    async def asyncSetUp(self):
+        self.proxy = AsyncProxyServer("127.0.0.1", 0, dump=False)
+        await self.proxy.start()
+        self.origin = await asyncio.start_server(self.echo, "127.0.0.1", 0)
+        self.origin_port = self.origin.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.origin.close()
+        await self.origin.wait_closed()
+        await self.proxy.close()
+
+    async def echo(self, reader, writer):
+        while True:
+            data = await reader.read(4096)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+        writer.close()
+
+    async def serve_http(self, reader, writer):
+        """Целевой сервер с keep-alive: на каждый запрос отвечает OK."""
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                self.requests.append(head.split(b"\r\n")[0])
+                writer.write(self.OK)
+                await writer.drain()
+        except asyncio.IncompleteReadError:
+            pass
+        writer.close()
+
+    async def start_http_origin(self) -> int:
+        self.requests = []
+        origin = await asyncio.start_server(self.serve_http, "127.0.0.1", 0)
+        self.addAsyncCleanup(origin.wait_closed)
+        self.addCleanup(origin.close)
+        return origin.sockets[0].getsockname()[1]
+
+    async def read_exactly(self, reader, size: int) -> bytes:
+        return await asyncio.wait_for(reader.readexactly(size), 5)
+
+    async def request(self, data: bytes, expect: int) -> bytes:
+        reader, writer = await asyncio.open_connection("127.0.0.1",
+                                                       self.proxy.port)
+        writer.write(data)
+        await writer.drain()
+        received = b""
+        while len(received) < expect:
+            chunk = await asyncio.wait_for(reader.read(4096), 5)
+            if not chunk:
+                break
+            received += chunk
+        writer.close()
+        return received
+
+    async def test_blocked_http(self):
+        with mock.patch.object(ps, "AD_HOSTS_1", {"ads.test"}):
+            resp = await self.request(
+                b"GET / HTTP/1.1\r\nHost: ads.test\r\n\r\n", 1)
+        self.assertTrue(resp.startswith(b"HTTP/1.1 204"))
+        self.assertEqual(self.proxy.blocked, 1)
+
+    async def test_blocked_connect(self):
+        with mock.patch.object(ps, "AD_HOSTS_1", {"ads.test"}):
+            resp = await self.request(
+                b"CONNECT ads.test:443 HTTP/1.1\r\n\r\n", 1)
+        self.assertTrue(resp.startswith(b"HTTP/1.1 403"))
+
+    async def test_http_request_is_rewritten(self):
+        req = (b"GET http://127.0.0.1:%d/x HTTP/1.1\r\n"
+               b"Host: 127.0.0.1:%d\r\n\r\n"
+               % (self.origin_port, self.origin_port))
+        expected = ps.modify_request(req)
+        resp = await self.request(req, len(expected))
+        self.assertEqual(resp, expected)
+
+    async def test_connect_tunnel(self):
+        reader, writer = await asyncio.open_connection("127.0.0.1",
+                                                       self.proxy.port)
+        writer.write(b"CONNECT 127.0.0.1:%d HTTP/1.1\r\n\r\n"
+                     % self.origin_port)
+        line = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 5)
+        self.assertIn(b"200 Connection Established", line)
+        writer.write(b"ping")
+        self.assertEqual(await asyncio.wait_for(reader.readexactly(4), 5),
+                         b"ping")
+        writer.close()
+
+    async def test_keep_alive_requests_checked_separately(self):
+        port = await self.start_http_origin()
+        reader, writer = await asyncio.open_connection("127.0.0.1",
+                                                       self.proxy.port)
+        get = (b"GET http://127.0.0.1:%d/ HTTP/1.1\r\n"
+               b"Host: 127.0.0.1:%d\r\n\r\n" % (port, port))
+        with mock.patch.object(ps, "AD_HOSTS_1", {"ads.test"}):
+            writer.write(get)
+            self.assertEqual(await self.read_exactly(reader, len(self.OK)),
+                             self.OK)
+            # Второй запрос в том же соединении - к рекламному домену
+            writer.write(b"GET http://ads.test/track HTTP/1.1\r\n"
+                         b"Host: ads.test\r\n\r\n")
+            resp = await self.read_exactly(reader, len(NO_CONTENT))
+            self.assertEqual(resp, NO_CONTENT)
+            writer.write(get)
+            self.assertEqual(await self.read_exactly(reader, len(self.OK)),
+                             self.OK)
+        writer.close()
+        self.assertEqual(self.requests, [b"GET / HTTP/1.1"] * 2)
+        stats = self.proxy.stats()
+        self.assertEqual(stats["blocked_by"], {"ad_hosts.txt": 1})
+        self.assertEqual(stats["upstream_reused"], 1)
+
+    async def test_url_rule_blocks_request(self):
+        port = await self.start_http_origin()
+        url_filter = UrlFilter(["/adservice/", "@@/adservice/ok/"])
+        reader, writer = await asyncio.open_connection("127.0.0.1",
+                                                       self.proxy.port)
+        with mock.patch.object(ps, "URL_FILTER", url_filter):
+            writer.write(b"GET /adservice/x.js HTTP/1.1\r\n"
+                         b"Host: 127.0.0.1:%d\r\n\r\n" % port)
+            self.assertEqual(
+                await self.read_exactly(reader, len(NO_CONTENT)), NO_CONTENT)
+            writer.write(b"GET /adservice/ok/x.js HTTP/1.1\r\n"
+                         b"Host: 127.0.0.1:%d\r\n\r\n" % port)
+            self.assertEqual(await self.read_exactly(reader, len(self.OK)),
+                             self.OK)
+            stats = self.proxy.stats()
+        writer.close()
+        self.assertEqual(self.requests, [b"GET /adservice/ok/x.js HTTP/1.1"])
+        self.assertEqual(stats["blocked_by"], {"ad_urls.txt": 1})
+        self.assertEqual((stats["url_filter_checked"],
+                          stats["url_filter_matched"]), (2, 1))
+
+    async def test_head_split_across_reads(self):
+        port = await self.start_http_origin()
+        reader, writer = await asyncio.open_connection("127.0.0.1",
+                                                       self.proxy.port)
+        writer.write(b"GET http://127.0.0.1:%d/a HTTP/1.1\r\n" % port)
+        await writer.drain()
+        await asyncio.sleep(0.05)
+        writer.write(b"Host: 127.0.0.1:%d\r\n\r\n" % port)
+        self.assertEqual(await self.read_exactly(reader, len(self.OK)),
+                         self.OK)
+        writer.close()
+        self.assertEqual(self.requests, [b"GET /a HTTP/1.1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
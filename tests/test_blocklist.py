@@ -0,0 +1,267 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import Server.ProxyServer as ps
+from Server.blocklist import (BlocklistReloader, DecisionCache, Delta,
+                              DomainSet, Snapshot, bloom_size, fingerprint,
+                              load_snapshot, match_domain, matching_domain,
+                              write_snapshot)
+
+
+class TestMatchDomain(unittest.TestCase):
+    def test_parent_suffixes_only(self):
+        hosts = {"ads.test"}
+        self.assertTrue(match_domain(hosts, "ads.test"))
+        self.assertTrue(match_domain(hosts, "a.b.ads.test"))
+        self.assertFalse(match_domain(hosts, "badads.test"))
+        self.assertFalse(match_domain(hosts, "ads.test.org"))
+
+    def test_most_specific_exception_wins(self):
+        hosts = {"tracker.test", "@@good.tracker.test", "x.good.tracker.test"}
+        self.assertTrue(match_domain(hosts, "a.tracker.test"))
+        self.assertFalse(match_domain(hosts, "good.tracker.test"))
+        self.assertFalse(match_domain(hosts, "a.good.tracker.test"))
+        self.assertIsNone(matching_domain(hosts, "a.good.tracker.test"))
+        # Более точная запись снова блокирует
+        self.assertTrue(match_domain(hosts, "x.good.tracker.test"))
+        self.assertEqual(matching_domain(hosts, "a.x.good.tracker.test"),
+                         "x.good.tracker.test")
+
+
+class TestDomainSet(unittest.TestCase):
+    def test_every_mutation_bumps_generation(self):
+        hosts = DomainSet({"a.test"})
+        seen = [hosts.generation]
+        hosts.add("b.test")
+        seen.append(hosts.generation)
+        hosts.update({"c.test"})
+        seen.append(hosts.generation)
+        hosts |= {"d.test"}
+        seen.append(hosts.generation)
+        hosts.discard("a.test")
+        seen.append(hosts.generation)
+        hosts.clear()
+        seen.append(hosts.generation)
+        self.assertEqual(seen, sorted(set(seen)))
+        self.assertIsInstance(hosts, DomainSet)
+
+
+class TestDecisionCache(unittest.TestCase):
+    def test_hits_and_lru_eviction(self):
+        hosts = DomainSet({"ads.test"})
+        cache = DecisionCache(maxsize=2)
+        self.assertTrue(cache.lookup(hosts, "x.ads.test"))
+        self.assertFalse(cache.lookup(hosts, "ok.test"))
+        self.assertTrue(cache.lookup(hosts, "x.ads.test"))
+        cache.lookup(hosts, "other.test")
+        # ok.test использовался давнее всех и вытеснен
+        self.assertEqual(len(cache), 2)
+        cache.lookup(hosts, "ok.test")
+        self.assertEqual((cache.hits, cache.misses), (1, 4))
+
+    def test_change_of_list_invalidates(self):
+        hosts = DomainSet()
+        cache = DecisionCache()
+        self.assertFalse(cache.lookup(hosts, "ads.test"))
+        hosts.add("ads.test")
+        self.assertTrue(cache.lookup(hosts, "ads.test"))
+        self.assertFalse(cache.lookup(DomainSet(), "ads.test"))
+        self.assertEqual(cache.invalidations, 2)
+
+    def test_is_ad_host_uses_cache(self):
+        hosts = DomainSet({"ads.test"})
+        cache = DecisionCache()
+        with mock.patch.object(ps, "AD_HOSTS_1", hosts), \
+                mock.patch.object(ps, "AD_HOST_CACHE", cache):
+            self.assertTrue(ps.is_ad_host("a.ads.test"))
+            self.assertTrue(ps.is_ad_host("a.ads.test"))
+            hosts.remove("ads.test")
+            self.assertFalse(ps.is_ad_host("a.ads.test"))
+        self.assertEqual(cache.stats()["hits"], 1)
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "ad_hosts.bin")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        domains = {f"ads{i}.example{i % 7}.com" for i in range(500)}
+        self.assertEqual(write_snapshot(domains, self.path), 500)
+        snap = Snapshot(self.path)
+        try:
+            self.assertEqual(len(snap), 500)
+            self.assertEqual(set(snap), domains)
+            self.assertIn("ads42.example0.com", snap)
+            self.assertNotIn("ads42.example1.com", snap)
+            self.assertNotIn("example0.com", snap)
+            self.assertTrue(match_domain(snap, "x.ads42.example0.com"))
+        finally:
+            snap.close()
+
+    def test_empty_snapshot(self):
+        write_snapshot([], self.path)
+        snap = Snapshot(self.path)
+        self.assertNotIn("ads.test", snap)
+        self.assertEqual(list(snap), [])
+        snap.close()
+
+    def test_rejects_foreign_file(self):
+        with open(self.path, "wb") as f:
+            f.write(b"ads.test\n" * 4)
+        with self.assertRaises(ValueError):
+            Snapshot(self.path)
+        self.assertIsNone(load_snapshot(self.path))
+        self.assertIsNone(load_snapshot(self.path + ".missing"))
+
+    def test_sources(self):
+        write_snapshot({"ads.test", "x.test"}, self.path,
+                       {"ads.test": "easylist.txt"})
+        snap = Snapshot(self.path)
+        try:
+            self.assertEqual(snap.sources, ["easylist.txt"])
+            self.assertEqual(snap.source("ads.test"), "easylist.txt")
+            self.assertIsNone(snap.source("x.test"))
+            self.assertEqual(set(snap), {"ads.test", "x.test"})
+            with mock.patch.object(ps, "AD_SNAPSHOT", snap), \
+                    mock.patch.object(ps, "AD_HOSTS_1", DomainSet()):
+                self.assertEqual(ps.ad_host_source("cdn.ads.test"),
+                                 "easylist.txt")
+                self.assertIsNone(ps.ad_host_source("ok.test"))
+        finally:
+            snap.close()
+
+    def test_bloom_filter(self):
+        domains = {f"ads{i}.example.com" for i in range(2000)}
+        write_snapshot(domains, self.path, bloom_fp_rate=0.01)
+        snap = Snapshot(self.path)
+        try:
+            self.assertEqual((snap.bloom_bits, snap.bloom_hashes),
+                             bloom_size(2000, 0.01))
+            # Ложноотрицательных ответов нет
+            self.assertTrue(all(d in snap for d in domains))
+            self.assertEqual(set(snap), domains)
+            misses = [f"ok{i}.example.net" for i in range(2000)]
+            self.assertFalse(any(d in snap for d in misses))
+            self.assertEqual(snap.bloom_saved + snap.bloom_false_positives,
+                             2000)
+            self.assertLess(snap.bloom_false_positives, 60)
+        finally:
+            snap.close()
+        with self.assertRaises(ValueError):
+            bloom_size(10, 1.5)
+
+    def test_is_ad_host_consults_snapshot(self):
+        write_snapshot({"ads.test"}, self.path)
+        snap = Snapshot(self.path)
+        cache = DecisionCache()
+        with mock.patch.object(ps, "AD_HOSTS_1", DomainSet({"extra.test"})), \
+                mock.patch.object(ps, "AD_SNAPSHOT", snap), \
+                mock.patch.object(ps, "AD_HOST_CACHE", cache):
+            self.assertTrue(ps.is_ad_host("a.ads.test"))
+            self.assertTrue(ps.is_ad_host("extra.test"))
+            self.assertFalse(ps.is_ad_host("ok.test"))
+        snap.close()
+
+
+class TestBlocklistReloader(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.text = os.path.join(self.tmp.name, "ad_hosts.txt")
+        self.snapshot = os.path.join(self.tmp.name, "ad_hosts.bin")
+        with open(self.text, "w") as f:
+            f.write("ads.test\n")
+        self.installed = []
+        self.reloader = BlocklistReloader(
+            self.text, self.snapshot,
+            lambda hosts, snap: self.installed.append((hosts, snap)))
+        self.reloader.load()
+
+    def tearDown(self):
+        for _, snap in self.installed:
+            if snap is not None:
+                snap.close()
+        self.tmp.cleanup()
+
+    def test_text_change_swaps_list(self):
+        self.assertEqual(self.installed[-1][0], {"ads.test"})
+        self.assertFalse(self.reloader.poll())
+        with open(self.text, "w") as f:
+            f.write("# обновлено\nads.test\nmore.test\n")
+        self.assertFalse(self.reloader.poll())
+        self.reloader._thread.join()
+        self.assertTrue(self.reloader.poll())
+        self.assertEqual(self.installed[-1][0], {"ads.test", "more.test"})
+        self.assertEqual(self.reloader.reloads, 1)
+        self.assertFalse(self.reloader.poll())
+
+    def test_snapshot_appears_and_notify_installs(self):
+        write_snapshot({"snap.test"}, self.snapshot)
+        calls = []
+        self.reloader.poll(calls.append)
+        self.reloader._thread.join()
+        self.assertEqual(calls, [self.reloader.poll])
+        self.assertTrue(calls[0]())
+        hosts, snap = self.installed[-1]
+        self.assertEqual(len(hosts), 0)
+        self.assertIn("snap.test", snap)
+
+    def delta_reloader(self):
+        delta_path = os.path.join(self.tmp.name, "ad_hosts.delta")
+        reloader = BlocklistReloader(
+            self.text, self.snapshot,
+            lambda hosts, snap: self.installed.append((hosts, snap)),
+            delta_path)
+        reloader.load()
+        return reloader, delta_path
+
+    def rewrite_text(self, domains):
+        with open(self.text, "w") as f:
+            f.write("".join(d + "\n" for d in sorted(domains)))
+        st = os.stat(self.text)
+        return st.st_size, st.st_mtime_ns
+
+    def test_delta_applied_in_place(self):
+        reloader, delta_path = self.delta_reloader()
+        hosts = self.installed[-1][0]
+        new = {"new.test", "other.test"}
+        text = self.rewrite_text(new)
+        Delta(text, fingerprint({"ads.test"}), fingerprint(new),
+              ["new.test", "other.test"], ["ads.test"]).write(delta_path)
+        reloader.poll()
+        reloader._thread.join()
+        self.assertTrue(reloader.poll())
+        self.assertIs(self.installed[-1][0], hosts)
+        self.assertEqual(hosts, new)
+        self.assertEqual((reloader.reloads, reloader.deltas), (1, 1))
+
+    def test_delta_for_other_text_forces_full_reload(self):
+        reloader, delta_path = self.delta_reloader()
+        installs = len(self.installed)
+        self.rewrite_text({"ads.test", "new.test"})
+        Delta((0, 0), fingerprint({"ads.test"}),
+              fingerprint({"ads.test", "new.test"}), ["new.test"],
+              []).write(delta_path)
+        reloader.poll()
+        reloader._thread.join()
+        self.assertTrue(reloader.poll())
+        self.assertEqual(len(self.installed), installs + 1)
+        self.assertEqual(self.installed[-1][0], {"ads.test", "new.test"})
+        self.assertEqual(reloader.deltas, 0)
+
+    def test_failed_build_keeps_current_list(self):
+        os.remove(self.text)
+        self.reloader.poll()
+        self.reloader._thread.join()
+        self.assertFalse(self.reloader.poll())
+        self.assertEqual(self.reloader.failures, 1)
+        self.assertEqual(len(self.installed), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
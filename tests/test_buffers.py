@@ -0,0 +1,99 @@
+import socket
+import unittest
+
+from Server.buffers import BufferPool, OutboundBuffer
+
+
+class TestOutboundBuffer(unittest.TestCase):
+    def setUp(self):
+        self.a, self.b = socket.socketpair()
+        self.a.setblocking(False)
+
+    def tearDown(self):
+        self.a.close()
+        self.b.close()
+
+    def test_flush_sends_everything(self):
+        buf = OutboundBuffer()
+        buf.write(b"hello ")
+        buf.write(b"world")
+        self.assertEqual(len(buf), 11)
+        self.assertTrue(buf.flush(self.a))
+        self.assertFalse(buf)
+        self.assertEqual(self.b.recv(100), b"hello world")
+
+    def test_partial_write_keeps_order(self):
+        buf = OutboundBuffer()
+        payload = bytes(range(256)) * 8192
+        buf.write(payload)
+        self.assertFalse(buf.flush(self.a))
+        self.assertGreater(len(buf), 0)
+
+        received = b""
+        self.b.settimeout(1)
+        while len(received) < len(payload):
+            received += self.b.recv(65536)
+            buf.flush(self.a)
+        self.assertEqual(received, payload)
+        self.assertFalse(buf)
+
+    def test_send_direct_when_empty(self):
+        buf = OutboundBuffer()
+        data = bytearray(b"direct")
+        self.assertTrue(buf.send(self.a, memoryview(data)))
+        self.assertFalse(buf)
+        self.assertEqual(self.b.recv(100), b"direct")
+
+    def test_send_copies_remainder(self):
+        buf = OutboundBuffer()
+        data = bytearray(b"z" * (4 * 1024 * 1024))
+        self.assertFalse(buf.send(self.a, memoryview(data)))
+        self.assertGreater(len(buf), 0)
+        # Исходный буфер можно переиспользовать сразу после send
+        data[:] = bytes(len(data))
+
+        received = bytearray()
+        self.b.settimeout(1)
+        while len(received) < len(data):
+            received += self.b.recv(1024 * 1024)
+            buf.flush(self.a)
+        self.assertEqual(received, b"z" * len(data))
+
+    def test_water_marks(self):
+        buf = OutboundBuffer(high_water=10, low_water=4)
+        buf.write(b"x" * 10)
+        self.assertTrue(buf.is_full())
+        self.assertFalse(buf.is_drained())
+        buf.clear()
+        self.assertTrue(buf.is_drained())
+
+
+class TestBufferPool(unittest.TestCase):
+    def test_reuse(self):
+        pool = BufferPool()
+        buf = pool.acquire()
+        self.assertEqual(len(buf), 4096)
+        pool.release(buf)
+        self.assertIs(pool.acquire(), buf)
+        self.assertEqual(pool.stats()["reused"], 1)
+
+    def test_size_classes(self):
+        pool = BufferPool(min_size=4096, max_size=65536)
+        self.assertEqual(len(pool.acquire(5000)), 8192)
+        self.assertEqual(len(pool.acquire(10 ** 6)), 65536)
+
+    def test_adapt_grows_and_shrinks(self):
+        pool = BufferPool(min_size=4096, max_size=16384)
+        buf = pool.acquire()
+        buf = pool.adapt(buf, len(buf))
+        self.assertEqual(len(buf), 8192)
+        buf = pool.adapt(buf, len(buf))
+        buf = pool.adapt(buf, len(buf))
+        self.assertEqual(len(buf), 16384)
+        buf = pool.adapt(buf, 100)
+        self.assertEqual(len(buf), 8192)
+        self.assertIs(pool.adapt(buf, 4000), buf)
+
+
+if __name__ == "__main__":
+    unittest.main()
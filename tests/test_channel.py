@@ -0,0 +1,40 @@
+import socket
+import unittest
+
+from Server.channel import Channel, ChannelState
+from Server.event_loop import EVENT_READ, EVENT_WRITE
+
+
+class TestChannel(unittest.TestCase):
+    def setUp(self):
+        self.a, self.b = socket.socketpair()
+
+    def tearDown(self):
+        self.a.close()
+        self.b.close()
+
+    def test_slots(self):
+        ch = Channel(self.a, client=True)
+        with self.assertRaises(AttributeError):
+            ch.unknown = 1
+        self.assertEqual(ch.fd, self.a.fileno())
+
+    def test_parse_only_while_awaiting_request(self):
+        ch = Channel(self.a, client=True)
+        self.assertTrue(ch.parse)
+        ch.state = ChannelState.HTTP_RELAY
+        self.assertFalse(ch.parse)
+
+    def test_events(self):
+        ch = Channel(self.a, client=True)
+        self.assertEqual(ch.events(), EVENT_READ)
+        ch.out.write(b"x")
+        self.assertEqual(ch.events(), EVENT_READ | EVENT_WRITE)
+        ch.paused = True
+        self.assertEqual(ch.events(), EVENT_WRITE)
+        ch.out.clear()
+        self.assertEqual(ch.events(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import selectors
+import socket
+import threading
+import time
+import unittest
+
+from Server.event_loop import EventLoop, EVENT_READ, EVENT_WRITE
+
+
+class TestEventLoop(unittest.TestCase):
+    def setUp(self):
+        self.loop = EventLoop()
+        self.a, self.b = socket.socketpair()
+
+    def tearDown(self):
+        self.loop.close()
+        self.a.close()
+        self.b.close()
+
+    def test_register_and_poll(self):
+        self.assertTrue(self.loop.register(self.a, EVENT_READ, "data"))
+        self.assertEqual(len(self.loop), 1)
+        self.assertEqual(self.loop.poll(0), [])
+
+        self.b.send(b"x")
+        events = self.loop.poll(1)
+        self.assertEqual(events, [(self.a, EVENT_READ, "data")])
+
+    def test_modify_keeps_data(self):
+        self.loop.register(self.a, EVENT_READ, "data")
+        self.assertTrue(self.loop.modify(self.a, EVENT_WRITE))
+        events = self.loop.poll(1)
+        self.assertEqual(events, [(self.a, EVENT_WRITE, "data")])
+
+    def test_modify_registers_unknown_socket(self):
+        self.assertTrue(self.loop.modify(self.a, EVENT_READ))
+        self.assertTrue(self.loop.is_registered(self.a))
+
+    def test_unregister_closed_socket(self):
+        self.loop.register(self.a, EVENT_READ)
+        self.a.close()
+        self.assertTrue(self.loop.unregister(self.a))
+        self.assertFalse(self.loop.unregister(self.a))
+        self.assertEqual(len(self.loop), 0)
+
+    def test_custom_selector(self):
+        loop = EventLoop(selectors.SelectSelector())
+        try:
+            self.assertIsInstance(loop.selector, selectors.SelectSelector)
+        finally:
+            loop.close()
+
+
+class TestEventLoopTimers(unittest.TestCase):
+    def setUp(self):
+        self.loop = EventLoop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_no_timers_means_infinite_wait(self):
+        self.assertIsNone(self.loop.next_timeout())
+
+    def test_timers_run_in_order(self):
+        calls = []
+        self.loop.call_later(0.02, calls.append, "second")
+        self.loop.call_later(0, calls.append, "first")
+        self.assertLessEqual(self.loop.next_timeout(), 0.02)
+
+        self.loop.poll(self.loop.next_timeout())
+        self.loop.run_timers()
+        self.assertEqual(calls, ["first"])
+
+        self.loop.poll(self.loop.next_timeout())
+        self.loop.run_timers()
+        self.assertEqual(calls, ["first", "second"])
+        self.assertIsNone(self.loop.next_timeout())
+
+    def test_cancelled_timer_is_skipped(self):
+        calls = []
+        handle = self.loop.call_later(0, calls.append, 1)
+        handle.cancel()
+        self.assertIsNone(self.loop.next_timeout())
+        self.assertEqual(self.loop.run_timers(), 0)
+        self.assertEqual(calls, [])
+
+    def test_wakeup_interrupts_poll(self):
+        threading.Timer(0.05, self.loop.wakeup).start()
+        start = time.monotonic()
+        self.assertEqual(self.loop.poll(5), [])
+        self.assertLess(time.monotonic() - start, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,4 @@
+import select
 import threading
 import time
 import unittest
@@ -77,5 +78,38 @@ class TestForward(unittest.TestCase):
         )
 
 
+class TestForwardAsync(unittest.TestCase):
+    def setUp(self):
+        forward_mod.socket = real_socket
+
+    def test_async_connect(self):
+        port = 9002
+        srv = DummyServer(port, accept=True)
+        srv.start()
+        time.sleep(0.1)
+
+        f = Forward()
+        s = f.start_async("localhost", port)
+        self.assertIsNotNone(s)
+        try:
+            _, writable, _ = select.select([], [s], [], 2)
+            self.assertEqual(writable, [s])
+            self.assertTrue(f.finish_connect(s))
+            self.assertFalse(s.getblocking())
+        finally:
+            s.close()
+
+    def test_async_refused(self):
+        f = Forward()
+        s = f.start_async("127.0.0.1", 9999)
+        if s is None:
+            return
+        try:
+            select.select([], [s], [], 2)
+            self.assertFalse(f.finish_connect(s))
+        finally:
+            s.close()
+
+
 if __name__ == "__main__":
     unittest.main()
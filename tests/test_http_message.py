@@ -0,0 +1,126 @@
+import unittest
+
+from Server.http_message import (FramingError, MessageFramer, MAX_HEAD_SIZE,
+                                 RequestHead, RequestReader)
+
+
+def feed_bytewise(framer, data):
+    used = 0
+    for i in range(len(data)):
+        used += framer.feed(data[i:i + 1])
+        if framer.done:
+            break
+    return used
+
+
+class TestMessageFramer(unittest.TestCase):
+    def test_content_length(self):
+        resp = b"HTTP/1.1 200 OK\r\nContent-Length: 5\r\n\r\nhello"
+        framer = MessageFramer()
+        self.assertEqual(framer.feed(resp + b"NEXT"), len(resp))
+        self.assertTrue(framer.done)
+        self.assertTrue(framer.keep_alive)
+        self.assertEqual(framer.status, 200)
+
+    def test_chunked_split_anywhere(self):
+        resp = (b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+                b"5;ext=1\r\nhello\r\n6\r\n world\r\n0\r\nX-T: 1\r\n\r\n")
+        framer = MessageFramer()
+        self.assertEqual(feed_bytewise(framer, resp), len(resp))
+        self.assertTrue(framer.done)
+
+    def test_until_close_is_not_reusable(self):
+        framer = MessageFramer()
+        framer.feed(b"HTTP/1.1 200 OK\r\n\r\nbody")
+        self.assertFalse(framer.done)
+        self.assertFalse(framer.keep_alive)
+
+    def test_no_body_responses(self):
+        framer = MessageFramer(request_method="HEAD")
+        framer.feed(b"HTTP/1.1 200 OK\r\nContent-Length: 10\r\n\r\n")
+        self.assertTrue(framer.done)
+        framer = MessageFramer()
+        framer.feed(b"HTTP/1.1 100 Continue\r\n\r\n")
+        self.assertFalse(framer.done)
+        framer.feed(b"HTTP/1.1 304 Not Modified\r\n\r\n")
+        self.assertTrue(framer.done)
+
+    def test_connection_close_and_http10(self):
+        framer = MessageFramer()
+        framer.feed(b"HTTP/1.1 200 OK\r\nConnection: close\r\n"
+                    b"Content-Length: 0\r\n\r\n")
+        self.assertTrue(framer.done)
+        self.assertFalse(framer.keep_alive)
+        framer = MessageFramer()
+        framer.feed(b"HTTP/1.0 200 OK\r\nContent-Length: 0\r\n\r\n")
+        self.assertFalse(framer.keep_alive)
+
+    def test_request_without_body(self):
+        framer = MessageFramer(response=False)
+        req = b"GET / HTTP/1.1\r\nHost: a\r\n\r\n"
+        self.assertEqual(framer.feed(req + b"GET"), len(req))
+        self.assertTrue(framer.done)
+        self.assertTrue(framer.keep_alive)
+
+    def test_errors(self):
+        with self.assertRaises(FramingError):
+            MessageFramer().feed(b"HTTP/1.1 200 OK\r\n"
+                                 b"Content-Length: x\r\n\r\n")
+        with self.assertRaises(FramingError):
+            MessageFramer().feed(b"x" * (MAX_HEAD_SIZE + 1))
+
+
+
+class TestRequestHead(unittest.TestCase):
+    def test_absolute_form_rewrite(self):
+        raw = (b"GET http://example.com:8080/a?b=1 HTTP/1.1\r\n"
+               b"Host: example.com:8080\r\nX-Bin: \xff\r\n\r\n")
+        head = RequestHead(raw)
+        self.assertEqual((head.method, head.host, head.port),
+                         ("GET", "example.com", 8080))
+        self.assertEqual(head.rewrite(),
+                         raw.replace(b"http://example.com:8080", b""))
+        self.assertEqual(head.header(b"x-bin"), b"\xff")
+
+    def test_host_from_target_and_ipv6(self):
+        head = RequestHead(b"GET https://a.test HTTP/1.1\r\n\r\n")
+        self.assertEqual((head.host, head.port), ("a.test", 443))
+        self.assertEqual(head.rewrite(), b"GET / HTTP/1.1\r\n\r\n")
+        head = RequestHead(b"CONNECT [::1]:8443 HTTP/1.1\r\n\r\n")
+        self.assertEqual((head.host, head.port), ("::1", 8443))
+
+    def test_invalid(self):
+        with self.assertRaises(FramingError):
+            RequestHead(b"GARBAGE\r\n\r\n")
+        with self.assertRaises(FramingError):
+            RequestHead(b"CONNECT a.test:xx HTTP/1.1\r\n\r\n")
+        self.assertIsNone(RequestHead(b"GET / HTTP/1.1\r\n\r\n").host)
+
+    def test_request_framing_from_head(self):
+        head = RequestHead(b"POST / HTTP/1.1\r\nHost: a\r\n"
+                           b"Content-Length: 3\r\n\r\n")
+        framer = MessageFramer.for_request(head)
+        self.assertEqual(framer.feed(b"abcGET"), 3)
+        self.assertTrue(framer.done)
+
+
+class TestRequestReader(unittest.TestCase):
+    def test_head_split_across_reads(self):
+        reader = RequestReader()
+        req = b"GET / HTTP/1.1\r\nHost: a.test\r\n\r\n"
+        for i in range(len(req) - 1):
+            reader.feed(req[i:i + 1])
+            self.assertIsNone(reader.next_head())
+        reader.feed(req[-1:] + b"body")
+        self.assertEqual(reader.next_head().host, "a.test")
+        self.assertEqual(reader.take(), b"body")
+
+    def test_max_size(self):
+        reader = RequestReader(max_size=64)
+        reader.feed(b"GET / HTTP/1.1\r\n" + b"X: y\r\n" * 20)
+        with self.assertRaises(FramingError):
+            reader.next_head()
+
+
+if __name__ == "__main__":
+    unittest.main()
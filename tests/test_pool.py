@@ -0,0 +1,69 @@
+import socket
+import unittest
+from unittest import mock
+
+from Connection.pool import UpstreamPool
+
+
+class TestUpstreamPool(unittest.TestCase):
+    def setUp(self):
+        self.pairs = []
+
+    def tearDown(self):
+        for a, b in self.pairs:
+            a.close()
+            b.close()
+
+    def conn(self):
+        a, b = socket.socketpair()
+        a.setblocking(False)
+        self.pairs.append((a, b))
+        return a, b
+
+    def test_reuse_lifo(self):
+        pool = UpstreamPool()
+        (a, _), (b, _) = self.conn(), self.conn()
+        pool.release(("h", 80), a)
+        pool.release(("h", 80), b)
+        self.assertIs(pool.acquire(("h", 80)), b)
+        self.assertIs(pool.acquire(("h", 80)), a)
+        self.assertIsNone(pool.acquire(("h", 80)))
+        self.assertEqual(pool.hits, 2)
+
+    def test_closed_by_server_is_skipped(self):
+        pool = UpstreamPool()
+        a, b = self.conn()
+        pool.release(("h", 80), a)
+        b.close()
+        self.assertIsNone(pool.acquire(("h", 80)))
+        self.assertEqual(pool.stale, 1)
+
+    def test_unsolicited_data_is_skipped(self):
+        pool = UpstreamPool()
+        a, b = self.conn()
+        pool.release(("h", 80), a)
+        b.send(b"junk")
+        self.assertIsNone(pool.acquire(("h", 80)))
+
+    def test_limits(self):
+        pool = UpstreamPool(max_idle=2, max_per_host=1)
+        (a, _), (b, _), (c, _) = self.conn(), self.conn(), self.conn()
+        pool.release(("h", 80), a)
+        pool.release(("h", 80), b)
+        self.assertEqual(a.fileno(), -1)
+        pool.release(("g", 80), c)
+        self.assertEqual(len(pool), 2)
+        self.assertEqual(pool.evicted, 1)
+
+    def test_expire(self):
+        pool = UpstreamPool(idle_timeout=30)
+        a, _ = self.conn()
+        pool.release(("h", 80), a)
+        with mock.patch("Connection.pool.time.monotonic",
+                        return_value=10 ** 9):
+            pool.expire()
+        self.assertEqual(len(pool), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
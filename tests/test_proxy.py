@@ -1,5 +1,6 @@
 import math
 import os
+import socket
 import string
 import tempfile
 import unittest
@@ -67,6 +68,7 @@ from Server.ProxyServer import (ProxyServer,
                                 find_max,
                                 factorial,
                                 is_even, lcm)
+from Server.channel import Channel
 
 
 class DummySocket:
@@ -197,17 +199,25 @@ class TestProxyServer(unittest.TestCase):
         self.assertFalse(self.srv.running)
 
     def test_cleanup_inactive(self):
-        dummy = DummySocket()
-        self.srv.input_list.append(dummy)
+        sock, other = socket.socketpair()
+        ch = Channel(sock, client=True)
+        self.srv.channel[ch.fd] = ch
+        # сокет закрыт в обход on_close
+        sock.close()
+        other.close()
         # форсим необходимость очистки
         self.srv.last_cleanup -= 100
         self.srv._cleanup_inactive_connections()
-        self.assertNotIn(dummy, self.srv.input_list)
+        self.assertNotIn(ch.fd, self.srv.channel)
+        self.assertTrue(ch.closed)
+
+    def test_on_close_unknown_socket(self):
+        dummy = DummySocket()
+        self.srv.on_close(dummy)
+        self.assertEqual(self.srv.channel, {})
 
     def test_on_accept_error(self):
         fake = FakeServer()
-        # Заменяем и в input_list
-        self.srv.input_list[0] = fake
         self.srv.server = fake
         try:
             self.srv.on_accept()
@@ -0,0 +1,421 @@
+import socket
+import threading
+import unittest
+from unittest import mock
+
+import Server.ProxyServer as ps
+from Server.channel import Channel, ChannelState
+from Server.ProxyServer import ProxyServer
+from Server.relay import SPLICE_AVAILABLE
+from Server.url_filter import UrlFilter
+
+
+def make_pair(srv, state=ChannelState.TUNNEL):
+    """
+    Создаёт в srv связанную пару каналов поверх socketpair.
+
+    Returns:
+        tuple: (канал клиента, канал сервера, сокет клиента,
+            сокет целевого сервера)
+    """
+    client_out, client = socket.socketpair()
+    upstream, origin = socket.socketpair()
+    ch = Channel(client_out, client=True, state=state)
+    up = Channel(upstream, client=False, state=state, method="CONNECT")
+    ch.peer, up.peer = up, ch
+    for side in (ch, up):
+        side.sock.setblocking(False)
+        srv.channel[side.fd] = side
+    return ch, up, client, origin
+
+
+class TestProxyRelay(unittest.TestCase):
+    """Пересылка данных между клиентом и целевым сервером."""
+
+    def setUp(self):
+        patcher = mock.patch.object(ps, "save_dump")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.srv = ProxyServer("127.0.0.1", 0)
+        self.ch, self.up, self.client, self.origin = make_pair(self.srv)
+        self.ch.out.high_water = 1024
+        self.ch.out.low_water = 256
+        self.srv._update_events(self.ch)
+        self.srv._update_events(self.up)
+
+    def tearDown(self):
+        self.srv.shutdown()
+        self.client.close()
+        self.origin.close()
+
+    def test_channel_lookup_by_fd(self):
+        self.assertIs(self.srv._channel_of(self.ch.sock), self.ch)
+        self.assertIs(self.srv.channel[self.up.sock.fileno()], self.up)
+
+    def test_slow_client_pauses_upstream(self):
+        self.ch.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+        chunk = b"x" * 65536
+        for _ in range(8):
+            self.srv._send(self.ch, chunk)
+        self.assertTrue(self.up.paused)
+        self.assertFalse(self.srv.loop.is_registered(self.up.sock))
+
+        received = 0
+        self.client.settimeout(1)
+        while received < len(chunk) * 8:
+            received += len(self.client.recv(65536))
+            self.srv.on_write(self.ch.sock)
+        self.assertFalse(self.up.paused)
+
+    def test_client_paused_while_connecting(self):
+        self.ch.state = ChannelState.CONNECTING
+        self.ch.pending = []
+        self.client.sendall(b"x" * 4096)
+        while not self.ch.paused:
+            self.srv.on_recv(self.ch.sock)
+        self.assertGreaterEqual(sum(map(len, self.ch.pending)), 1024)
+        self.assertFalse(self.srv.loop.is_registered(self.ch.sock))
+
+    def test_eof_waits_for_pending_data(self):
+        self.ch.out.write(b"tail")
+        self.origin.close()
+        self.srv.on_recv(self.up.sock)
+        self.assertIs(self.ch.state, ChannelState.CLOSING)
+        self.assertIn(self.ch.fd, self.srv.channel)
+
+        self.srv.on_write(self.ch.sock)
+        self.assertTrue(self.ch.closed)
+        self.assertNotIn(self.ch.fd, self.srv.channel)
+        self.client.settimeout(1)
+        self.assertEqual(self.client.recv(100), b"tail")
+
+
+class TestZeroCopyTunnel(unittest.TestCase):
+    """Быстрая пересылка CONNECT-туннелей."""
+
+    def make_tunnel(self):
+        self.srv = ProxyServer("127.0.0.1", 0, zero_copy=True)
+        self.ch, self.up, self.client, self.origin = make_pair(self.srv)
+        self.srv._enable_tunnel_relay(self.ch)
+        self.srv._update_events(self.ch)
+        self.srv._update_events(self.up)
+
+    def tearDown(self):
+        self.srv.shutdown()
+        self.client.close()
+        self.origin.close()
+
+    def relay(self, payload):
+        self.origin.sendall(payload)
+        received = b""
+        self.client.settimeout(1)
+        while len(received) < len(payload):
+            self.srv.on_recv(self.up.sock)
+            self.srv.on_write(self.ch.sock)
+            received += self.client.recv(65536)
+        return received
+
+    @unittest.skipUnless(SPLICE_AVAILABLE, "нужен os.splice")
+    def test_splice_relay(self):
+        self.make_tunnel()
+        self.assertIsNotNone(self.ch.splice)
+        payload = bytes(range(256)) * 64
+        with mock.patch.object(ps, "save_dump") as dump:
+            self.assertEqual(self.relay(payload), payload)
+        dump.assert_not_called()
+
+    def test_recv_into_fallback(self):
+        with mock.patch.object(ps, "SPLICE_AVAILABLE", False):
+            self.make_tunnel()
+        self.assertIsNone(self.ch.splice)
+        payload = b"tunnel-data" * 100
+        self.assertEqual(self.relay(payload), payload)
+
+    def test_close_releases_pipes(self):
+        self.make_tunnel()
+        self.srv.on_close(self.ch.sock)
+        self.assertNotIn(self.up.fd, self.srv.channel)
+        self.assertIsNone(self.ch.splice)
+        self.assertIsNone(self.up.splice)
+
+
+class TestIdleTimeout(unittest.TestCase):
+    """Закрытие простаивающих соединений."""
+
+    def setUp(self):
+        self.srv = ProxyServer("127.0.0.1", 0)
+        self.ch, self.up, self.client, self.origin = make_pair(self.srv)
+        self.srv._watch_idle(self.ch)
+
+    def tearDown(self):
+        self.srv.shutdown()
+        self.client.close()
+        self.origin.close()
+
+    def test_idle_tunnel_is_closed(self):
+        deadline = self.ch.last_activity + ps.TUNNEL_IDLE_TIMEOUT
+        with mock.patch("Server.ProxyServer.time.monotonic",
+                        return_value=deadline + 1):
+            self.srv._expire_idle()
+        self.assertTrue(self.ch.closed)
+        self.assertTrue(self.up.closed)
+        self.assertEqual(len(self.srv.idle), 0)
+
+    def test_activity_postpones_deadline(self):
+        start = self.ch.last_activity
+        self.srv.loop.now = start + ps.TUNNEL_IDLE_TIMEOUT - 1
+        self.srv._touch(self.up)
+        with mock.patch("Server.ProxyServer.time.monotonic",
+                        return_value=start + ps.TUNNEL_IDLE_TIMEOUT + 1):
+            self.srv._expire_idle()
+        self.assertFalse(self.ch.closed)
+        self.assertIn(self.ch, self.srv.idle)
+        self.assertIsNotNone(self.srv._idle_timer)
+
+
+class TestAdmissionControl(unittest.TestCase):
+    """Пределы числа подключений."""
+
+    def make_server(self, **kwargs):
+        self.srv = ProxyServer("127.0.0.1", 0, **kwargs)
+        self.addr = self.srv.server.getsockname()
+        self.clients = []
+
+    def tearDown(self):
+        self.srv.shutdown()
+        for c in self.clients:
+            c.close()
+
+    def connect(self, n):
+        for _ in range(n):
+            self.clients.append(socket.create_connection(self.addr))
+
+    def test_accept_batch(self):
+        self.make_server()
+        self.connect(5)
+        self.srv.on_accept()
+        self.assertEqual(self.srv.clients, 5)
+        self.assertEqual(self.srv.per_ip, {"127.0.0.1": 5})
+
+    def test_overflow_pauses_accepting(self):
+        self.make_server(max_connections=2)
+        self.connect(3)
+        self.srv.on_accept()
+        self.assertEqual(self.srv.clients, 2)
+        self.assertFalse(self.srv.accepting)
+        self.assertFalse(self.srv.loop.is_registered(self.srv.server))
+
+        ch = next(iter(self.srv.channel.values()))
+        self.srv.on_close(ch.sock)
+        self.assertTrue(self.srv.accepting)
+        self.srv.on_accept()
+        self.assertEqual(self.srv.clients, 2)
+        self.assertEqual(self.srv.accepted, 3)
+
+    def test_overflow_rejects_with_503(self):
+        self.make_server(max_connections=1, overflow=ps.OVERFLOW_REJECT)
+        self.connect(2)
+        self.srv.on_accept()
+        self.assertEqual(self.srv.rejected_overflow, 1)
+        self.clients[1].settimeout(1)
+        self.assertTrue(self.clients[1].recv(100).startswith(
+            b"HTTP/1.1 503"))
+
+    def test_per_ip_limit(self):
+        self.make_server(max_per_ip=1)
+        self.connect(2)
+        self.srv.on_accept()
+        self.assertEqual(self.srv.clients, 1)
+        self.assertEqual(self.srv.rejected_per_ip, 1)
+        self.assertEqual(self.srv.stats()["rejected_per_ip"], 1)
+
+
+class KeepAliveOrigin(threading.Thread):
+    """Целевой сервер с keep-alive, считающий подключения."""
+
+    RESPONSE = b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok"
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(8)
+        self.port = self.sock.getsockname()[1]
+        self.connections = 0
+        self.requests = []
+
+    def run(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self.serve, args=(conn,),
+                             daemon=True).start()
+
+    def serve(self, conn):
+        with conn:
+            buf = b""
+            while True:
+                data = conn.recv(4096)
+                if not data:
+                    return
+                buf += data
+                while b"\r\n\r\n" in buf:
+                    head, rest = buf.split(b"\r\n\r\n", 1)
+                    length = 0
+                    for line in head.split(b"\r\n"):
+                        if line.lower().startswith(b"content-length:"):
+                            length = int(line.split(b":")[1])
+                    if len(rest) < length:
+                        break
+                    self.requests.append((head.split(b"\r\n")[0],
+                                          rest[:length]))
+                    buf = rest[length:]
+                    conn.sendall(self.RESPONSE)
+
+
+class TestUpstreamKeepAlive(unittest.TestCase):
+    """Повторное использование соединений с целевым сервером."""
+
+    def setUp(self):
+        patcher = mock.patch.object(ps, "save_dump")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.origin = KeepAliveOrigin()
+        self.origin.start()
+        self.srv = ProxyServer("127.0.0.1", 0)
+        self.thread = threading.Thread(target=self.srv.main_loop)
+        self.thread.start()
+
+    def tearDown(self):
+        self.srv.shutdown()
+        self.thread.join(5)
+        self.origin.sock.close()
+
+    def request(self, sock, port=None):
+        port = port or self.origin.port
+        sock.sendall(b"GET http://127.0.0.1:%d/ HTTP/1.1\r\n"
+                     b"Host: 127.0.0.1:%d\r\n\r\n" % (port, port))
+        return self.response(sock, len(KeepAliveOrigin.RESPONSE))
+
+    def response(self, sock, size):
+        resp = b""
+        while len(resp) < size:
+            chunk = sock.recv(4096)
+            if not chunk:
+                break
+            resp += chunk
+        return resp
+
+    def test_connection_is_reused(self):
+        addr = self.srv.server.getsockname()
+        with socket.create_connection(addr, timeout=5) as c:
+            self.assertEqual(self.request(c), KeepAliveOrigin.RESPONSE)
+            # Тот же клиент, следующий запрос
+            self.assertEqual(self.request(c), KeepAliveOrigin.RESPONSE)
+        with socket.create_connection(addr, timeout=5) as c:
+            self.assertEqual(self.request(c), KeepAliveOrigin.RESPONSE)
+        self.assertEqual(self.origin.connections, 1)
+        self.assertGreaterEqual(self.srv.upstreams.hits, 2)
+
+    def test_requests_routed_and_filtered_independently(self):
+        other = KeepAliveOrigin()
+        other.start()
+        self.addCleanup(other.sock.close)
+        addr = self.srv.server.getsockname()
+        ok = KeepAliveOrigin.RESPONSE
+        with mock.patch.object(ps, "AD_HOSTS_1", {"ads.test"}), \
+                socket.create_connection(addr, timeout=5) as c:
+            self.assertEqual(self.request(c), ok)
+            self.assertEqual(self.request(c, other.port), ok)
+            c.sendall(b"GET / HTTP/1.1\r\nHost: ads.test\r\n\r\n")
+            self.assertIn(b"204 No Content", self.response(c, 10))
+            self.assertEqual(self.request(c), ok)
+        self.assertEqual(len(self.origin.requests), 2)
+        self.assertEqual(len(other.requests), 1)
+        self.assertEqual(self.srv.stats()["blocked_by"],
+                         {"ad_hosts.txt": 1})
+
+    def test_url_rule_blocks_request(self):
+        port = self.origin.port
+        url_filter = UrlFilter(["/adservice/", "@@/adservice/ok/"])
+        addr = self.srv.server.getsockname()
+        with mock.patch.object(ps, "URL_FILTER", url_filter), \
+                socket.create_connection(addr, timeout=5) as c:
+            c.sendall(b"GET /adservice/x.js HTTP/1.1\r\n"
+                      b"Host: 127.0.0.1:%d\r\n\r\n" % port)
+            self.assertIn(b"204 No Content", self.response(c, 10))
+            c.sendall(b"GET /adservice/ok/x.js HTTP/1.1\r\n"
+                      b"Host: 127.0.0.1:%d\r\n\r\n" % port)
+            self.assertEqual(self.response(c, len(KeepAliveOrigin.RESPONSE)),
+                             KeepAliveOrigin.RESPONSE)
+            stats = self.srv.stats()
+        self.assertEqual(self.origin.requests, [
+            (b"GET /adservice/ok/x.js HTTP/1.1", b"")])
+        self.assertEqual(stats["blocked_by"], {"ad_urls.txt": 1})
+        self.assertEqual((stats["url_filter_checked"],
+                          stats["url_filter_matched"]), (2, 1))
+
+    def test_pipelined_requests_with_split_body(self):
+        port = self.origin.port
+        head = (b"POST http://127.0.0.1:%d/p HTTP/1.1\r\n"
+                b"Host: 127.0.0.1:%d\r\nContent-Length: 10\r\n\r\n"
+                % (port, port))
+        second = (b"GET http://127.0.0.1:%d/g HTTP/1.1\r\n"
+                  b"Host: 127.0.0.1:%d\r\n\r\n" % (port, port))
+        addr = self.srv.server.getsockname()
+        with socket.create_connection(addr, timeout=5) as c:
+            c.sendall(head[:20])
+            c.sendall(head[20:] + b"01234")
+            c.sendall(b"56789" + second)
+            resp = self.response(c, 2 * len(KeepAliveOrigin.RESPONSE))
+        self.assertEqual(resp, KeepAliveOrigin.RESPONSE * 2)
+        self.assertEqual(self.origin.requests, [
+            (b"POST /p HTTP/1.1", b"0123456789"),
+            (b"GET /g HTTP/1.1", b""),
+        ])
+
+    def test_upgrade_switches_to_tunnel(self):
+        origin = socket.socket()
+        origin.bind(("127.0.0.1", 0))
+        origin.listen(1)
+        self.addCleanup(origin.close)
+        port = origin.getsockname()[1]
+
+        def serve():
+            # Отвечает 101 и дальше возвращает всё, что прислал клиент
+            conn, _ = origin.accept()
+            with conn:
+                buf = b""
+                while b"\r\n\r\n" not in buf:
+                    buf += conn.recv(4096)
+                rest = buf.split(b"\r\n\r\n", 1)[1]
+                conn.sendall(b"HTTP/1.1 101 Switching Protocols\r\n"
+                             b"Upgrade: websocket\r\n"
+                             b"Connection: Upgrade\r\n\r\n" + rest)
+                while True:
+                    data = conn.recv(4096)
+                    if not data:
+                        return
+                    conn.sendall(data)
+
+        threading.Thread(target=serve, daemon=True).start()
+        head = (b"GET http://127.0.0.1:%d/ws HTTP/1.1\r\n"
+                b"Host: 127.0.0.1:%d\r\nUpgrade: websocket\r\n"
+                b"Connection: Upgrade\r\n\r\n" % (port, port))
+        addr = self.srv.server.getsockname()
+        with socket.create_connection(addr, timeout=5) as c:
+            # Кадр, пришедший вместе с запросом, ждёт ответа 101
+            c.sendall(head + b"ping")
+            resp = self.response(c, 1)
+            while not resp.endswith(b"ping"):
+                resp += self.response(c, 1)
+            self.assertTrue(resp.startswith(b"HTTP/1.1 101"))
+            c.sendall(b"pong")
+            self.assertEqual(self.response(c, 4), b"pong")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,6 +2,7 @@ import os
 import tempfile
 import unittest
 import shutil
+from unittest import mock
 
 import Server.ProxyServer as ps
 
@@ -69,6 +70,18 @@ class TestProxyUtils(unittest.TestCase):
         ps.AD_HOSTS_1.clear()
         ps.AD_HOSTS_1.update(original)
 
+    def test_is_ad_host_matches_label_suffixes(self):
+        hosts = {"ads.test", "b.example.com", "com.evil"}
+        with mock.patch.object(ps, "AD_HOSTS_1", hosts):
+            def legacy(hst):
+                return any(hst == d or hst.endswith("." + d) for d in hosts)
+
+            for host in ("ads.test", "x.y.ads.test", "badads.test",
+                         "ads.test.org", "b.example.com", "a.b.example.com",
+                         "example.com", "com", "com.evil.net", "x.com.evil",
+                         ".ads.test", "ads..test", ""):
+                self.assertEqual(ps.is_ad_host(host), legacy(host), host)
+
     def test_modify_request(self):
         req = (b"GET http://example.com/path"
                b" HTTP/1.1\r\nHost:"
@@ -0,0 +1,171 @@
+import socket
+import struct
+import threading
+import time
+import unittest
+from functools import partial
+
+from Connection.resolver import (Resolver,
+                                 build_dns_query,
+                                 parse_dns_response,
+                                 udp_resolve)
+
+
+class FakeDNSServer(threading.Thread):
+    """Локальный DNS-сервер: отвечает записями A из словаря."""
+
+    def __init__(self, records, ttl=60):
+        super().__init__(daemon=True)
+        self.records = records
+        self.ttl = ttl
+        self.queries = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.settimeout(0.1)
+        self.address = self.sock.getsockname()
+        self.running = True
+
+    def run(self):
+        while self.running:
+            try:
+                packet, addr = self.sock.recvfrom(512)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            self.queries += 1
+            self.sock.sendto(self.answer(packet), addr)
+
+    def answer(self, packet):
+        query_id = struct.unpack("!H", packet[:2])[0]
+        offset, labels = 12, []
+        while packet[offset]:
+            length = packet[offset]
+            labels.append(packet[offset + 1:offset + 1 + length].decode())
+            offset += length + 1
+        question = packet[12:offset + 5]
+        ip = self.records.get(".".join(labels))
+        if ip is None:
+            return struct.pack("!HHHHHH", query_id, 0x8183, 1, 0, 0, 0) \
+                + question
+        header = struct.pack("!HHHHHH", query_id, 0x8180, 1, 1, 0, 0)
+        answer = struct.pack("!HHHIH", 0xC00C, 1, 1, self.ttl, 4) \
+            + socket.inet_aton(ip)
+        return header + question + answer
+
+    def stop(self):
+        self.running = False
+        self.join(1)
+        self.sock.close()
+
+
+class TestDnsPackets(unittest.TestCase):
+    def test_round_trip(self):
+        query = build_dns_query("ads.example.com", 7)
+        server = FakeDNSServer({"ads.example.com": "10.0.0.1"}, ttl=42)
+        try:
+            ip, ttl = parse_dns_response(server.answer(query), 7)
+        finally:
+            server.sock.close()
+        self.assertEqual(ip, "10.0.0.1")
+        self.assertEqual(ttl, 42)
+
+    def test_nxdomain(self):
+        query = build_dns_query("missing.test", 7)
+        server = FakeDNSServer({})
+        try:
+            with self.assertRaises(OSError):
+                parse_dns_response(server.answer(query), 7)
+        finally:
+            server.sock.close()
+
+
+class TestResolver(unittest.TestCase):
+    def setUp(self):
+        self.dns = FakeDNSServer({"ads.example.com": "10.0.0.1"})
+        self.dns.start()
+        self.resolver = Resolver(
+            resolve_func=partial(udp_resolve, server=self.dns.address))
+
+    def tearDown(self):
+        self.resolver.close()
+        self.dns.stop()
+
+    def resolve(self, host):
+        done = threading.Event()
+        result = []
+
+        def callback(ip):
+            result.append(ip)
+            done.set()
+
+        self.resolver.resolve(host, callback)
+        self.assertTrue(done.wait(2))
+        return result[0]
+
+    def test_positive_cache(self):
+        self.assertEqual(self.resolve("ads.example.com"), "10.0.0.1")
+        self.assertEqual(self.resolve("ADS.example.com"), "10.0.0.1")
+        self.assertEqual(self.dns.queries, 1)
+        stats = self.resolver.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+
+    def test_negative_cache(self):
+        self.assertIsNone(self.resolve("missing.test"))
+        self.assertIsNone(self.resolve("missing.test"))
+        self.assertEqual(self.dns.queries, 1)
+        self.assertEqual(self.resolver.stats()["negative_hits"], 1)
+
+    def test_ip_literal_skips_cache(self):
+        self.assertEqual(self.resolve("127.0.0.1"), "127.0.0.1")
+        self.assertEqual(self.dns.queries, 0)
+
+    def test_ttl_expiry(self):
+        self.resolver.positive_ttl = 0
+        self.resolve("ads.example.com")
+        self.resolve("ads.example.com")
+        self.assertEqual(self.dns.queries, 2)
+
+    def test_lru_eviction(self):
+        resolver = Resolver(resolve_func=lambda host: ("10.0.0.2", None),
+                            max_size=2)
+        try:
+            for host in ("a.test", "b.test", "c.test"):
+                resolver.resolve(host, lambda ip: None)
+            time.sleep(0.2)
+            self.assertEqual(resolver.stats()["size"], 2)
+        finally:
+            resolver.close()
+
+
+class TestResolverCoalescing(unittest.TestCase):
+    def test_concurrent_lookups_share_one_query(self):
+        release = threading.Event()
+        calls = []
+
+        def slow_resolve(host):
+            calls.append(host)
+            release.wait(2)
+            return "10.0.0.3", None
+
+        delivered = []
+        resolver = Resolver(resolve_func=slow_resolve,
+                            dispatch=lambda cb, ip: delivered.append(ip))
+        try:
+            for _ in range(5):
+                resolver.resolve("slow.test", lambda ip: None)
+            release.set()
+            deadline = time.time() + 2
+            while len(delivered) < 5 and time.time() < deadline:
+                time.sleep(0.01)
+        finally:
+            resolver.close()
+
+        self.assertEqual(calls, ["slow.test"])
+        self.assertEqual(delivered, ["10.0.0.3"] * 5)
+        self.assertEqual(resolver.stats()["coalesced"], 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
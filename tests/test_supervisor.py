@@ -0,0 +1,73 @@
+import os
+import signal
+import socket
+import time
+import unittest
+from unittest import mock
+
+from Server.supervisor import REUSE_PORT_AVAILABLE, Supervisor
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@unittest.skipUnless(REUSE_PORT_AVAILABLE and hasattr(os, "fork"),
+                     "нужны fork и SO_REUSEPORT")
+class TestSupervisor(unittest.TestCase):
+    def setUp(self):
+        self.sup = Supervisor("127.0.0.1", free_port(), workers=2)
+        self.sup.start()
+
+    def tearDown(self):
+        self.sup.stop()
+
+    def wait_for(self, predicate, timeout=10):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            self.sup.poll(0.1)
+            if predicate():
+                return True
+        return False
+
+    def test_workers_report_stats(self):
+        self.assertTrue(self.wait_for(
+            lambda: all(w.stats for w in self.sup.workers)))
+        with socket.create_connection(("127.0.0.1", self.sup.port)):
+            pass
+        self.assertTrue(self.wait_for(
+            lambda: self.sup.stats().get("accepted") == 1))
+        self.assertEqual(self.sup.stats()["workers"], 2)
+
+    def test_dead_worker_is_respawned(self):
+        old = self.sup.pids()[0]
+        os.kill(old, signal.SIGKILL)
+        self.assertTrue(self.wait_for(
+            lambda: self.sup.pids().get(0) not in (None, old)))
+        self.assertEqual(self.sup.respawns, 1)
+
+    def test_reload_duration_is_not_summed(self):
+        self.sup.workers[0].stats = {"accepted": 2,
+                                     "blocklist_reload_seconds": 0.5}
+        self.sup.workers[1].stats = {"accepted": 3,
+                                     "blocklist_reload_seconds": 0.25}
+        stats = self.sup.stats()
+        self.assertEqual(stats["accepted"], 5)
+        self.assertEqual(stats["blocklist_reload_seconds"], 0.5)
+
+    def test_stop_without_timeout_waits_for_sigterm(self):
+        pids = list(self.sup.pids().values())
+        self.assertTrue(self.wait_for(
+            lambda: all(w.stats for w in self.sup.workers)))
+        with mock.patch.object(self.sup, "_kill",
+                               wraps=self.sup._kill) as kill:
+            self.sup.stop(timeout=None)
+        self.assertEqual(kill.call_args_list,
+                         [mock.call(pid, signal.SIGTERM) for pid in pids])
+        self.assertEqual(self.sup.pids(), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+
+from Server.timer_wheel import TimerWheel
+
+
+class TestTimerWheel(unittest.TestCase):
+    def test_expire_in_deadline_order(self):
+        wheel = TimerWheel(tick=1.0, size=8)
+        wheel.add("a", 3.0)
+        wheel.add("b", 5.0)
+        self.assertEqual(wheel.expire(2.5), [])
+        self.assertEqual(wheel.expire(3.0), ["a"])
+        self.assertEqual(wheel.expire(10.0), ["b"])
+        self.assertEqual(len(wheel), 0)
+
+    def test_deadline_beyond_one_revolution(self):
+        wheel = TimerWheel(tick=1.0, size=4)
+        wheel.add("far", 10.0)
+        self.assertEqual(wheel.next_deadline(), 10.0)
+        self.assertEqual(wheel.expire(9.0), [])
+        self.assertEqual(wheel.expire(10.0), ["far"])
+
+    def test_next_deadline_skips_later_rounds(self):
+        wheel = TimerWheel(tick=1.0, size=8)
+        wheel.add("far", 9.0)
+        wheel.add("near", 5.0)
+        self.assertEqual(wheel.next_deadline(), 5.0)
+        wheel.remove("near")
+        self.assertEqual(wheel.next_deadline(), 9.0)
+        wheel.add("later", 18.0)
+        self.assertEqual(wheel.next_deadline(), 9.0)
+
+    def test_readd_and_remove(self):
+        wheel = TimerWheel(tick=1.0, size=8)
+        wheel.add("a", 2.0)
+        wheel.add("a", 6.0)
+        self.assertEqual(len(wheel), 1)
+        self.assertEqual(wheel.expire(5.0), [])
+        wheel.remove("a")
+        self.assertNotIn("a", wheel)
+        self.assertEqual(wheel.expire(7.0), [])
+        self.assertIsNone(wheel.next_deadline())
+
+    def test_past_deadline_fires_on_next_tick(self):
+        wheel = TimerWheel(tick=1.0, size=8, start=100.0)
+        wheel.add("late", 50.0)
+        self.assertEqual(wheel.expire(101.0), ["late"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import unittest
+from unittest import mock
+
+import Server.url_filter as uf
+from Server.http_message import RequestHead
+from Server.url_filter import (AhoCorasick, RuleSet, UrlFilter, compile_rule,
+                               parse_url_rule, rule_token)
+
+
+class TestParseUrlRule(unittest.TestCase):
+    def test_supported_and_skipped_rules(self):
+        self.assertEqual(parse_url_rule("/AdService/"),
+                         ("/adservice/", False))
+        self.assertEqual(parse_url_rule("@@||ok.test/ads^$important"),
+                         ("||ok.test/ads^", True))
+        self.assertEqual(parse_url_rule("*&ad_type=*"), ("&ad_type=", False))
+        for line in ("! комментарий", "[Adblock Plus 2.0]", "##.ad",
+                     "test.com#@#.banner", "/ads\\d+/", "",
+                     "/banner.$script", "||ads.test^$domain=a.test", "*"):
+            self.assertIsNone(parse_url_rule(line), line)
+
+
+class TestCompileRule(unittest.TestCase):
+    def test_anchors_and_separators(self):
+        rule = compile_rule("||ads.test/banner^")
+        self.assertEqual(rule.literal, "ads.test/banner")
+        self.assertTrue(rule.test("http://ads.test/banner?x=1"))
+        self.assertTrue(rule.test("https://cdn.ads.test/banner"))
+        self.assertFalse(rule.test("http://badads.test/banner"))
+        self.assertFalse(rule.test("http://ads.test/banners"))
+        rule = compile_rule("|http://x.test/*.swf|")
+        self.assertTrue(rule.test("http://x.test/a/b.swf"))
+        self.assertFalse(rule.test("http://x.test/a/b.swf?1"))
+        self.assertIsNone(compile_rule("/adservice/").regex)
+
+    def test_rule_token(self):
+        self.assertEqual(rule_token("/adservice/"), ("=", "adservice"))
+        self.assertEqual(rule_token("||ads.test^"), ("=", "test"))
+        self.assertEqual(rule_token("|http://x"), ("=", "http"))
+        # "banner_" может оказаться концом "topbanner_", "/banner" -
+        # началом "/banners"
+        self.assertEqual(rule_token("banner_"), (">", "ner"))
+        self.assertEqual(rule_token("/banner"), ("<", "ban"))
+        self.assertIsNone(rule_token("ads*"))
+        self.assertIsNone(rule_token("ad_"))
+        self.assertIsNone(rule_token("banner"))
+
+
+class TestAhoCorasick(unittest.TestCase):
+    def test_overlapping_words(self):
+        with mock.patch.object(uf, "ahocorasick", None):
+            ac = AhoCorasick()
+            for word in ("he", "she", "his", "hers"):
+                ac.add(word, word)
+            ac.build()
+        self.assertEqual(sorted(ac.iter("ushers")), ["he", "hers", "she"])
+        self.assertEqual(list(ac.iter("xyz")), [])
+
+
+class TestUrlFilter(unittest.TestCase):
+    LINES = [
+        "! Title: test",
+        "/adservice/",
+        "&ad_type=",
+        "banner",
+        "||tracker.test/pixel^",
+        "|http://popup.",
+        "@@/adservice/allowed/",
+    ]
+
+    def check(self, url_filter):
+        self.assertEqual(url_filter.match("http://a.test/AdService/x.js"),
+                         "/adservice/")
+        self.assertEqual(url_filter.match("http://a.test/?q=1&ad_type=2"),
+                         "&ad_type=")
+        self.assertEqual(url_filter.match("http://a.test/topbanners.gif"),
+                         "banner")
+        self.assertEqual(url_filter.match("http://x.tracker.test/pixel"),
+                         "||tracker.test/pixel^")
+        self.assertEqual(url_filter.match("http://popup.test/"),
+                         "|http://popup.")
+        self.assertIsNone(url_filter.match("https://popup.test/"))
+        self.assertIsNone(url_filter.match("http://a.test/adservice/allowed/"))
+        self.assertIsNone(url_filter.match("http://a.test/index.html"))
+        self.assertEqual((url_filter.checked, url_filter.matched), (8, 5))
+
+    def test_match(self):
+        url_filter = UrlFilter(self.LINES)
+        self.assertEqual(len(url_filter), 6)
+        self.check(url_filter)
+
+    def test_without_token_index(self):
+        # Все правила с буквальной частью - в автомате
+        with mock.patch.object(uf, "rule_token", lambda pattern: None):
+            url_filter = UrlFilter(self.LINES)
+        self.assertEqual(url_filter.blocks.tokens, {})
+        self.check(url_filter)
+
+    def test_rule_set_placement(self):
+        rules = RuleSet(["|*.js|", "ad", "^*^", "-banner"])
+        self.assertEqual(list(rules.tokens), ["js"])
+        self.assertEqual(list(rules.prefixes), ["ban"])
+        self.assertEqual(len(rules.automaton), 1)
+        self.assertEqual(len(rules.generic), 1)
+        self.assertEqual(rules.match("http://a.test/x.js").text, "|*.js|")
+        self.assertEqual(rules.match("http://a.test/bad.css").text, "ad")
+        self.assertEqual(rules.match("http://a.test/x-banners").text,
+                         "-banner")
+        self.assertEqual(rules.match("http://a.test/x.css").text, "^*^")
+
+    def test_request_head_url(self):
+        head = RequestHead(b"GET /a?b HTTP/1.1\r\nHost: x.test:8080\r\n\r\n")
+        self.assertEqual(head.url, "http://x.test:8080/a?b")
+        head = RequestHead(b"GET http://x.test/a HTTP/1.1\r\n"
+                           b"Host: x.test\r\n\r\n")
+        self.assertEqual(head.url, "http://x.test/a")
+
+
+if __name__ == "__main__":
+    unittest.main()